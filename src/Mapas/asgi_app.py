@@ -0,0 +1,194 @@
+"""Variante ASGI de la API de solo lectura.
+
+Expone las mismas rutas que app.py sin Flask ni hilos por petición: ambos
+servidores responden con la capa común de http_api.py. La simulación (o la
+lectura del estado compartido, si otro worker es el escritor) la coordina una
+tarea de asyncio que corre cada paso en el executor, fuera del bucle de
+eventos, y /api/stream espera los ticks con asyncio, así que cada conexión
+abierta cuesta una corrutina y no un hilo.
+
+    uvicorn asgi_app:app --host 0.0.0.0 --port $PORT
+"""
+import asyncio
+import logging
+import time
+from urllib.parse import parse_qs
+
+import backend
+from http_api import ApiRequest, MAX_REQUEST_BODY_BYTES, handle
+from tick_stream import async_event_stream, stream_slots
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+
+class TickNotifier:
+    """Despierta a las conexiones SSE cuando se publica una instantánea nueva."""
+
+    def __init__(self):
+        self._event = asyncio.Event()
+
+    def notify(self):
+        self._event.set()
+        self._event = asyncio.Event()
+
+    async def wait_for_newer(self, publisher, version, timeout):
+        """Equivalente asyncio de ``SnapshotPublisher.wait_for_newer``."""
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        while publisher.latest().version <= version:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            try:
+                await asyncio.wait_for(self._event.wait(), remaining)
+            except asyncio.TimeoutError:
+                break
+        return publisher.latest()
+
+
+notifier = None
+backend_task = None
+
+
+async def run_backend_task():
+    """Arranque y simulación como tarea de asyncio (el equivalente de
+    ``backend.run_backend`` sin hilos dedicados)."""
+    loop = asyncio.get_running_loop()
+    try:
+        # La carga de datos es bloqueante: se hace fuera del bucle de eventos
+        ready = await loop.run_in_executor(None, backend.initialize_backend)
+    except Exception as e:
+        logging.critical(f"❌ ERROR durante el arranque: {e}")
+        backend.set_startup_stage('failed', error=str(e))
+        return
+    notifier.notify()
+    if not ready:
+        return
+
+    while not backend.simulation_lock.try_acquire():
+        backend.mark_reader_role()
+        deadline = time.time() + backend.WRITER_LOCK_RETRY_SECONDS
+        while time.time() < deadline:
+            try:
+                if await loop.run_in_executor(None, backend.sync_from_shared_state):
+                    notifier.notify()
+            except Exception as e:
+                logging.error(f"❌ Error al leer el estado compartido: {e}")
+            await asyncio.sleep(backend.SHARED_STATE_POLL_SECONDS)
+
+    # Cada paso de la simulación es bloqueante (numpy, instantáneas, estado
+    # compartido): corre en el executor y el bucle sigue atendiendo peticiones
+    await loop.run_in_executor(None, backend.become_simulation_writer)
+    notifier.notify()
+    schedule = backend.TickSchedule(backend.SIMULATION_TICK_SECONDS)
+    while True:
+        schedule.start_tick()
+        if await loop.run_in_executor(None, backend.run_simulation_tick):
+            notifier.notify()
+        else:
+            logging.warning(f"No hay datos de tráfico para simular. Esperando {backend.SIMULATION_TICK_SECONDS:g}s...")
+        await asyncio.sleep(schedule.seconds_until_next())
+
+
+def ensure_backend_task():
+    """Lanza la tarea de fondo una sola vez (en el startup del lifespan o en la primera petición)."""
+    global notifier, backend_task
+    if backend_task is None:
+        notifier = TickNotifier()
+        logging.info("🚀 Iniciando en modo ASGI (carga en segundo plano)...")
+        backend_task = asyncio.get_running_loop().create_task(run_backend_task())
+    return backend_task
+
+
+# ============================================
+# ADAPTADOR ASGI
+# ============================================
+
+async def read_body(receive, limit):
+    """Cuerpo completo de la petición, o ``None`` si supera ``limit`` bytes."""
+    chunks = []
+    size = 0
+    while True:
+        message = await receive()
+        if message['type'] != 'http.request':
+            return None
+        chunk = message.get('body', b'')
+        size += len(chunk)
+        if size > limit:
+            return None
+        chunks.append(chunk)
+        if not message.get('more_body', False):
+            return b''.join(chunks)
+
+
+def encode_headers(headers):
+    return [(name.lower().encode('latin-1'), value.encode('latin-1')) for name, value in headers]
+
+
+async def send_response(send, response, head_only=False):
+    headers = encode_headers(response.headers) + [(b'content-length', str(len(response.body)).encode('latin-1'))]
+    await send({'type': 'http.response.start', 'status': response.status, 'headers': headers})
+    await send({'type': 'http.response.body', 'body': b'' if head_only else response.body})
+
+
+async def stream_events(receive, send, response):
+    """Envía los eventos hasta que el cliente se desconecta o vence STREAM_MAX_SECONDS."""
+    runtime, last_version = response.stream
+    await send({'type': 'http.response.start', 'status': response.status, 'headers': encode_headers(response.headers)})
+
+    async def wait_for_newer(version, timeout):
+        return await notifier.wait_for_newer(runtime.publisher, version, timeout)
+
+    async def pump():
+        async for chunk in async_event_stream(runtime.publisher, runtime.event_log, wait_for_newer, last_version):
+            await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+
+    async def wait_disconnect():
+        while (await receive())['type'] != 'http.disconnect':
+            pass
+
+    pumping = asyncio.ensure_future(pump())
+    tasks = [pumping, asyncio.ensure_future(wait_disconnect())]
+    try:
+        await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+        if pumping.done() and not pumping.cancelled() and pumping.exception() is None:
+            # Fin del tiempo máximo: se cierra la respuesta y EventSource reconecta
+            await send({'type': 'http.response.body', 'body': b'', 'more_body': False})
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+async def lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            ensure_backend_task()
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            if backend_task is not None:
+                backend_task.cancel()
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+async def app(scope, receive, send):
+    if scope['type'] == 'lifespan':
+        return await lifespan(receive, send)
+    if scope['type'] != 'http':
+        return
+    ensure_backend_task()
+
+    query = parse_qs(scope.get('query_string', b'').decode('latin-1'), keep_blank_values=True)
+    request = ApiRequest(scope['method'], scope['path'], {key: values[0] for key, values in query.items()},
+                         {name.decode('latin-1').lower(): value.decode('latin-1')
+                          for name, value in scope.get('headers', [])})
+    if request.method == 'POST':
+        request.body = await read_body(receive, MAX_REQUEST_BODY_BYTES)
+    response = handle(request)
+    if response.stream is None:
+        return await send_response(send, response, head_only=request.method == 'HEAD')
+    try:
+        await stream_events(receive, send, response)
+    finally:
+        stream_slots.release()
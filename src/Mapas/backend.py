@@ -0,0 +1,688 @@
+"""Estado del backend compartido por los servidores WSGI (app.py) y ASGI (asgi_app.py).
+
+Aquí viven los corredores cargados, el arranque por etapas, el rol de cada
+worker (escritor que simula o lector del estado compartido) y los payloads
+de los endpoints que no salen preserializados de la instantánea. Importarlo
+no carga datos ni lanza hilos: eso lo decide cada servidor.
+"""
+import json
+import logging
+import os
+import threading
+import time
+from datetime import datetime
+
+import numpy as np
+
+from traffic_table import TrafficTable, load_or_convert as load_traffic_table
+from binary_cache import save_binary_cache, load_binary_cache
+from corridors import DEFAULT_CORRIDOR, load_corridor_configs
+from corridor_scheduler import CorridorRuntime, CorridorScheduler
+from shared_state import SharedStateFile, SimulationLock
+from history_store import HistoryStore, history_payload
+from spatial_index import DEFAULT_MAX_DISTANCE_M, MAX_MATCH_POINTS, match_payload, parse_points
+from live_ingest import LiveIngest, SpoolTailer, batch_corridor, spool_batch
+from tick_stream import STREAM_RETRY_MILLISECONDS, stream_slots
+from metrics import (REGISTRY, LOAD_SECONDS, TICK_SECONDS, TICK_LAG_SECONDS, TICKS, EVACUATIONS,
+                     SHARED_STATE_SYNC_SECONDS, SNAPSHOT_VERSION, SNAPSHOT_AGE_SECONDS, WORKER_INFO)
+
+# Archivos de caché
+CACHE_DIR = 'cache'
+SEGMENTS_CACHE_FILE = os.path.join(CACHE_DIR, 'segments_cache.json')
+SECTIONS_CACHE_FILE = os.path.join(CACHE_DIR, 'sections_cache.json')
+
+UCP_WEIGHTS = {
+    'Auto': 1.0, 'Taxi': 1.0, 'Omnibus': 3.0, 'Microbús': 2.0,
+    'Camioneta rural': 1.25, 'Moto lineal': 0.333, 'Mototaxi': 0.75,
+    'Bicicleta': 0.333, 'Camión': 2.5, 'Tráiler': 3.5,
+    'Bus Interprovincial': 3.0
+}
+VEHICLE_TYPES = list(UCP_WEIGHTS.keys())
+
+# Un CorridorRuntime por corredor configurado (ver corridors.py); el primero es el de por defecto
+corridor_runtimes = {c.corridor_id: CorridorRuntime(c) for c in load_corridor_configs()}
+DEFAULT_CORRIDOR_ID = next(iter(corridor_runtimes))
+scheduler = None  # CorridorScheduler que avanza todos los corredores en un mismo tick (solo en el escritor)
+
+# Varios workers: uno solo simula y publica el estado en archivos compartidos (ver shared_state.py)
+simulation_lock = SimulationLock()
+shared_states = {}  # corridor_id -> SharedStateFile
+SHARED_STATE_POLL_SECONDS = 0.5
+WRITER_LOCK_RETRY_SECONDS = 5
+SIMULATION_TICK_SECONDS = float(os.environ.get('SIMULATION_TICK_SECONDS', 10))  # Segundos reales por intervalo simulado
+# El detalle por sección de cada tick es opcional: en producción basta con /metrics
+LOG_EACH_TICK = os.environ.get('LOG_EACH_TICK', '1') != '0'
+# Historial persistente de cada tick (ver history_store.py); lo escribe solo el escritor
+HISTORY_ENABLED = os.environ.get('HISTORY_ENABLED', '1') != '0'
+DEFAULT_HISTORY_WINDOW_SECONDS = 3600
+history_stores = {}  # corridor_id -> HistoryStore
+# 'replay' repite la jornada del Excel; 'live' aplica los conteos recibidos (ver live_ingest.py)
+TRAFFIC_SOURCE = os.environ.get('TRAFFIC_SOURCE', 'replay')
+live_ingest = None  # LiveIngest del escritor en modo 'live'
+
+# Arranque por etapas: los datos se cargan en segundo plano y /api/status informa el avance
+STARTUP_STAGES = ('pending', 'loading_route_cache', 'building_route_graph',
+                  'loading_traffic_data', 'building_simulation', 'ready')
+startup_status = {
+    'stage': 'pending',
+    'started_at': None,
+    'stage_started_at': None,
+    'finished_at': None,
+    'corridor': None,
+    'corridors_ready': 0,
+    'role': None,
+    'error': None
+}
+startup_lock = threading.Lock()
+startup_thread = None
+
+def set_startup_stage(stage, error=None):
+    now = time.time()
+    startup_status['stage'] = stage
+    startup_status['stage_started_at'] = now
+    if stage in ('ready', 'failed'):
+        startup_status['finished_at'] = now
+    if error is not None:
+        startup_status['error'] = error
+    logging.info(f"⏳ Arranque: etapa '{stage}'")
+
+def startup_progress():
+    """Avance del arranque para /api/status (fracción de etapas completadas,
+    repartida entre los corredores configurados)."""
+    stage = startup_status['stage']
+    started_at = startup_status['started_at']
+    end = startup_status['finished_at'] or time.time()
+    progress = None
+    if stage == 'ready':
+        progress = 1.0
+    elif stage in STARTUP_STAGES:
+        stage_progress = STARTUP_STAGES.index(stage) / (len(STARTUP_STAGES) - 1)
+        progress = round((startup_status['corridors_ready'] + stage_progress) / len(corridor_runtimes), 2)
+    return {
+        'stage': stage,
+        'progress': progress,
+        'elapsed_seconds': round(end - started_at, 2) if started_at else 0,
+        'stage_elapsed_seconds': round(end - startup_status['stage_started_at'], 2)
+                                 if startup_status['stage_started_at'] else 0,
+        'corridor': startup_status['corridor'],
+        'corridors_ready': startup_status['corridors_ready'],
+        'corridors_total': len(corridor_runtimes),
+        'role': startup_status['role'],
+        'error': startup_status['error']
+    }
+
+def load_traffic_data(runtime):
+    config = runtime.config
+    file_path = config.traffic_file
+    try:
+        logging.info(f"Cargando datos de tráfico desde '{file_path}'...")
+        runtime.traffic_table = load_traffic_table(file_path, config.traffic_table_file)
+        runtime.time_intervals = list(runtime.traffic_table.time_intervals)
+        logging.info(f"✅ Datos de tráfico cargados. {len(runtime.traffic_table)} registros encontrados.")
+        logging.info(f"Intervalos de simulación ({len(runtime.time_intervals)}): {runtime.time_intervals}")
+    except FileNotFoundError:
+        logging.warning(f"⚠️ ADVERTENCIA: No se encontró el archivo '{file_path}'.")
+        runtime.traffic_table = TrafficTable.empty_table()
+        runtime.time_intervals = []
+    except Exception as e:
+        logging.warning(f"⚠️ ADVERTENCIA al leer el archivo Excel: {e}.")
+        runtime.traffic_table = TrafficTable.empty_table()
+        runtime.time_intervals = []
+
+def save_cache(runtime):
+    try:
+        logging.info("💾 Guardando datos en caché binario...")
+        save_binary_cache(runtime.config.route_cache_dir, runtime.config.fingerprint(),
+                          runtime.road_segments_data, runtime.sections)
+        logging.info("✅ Caché guardado exitosamente")
+        return True
+    except Exception as e:
+        logging.error(f"❌ Error al guardar caché: {e}")
+        return False
+
+def load_from_cache(runtime):
+    try:
+        cached = load_binary_cache(runtime.config.route_cache_dir, runtime.config.fingerprint())
+        if cached is not None:
+            runtime.road_segments_data, runtime.sections = cached
+            logging.info(f"✅ Caché binario cargado: {len(runtime.road_segments_data)} segmentos, "
+                         f"{len(runtime.sections)} secciones")
+            return True
+        # Los cachés JSON anteriores solo existen para el corredor original
+        if runtime.config.corridor_id == DEFAULT_CORRIDOR.corridor_id:
+            return load_from_legacy_json_cache(runtime)
+        return False
+    except Exception as e:
+        logging.error(f"❌ Error al cargar caché: {e}")
+        return False
+
+def load_from_legacy_json_cache(runtime):
+    """Migra los cachés JSON anteriores al formato binario, si existen."""
+    if not os.path.exists(SEGMENTS_CACHE_FILE) or not os.path.exists(SECTIONS_CACHE_FILE):
+        logging.info("⚠️ Archivos de caché no encontrados")
+        return False
+    logging.info("📂 Cargando datos desde caché JSON...")
+    with open(SEGMENTS_CACHE_FILE, 'r') as f:
+        runtime.road_segments_data = json.load(f)
+    with open(SECTIONS_CACHE_FILE, 'r') as f:
+        sections_loaded = json.load(f)
+        runtime.sections = []
+        for section in sections_loaded:
+            section['edges'] = set(section['edges'])
+            runtime.sections.append(section)
+    logging.info(f"✅ Caché JSON cargado: {len(runtime.road_segments_data)} segmentos, {len(runtime.sections)} secciones")
+    save_cache(runtime)
+    return True
+
+def load_and_structure_data(runtime):
+    config = runtime.config
+    
+    set_startup_stage('loading_route_cache')
+    with LOAD_SECONDS.time(corridor=config.corridor_id, stage='route_cache'):
+        loaded = load_from_cache(runtime)
+    if loaded:
+        logging.info("✅ Datos cargados desde caché - Inicio rápido")
+        return
+    with LOAD_SECONDS.time(corridor=config.corridor_id, stage='route_graph'):
+        build_route(runtime)
+
+def load_route_graph(config):
+    """Grafo vial del corredor: desde la respuesta de Overpass local o, si no hay, descargado de OSM."""
+    logging.info("1. Construyendo la red de calles desde la respuesta de Overpass local...")
+    # osmnx/geopandas solo se importan cuando hace falta construir el grafo
+    from route_builder import load_offline_graph
+    
+    try:
+        graph = load_offline_graph(config.overpass_dir, polygon=config.route_polygon)
+    except Exception as e:
+        logging.error(f"❌ Error al construir el grafo offline: {e}")
+        graph = None
+    
+    if graph is None:
+        logging.info("1. Descargando la red de calles desde OpenStreetMap...")
+        logging.info("   (Esto puede tardar 1-2 minutos en la primera ejecución)")
+        try:
+            import osmnx as ox
+            ox.settings.use_cache = True
+            ox.settings.log_console = True
+            
+            graph = ox.graph_from_polygon(config.route_polygon, network_type='drive')
+            logging.info("✅ Red de calles descargada exitosamente")
+        except Exception as e:
+            logging.critical(f"❌ ERROR AL DESCARGAR: {e}")
+            return None
+    return graph
+
+def build_route(runtime):
+    """Construye la ruta desde el grafo (Overpass local u OpenStreetMap) y guarda el caché."""
+    config = runtime.config
+    
+    logging.info("="*70)
+    logging.info(f"🔄 INICIANDO CARGA DE DATOS DEL MAPA (sin caché) - {config.name}...")
+    logging.info("="*70)
+    set_startup_stage('building_route_graph')
+    # Grafo, nodos clave y caminos se reutilizan del caché de construcción:
+    # osmnx solo se importa si el grafo de estas entradas todavía no existe
+    from route_build_cache import RouteBuildCache
+    build_cache = RouteBuildCache.for_corridor(config, lambda: load_route_graph(config))
+    try:
+        runtime.road_segments_data, runtime.sections = build_cache.structure_route(config)
+    except Exception as e:
+        logging.critical(f"❌ ERROR al estructurar la ruta: {e}")
+        logging.critical("💡 SUGERENCIA: Genera el caché en el build con 'python route_builder.py'")
+        return
+    
+    # ✅ Guardar caché después de cargar exitosamente
+    save_cache(runtime)
+    logging.info("✅ Estructuración de datos completada")
+
+def run_simulation_tick():
+    """Escritor: un paso vectorizado del planificador para todos los corredores,
+    publicado en el estado compartido. Devuelve ``False`` si no hay nada que simular."""
+    if scheduler is None or len(scheduler) == 0:
+        return False
+
+    with TICK_SECONDS.time():
+        ticks = scheduler.tick(live_ingest.drain() if live_ingest is not None else None)
+        for tick in ticks:
+            runtime = tick.runtime
+            shared_states[runtime.corridor_id].write(*runtime.shared_record(tick.step, tick.interval_index))
+    TICKS.inc()
+
+    for tick in ticks:
+        runtime = tick.runtime
+        store = history_stores.get(runtime.corridor_id)
+        if store is not None:
+            store.record(runtime.publisher.latest(), tick.interval_index)
+        if len(tick.evacuated):
+            EVACUATIONS.inc(len(tick.evacuated), corridor=runtime.corridor_id)
+        if tick.restarted:
+            logging.info(f"🔄 REINICIANDO SIMULACIÓN [{runtime.corridor_id}] - Aplicando inventario inicial")
+        if not LOG_EACH_TICK:
+            continue
+        state = runtime.section_state
+        logging.info(f"\n{'='*70}\n⏰ [{runtime.corridor_id}] INTERVALO: {tick.interval}\n{'='*70}")
+        for s in tick.evacuated:
+            logging.info(f"  ⚠️ EVACUACIÓN en '{state.section_names[s]}': Ocupación > 100%. Reduciendo al 45%.")
+        logging.info(f"🎨 [{runtime.corridor_id}] Actualización #{runtime.update_counter} - "
+                     f"Timestamp: {runtime.last_update_timestamp}")
+        logging.info("\n📊 ESTADO FINAL DE SEGMENTOS:")
+        total_vehicles = state.total_vehicles()
+        for i, name in enumerate(state.section_names):
+            logging.info(f"  🚗 '{name}': {int(total_vehicles[i])} veh | {state.ucp_density[i]} UCP | {state.occupancy[i]:.2f}% ocupado")
+    return True
+
+class TickSchedule:
+    """Horario fijo de ticks cada ``period`` segundos (el tiempo del tick no se
+    suma al periodo). Registra el atraso de cada tick respecto de su horario;
+    si un tick se atrasa más de un periodo, el horario se corre en lugar de
+    encadenar ticks seguidos para recuperar."""
+
+    def __init__(self, period):
+        self.period = period
+        self.next_tick = time.monotonic()
+
+    def start_tick(self):
+        TICK_LAG_SECONDS.observe(max(0.0, time.monotonic() - self.next_tick))
+
+    def seconds_until_next(self):
+        now = time.monotonic()
+        self.next_tick = max(self.next_tick + self.period, now)
+        return self.next_tick - now
+
+def update_traffic_periodically():
+    """Un solo hilo para todos los corredores: cada tick es un paso vectorizado del planificador."""
+    schedule = TickSchedule(SIMULATION_TICK_SECONDS)
+    while True:
+        schedule.start_tick()
+        if not run_simulation_tick():
+            logging.warning(f"No hay datos de tráfico para simular. Esperando {SIMULATION_TICK_SECONDS:g}s...")
+        time.sleep(schedule.seconds_until_next())
+
+def initialize_backend():
+    """Carga la ruta y los datos de tráfico de cada corredor y arma el planificador.
+
+    Devuelve ``True`` si al menos un corredor quedó listo para simular. Solo
+    importa osmnx cuando falta el caché de una ruta y pandas solo si hay que
+    convertir un Excel.
+    """
+    startup_status['started_at'] = time.time()
+    for runtime in corridor_runtimes.values():
+        startup_status['corridor'] = runtime.corridor_id
+        load_and_structure_data(runtime)
+        if not runtime.route_loaded:
+            logging.critical(f"❌ No se pudieron cargar datos del mapa del corredor '{runtime.corridor_id}'.")
+            continue
+        logging.info("\n" + "="*60 + f"\n✅ ESTRUCTURACIÓN COMPLETADA - {runtime.config.name}\n" + "="*60)
+
+        set_startup_stage('loading_traffic_data')
+        with LOAD_SECONDS.time(corridor=runtime.corridor_id, stage='traffic_data'):
+            load_traffic_data(runtime)
+
+        set_startup_stage('building_simulation')
+        with LOAD_SECONDS.time(corridor=runtime.corridor_id, stage='simulation_build'):
+            runtime.build_engine(VEHICLE_TYPES, UCP_WEIGHTS)
+        logging.info(f"✅ Motor de simulación listo [{runtime.corridor_id}]: tensor de deltas {runtime.traffic_deltas.shape}, "
+                     f"jornada reproducida ({len(runtime.interval_replay)} intervalos)")
+        startup_status['corridors_ready'] += 1
+
+    startup_status['corridor'] = None
+    if startup_status['corridors_ready'] == 0:
+        logging.critical("❌ ERROR CRÍTICO: No se pudieron cargar datos del mapa.")
+        set_startup_stage('failed', error='No se pudieron cargar datos del mapa')
+        return False
+
+    for runtime in corridor_runtimes.values():
+        if runtime.section_state is not None:
+            shared_states[runtime.corridor_id] = SharedStateFile.for_corridor(
+                runtime.corridor_id, runtime.section_state.counts.shape)
+    set_startup_stage('ready')
+    logging.info(f"✅ Arranque completado en {startup_progress()['elapsed_seconds']}s")
+    return True
+
+def sync_from_shared_state():
+    """Lector: adopta el último estado que publicó el worker escritor.
+    Devuelve ``True`` si publicó alguna instantánea nueva."""
+    changed = False
+    with SHARED_STATE_SYNC_SECONDS.time():
+        for corridor_id, shared in shared_states.items():
+            runtime = corridor_runtimes[corridor_id]
+            record = shared.read()
+            if record is None:
+                continue
+            if (record.version, record.timestamp) != (runtime.update_counter, runtime.last_update_timestamp):
+                runtime.apply_shared_state(record)
+                changed = True
+    return changed
+
+def become_simulation_writer():
+    """Este worker pasa a simular: continúa desde el último estado compartido
+    (si otro escritor lo dejó) y publica su estado inicial."""
+    global scheduler, live_ingest
+    sync_from_shared_state()
+    for corridor_id, shared in shared_states.items():
+        runtime = corridor_runtimes[corridor_id]
+        snapshot = runtime.publisher.latest()
+        interval_index = runtime.interval_replay.index_of(snapshot.current_interval)
+        shared.create()
+        shared.write(*runtime.shared_record(snapshot.simulation_step, -1 if interval_index is None else interval_index))
+    live = TRAFFIC_SOURCE == 'live'
+    scheduler = CorridorScheduler(corridor_runtimes.values(), VEHICLE_TYPES, UCP_WEIGHTS, require_traffic=not live)
+    if live:
+        live_ingest = LiveIngest(corridor_runtimes.values(), VEHICLE_TYPES, DEFAULT_CORRIDOR_ID)
+        tailer = SpoolTailer(live_ingest)
+        tailer.start()
+        logging.info(f"📡 Modo en vivo: conteos por POST /api/ingest y archivos *.jsonl en '{tailer.directory}'")
+    if HISTORY_ENABLED:
+        for runtime in corridor_runtimes.values():
+            if runtime.section_state is not None:
+                try:
+                    history_store_for(runtime).open_writer()
+                except OSError as e:
+                    logging.error(f"❌ No se pudo abrir el historial de '{runtime.corridor_id}': {e}")
+    startup_status['role'] = 'writer'
+    logging.info(f"✍️ Worker {os.getpid()} simulando {len(scheduler)} corredor(es)")
+
+def mark_reader_role():
+    if startup_status['role'] != 'reader':
+        startup_status['role'] = 'reader'
+        logging.info(f"📖 Worker {os.getpid()} sirve el estado publicado por el escritor")
+
+def run_simulation_role():
+    """Escritor si obtiene el candado; si no, lector del estado compartido
+    que reintenta tomar el candado por si el escritor termina."""
+    while not simulation_lock.try_acquire():
+        mark_reader_role()
+        deadline = time.time() + WRITER_LOCK_RETRY_SECONDS
+        while time.time() < deadline:
+            try:
+                sync_from_shared_state()
+            except Exception as e:
+                logging.error(f"❌ Error al leer el estado compartido: {e}")
+            time.sleep(SHARED_STATE_POLL_SECONDS)
+    become_simulation_writer()
+    update_traffic_periodically()
+
+def run_backend():
+    try:
+        ready = initialize_backend()
+    except Exception as e:
+        logging.critical(f"❌ ERROR durante el arranque: {e}")
+        set_startup_stage('failed', error=str(e))
+        return
+    if ready:
+        run_simulation_role()
+
+def start_background_initialization():
+    """Lanza el arranque en un hilo para que el worker atienda /health de inmediato.
+
+    No hace nada si el proceso ya tiene corredores instalados (ver
+    ``install_corridor_runtimes``)."""
+    global startup_thread
+    with startup_lock:
+        if startup_thread is None and startup_status['stage'] == 'pending':
+            startup_thread = threading.Thread(target=run_backend, name='backend-startup', daemon=True)
+            startup_thread.start()
+    return startup_thread
+
+def install_corridor_runtimes(runtimes, vehicle_types=VEHICLE_TYPES, ucp_weights=UCP_WEIGHTS):
+    """Sirve corredores ya construidos en lugar de cargar los configurados
+    (benchmarks y herramientas que arman sus propios datos). Este proceso
+    queda como escritor único, sin estado compartido entre workers."""
+    global DEFAULT_CORRIDOR_ID, scheduler
+    runtimes = list(runtimes)
+    corridor_runtimes.clear()
+    corridor_runtimes.update((runtime.corridor_id, runtime) for runtime in runtimes)
+    DEFAULT_CORRIDOR_ID = runtimes[0].corridor_id
+    shared_states.clear()
+    scheduler = CorridorScheduler(runtimes, vehicle_types, ucp_weights)
+    startup_status.update(started_at=time.time(), corridor=None, role='writer',
+                          corridors_ready=sum(r.section_state is not None for r in runtimes))
+    set_startup_stage('ready')
+    return scheduler
+
+def resolve_corridor(corridor_id=None):
+    """Corredor por id (por defecto, el primero configurado), o ``None`` si no existe."""
+    return corridor_runtimes.get(corridor_id or DEFAULT_CORRIDOR_ID)
+
+def unknown_corridor_payload(corridor_id):
+    return {
+        'error': f"Corredor desconocido: '{corridor_id}'",
+        'corridors': list(corridor_runtimes)
+    }
+
+# ============================================
+# PAYLOADS DE LOS ENDPOINTS DE CONSULTA
+# ============================================
+
+def _snapshot_versions():
+    return {(corridor_id,): runtime.publisher.latest().version for corridor_id, runtime in corridor_runtimes.items()}
+
+def _snapshot_ages():
+    now = time.time()
+    return {(corridor_id,): round(now - runtime.last_update_timestamp, 3)
+            for corridor_id, runtime in corridor_runtimes.items() if runtime.last_update_timestamp}
+
+def _worker_info():
+    return {(os.getpid(), startup_status['role'] or 'none', startup_status['stage']): 1}
+
+SNAPSHOT_VERSION.set_function(_snapshot_versions)
+SNAPSHOT_AGE_SECONDS.set_function(_snapshot_ages)
+WORKER_INFO.set_function(_worker_info)
+
+def route_not_loaded_payload(runtime):
+    return {
+        'error': f"La ruta del corredor '{runtime.corridor_id}' aún no está cargada",
+        'startup': startup_progress()
+    }
+
+def changes_since(runtime, since):
+    """Delta serializado desde ``since`` (texto del parámetro; inválido = estado completo)."""
+    try:
+        since = int(since) if since is not None else None
+    except ValueError:
+        since = None
+    return runtime.history.changes_since(since, runtime.publisher.latest())
+
+def history_store_for(runtime):
+    """``HistoryStore`` del corredor (se rehace si cambiaron sus secciones)."""
+    names = runtime.section_state.section_names
+    store = history_stores.get(runtime.corridor_id)
+    if store is None or store.section_names != names:
+        store = history_stores[runtime.corridor_id] = HistoryStore(runtime.corridor_id, names)
+    return store
+
+def parse_time_param(value, default):
+    """Segundos epoch o fecha ISO 8601 (sin zona = hora del servidor); vacío = ``default``."""
+    if value is None or value == '':
+        return default
+    try:
+        return float(value)
+    except ValueError:
+        return datetime.fromisoformat(value).timestamp()
+
+def history_query_payload(runtime, args, now):
+    """Serie temporal de ocupación y KPIs del corredor entre ?from= y ?to= (por
+    defecto, la última hora). Devuelve ``(payload, status)``."""
+    if runtime.section_state is None:
+        return route_not_loaded_payload(runtime), 503
+    try:
+        end = parse_time_param(args.get('to'), now)
+        start = parse_time_param(args.get('from'), end - DEFAULT_HISTORY_WINDOW_SECONDS)
+    except ValueError:
+        return {'error': "'from' y 'to' deben ser segundos epoch o fechas ISO 8601"}, 400
+    return history_payload(history_store_for(runtime), start, end,
+                           args.get('resolution') or 'auto', args.get('section'))
+
+def match_points_payload(runtime, points, max_distance=None, route_only=False):
+    """Edge y sección más cercanos a cada punto (``"lat,lon;..."`` o ``[[lat, lon], ...]``).
+    Devuelve ``(payload, status)``."""
+    if runtime.edge_index is None:
+        return route_not_loaded_payload(runtime), 503
+    try:
+        lats, lons = parse_points(points if points is not None else [])
+        max_distance = DEFAULT_MAX_DISTANCE_M if max_distance in (None, '') else float(max_distance)
+    except (TypeError, ValueError) as e:
+        return {'error': str(e)}, 400
+    if len(lats) > MAX_MATCH_POINTS:
+        return {'error': f"Máximo {MAX_MATCH_POINTS} puntos por consulta"}, 400
+    route_only = str(route_only).lower() in ('1', 'true', 'yes')
+    return match_payload(runtime.spatial_index(), runtime.section_state.section_names,
+                         lats, lons, max_distance, route_only), 200
+
+def stream_busy_payload():
+    """Respuesta de /api/stream con el cupo de conexiones lleno. Devuelve ``(payload, status)``."""
+    return {'error': "Demasiadas conexiones abiertas a /api/stream; reintente más tarde",
+            'max_clients': stream_slots.limit,
+            'retry_after': STREAM_RETRY_MILLISECONDS // 1000}, 503
+
+def ingest_payload(batch, corridor_id=None):
+    """Recibe un lote de conteos en vivo. Devuelve ``(payload, status)``."""
+    if TRAFFIC_SOURCE != 'live':
+        return {'error': "La ingesta en vivo está desactivada (TRAFFIC_SOURCE=replay)"}, 409
+    if live_ingest is not None:
+        return live_ingest.submit(batch, corridor_id)
+    # Lector (o escritor aún sin elegir): el lote queda en un archivo que sigue el escritor
+    corridor_id = batch_corridor(batch, corridor_id, DEFAULT_CORRIDOR_ID)
+    ready = [cid for cid, runtime in corridor_runtimes.items() if runtime.section_state is not None]
+    return spool_batch(batch, corridor_id, ready)
+
+def metrics_body():
+    """Métricas de este worker en formato de texto de Prometheus."""
+    return REGISTRY.render()
+
+API_ENDPOINTS = {
+    'health': '/health',
+    'debug': '/api/debug',
+    'kpis': '/api/kpis',
+    'traffic_data': '/api/traffic_data',
+    'current_interval': '/api/current_interval',
+    'intervals': '/api/intervals',
+    'ucp_by_interval': '/api/ucp_by_interval',
+    'stream': '/api/stream',
+    'corridors': '/api/corridors',
+    'road_geometry': '/api/road_geometry',
+    'road_state': '/api/road_state',
+    'changes': '/api/changes?since=<update_counter>',
+    'match': '/api/match?points=<lat,lon;lat,lon>&max_distance=<m>&route_only=1 (o POST con {"points": [...]})',
+    'ingest': 'POST /api/ingest?corridor=<id> (TRAFFIC_SOURCE=live)',
+    'history': '/api/history?from=<ts>&to=<ts>&resolution=auto|raw|hour|day&section=<nombre>',
+    'metrics': '/metrics'
+}
+
+VEHICLE_GROUP_MAPPING = {
+    'Auto': 'autos',
+    'Taxi': 'autos',
+    'Omnibus': 'buses',
+    'Microbús': 'buses',
+    'Bus Interprovincial': 'buses',
+    'Camioneta rural': 'camionetas',
+    'Camión': 'camionetas',
+    'Tráiler': 'camionetas',
+    'Moto lineal': 'motos',
+    'Mototaxi': 'motos',
+    'Bicicleta': 'motos'
+}
+VEHICLE_GROUPS = ['autos', 'buses', 'motos', 'camionetas']
+
+def api_info_payload(now):
+    return {
+        'message': 'ATU Traffic Pulse API',
+        'status': 'running',
+        'version': '1.0',
+        'endpoints': dict(API_ENDPOINTS),
+        'corridor_param': f"?corridor=<id> (por defecto: {DEFAULT_CORRIDOR_ID})",
+        'timestamp': now.isoformat()
+    }
+
+def health_payload(now):
+    return {
+        'status': 'ok',
+        'message': 'Server is running',
+        'timestamp': now.isoformat(),
+        'update_counter': corridor_runtimes[DEFAULT_CORRIDOR_ID].publisher.latest().version,
+        'startup_stage': startup_status['stage']
+    }
+
+def status_payload(runtime):
+    snapshot = runtime.publisher.latest()
+    startup = startup_progress()
+    status = 'ready' if startup['stage'] == 'ready' else 'failed' if startup['stage'] == 'failed' else 'initializing'
+    return {
+        'status': status,
+        'startup': startup,
+        'corridor': runtime.corridor_id,
+        'road_segments_loaded': len(runtime.road_segments_data),
+        'sections_loaded': len(runtime.sections),
+        'traffic_data_loaded': runtime.has_traffic,
+        'intervals_count': len(runtime.time_intervals),
+        'last_update': snapshot.timestamp,
+        'update_counter': snapshot.version
+    }
+
+def corridors_payload():
+    """Corredores configurados con su estado de carga y su última versión publicada."""
+    corridors_info = []
+    for runtime in corridor_runtimes.values():
+        snapshot = runtime.publisher.latest()
+        corridors_info.append({
+            'id': runtime.corridor_id,
+            'name': runtime.config.name,
+            'default': runtime.corridor_id == DEFAULT_CORRIDOR_ID,
+            'sections': len(runtime.sections),
+            'intervals_count': len(runtime.time_intervals),
+            'simulating': runtime.section_state is not None and runtime.has_traffic,
+            'current_interval': snapshot.current_interval,
+            'update_counter': snapshot.version
+        })
+    return {'corridors': corridors_info}
+
+def intervals_payload(runtime):
+    return {
+        'intervals': runtime.time_intervals,
+        'current_step': runtime.publisher.latest().simulation_step
+    }
+
+def ucp_by_interval_payload(runtime):
+    """UCP total al final de cada intervalo de la jornada reproducida."""
+    interval_replay = runtime.interval_replay
+    if interval_replay is None:
+        return []
+    return [{
+        'interval': interval,
+        'total_ucp': float(total_ucp)
+    } for interval, total_ucp in zip(interval_replay.time_intervals, interval_replay.total_ucp.tolist())]
+
+def vehicles_by_interval_payload(runtime, requested_interval=None):
+    """Vehículos por grupo y sección para un intervalo (por defecto, el actual)."""
+    interval_replay = runtime.interval_replay
+    snapshot = runtime.publisher.latest()
+    target_interval = requested_interval if requested_interval else snapshot.current_interval
+    
+    # Intervalo actual: instantánea en vivo; históricos: tabla de la jornada reproducida
+    state = snapshot.state
+    if requested_interval and requested_interval != snapshot.current_interval:
+        replayed = interval_replay.state_at(requested_interval) if interval_replay is not None else None
+        # Intervalo desconocido: se mantienen las filas por sección en cero
+        state = replayed if replayed is not None else state.with_state(
+            np.zeros_like(state.counts), np.zeros_like(state.ucp_density), np.zeros_like(state.occupancy))
+    
+    detailed_data = []
+    grouped = state.grouped_counts(VEHICLE_GROUP_MAPPING, VEHICLE_GROUPS, 'autos')
+    
+    for i, name in enumerate(state.section_names):
+        grouped_vehicles = dict(zip(VEHICLE_GROUPS, grouped[i].tolist()))
+        
+        detailed_data.append({
+            'interval': target_interval,
+            'segment_id': name,
+            'segment_name': name,
+            'autos': grouped_vehicles['autos'],
+            'buses': grouped_vehicles['buses'],
+            'motos': grouped_vehicles['motos'],
+            'camionetas': grouped_vehicles['camionetas'],
+            'total_vehicles': sum(grouped_vehicles.values()),
+            'ucp': float(state.ucp_density[i]),
+            'ocupacion': round(float(state.occupancy[i]), 2)
+        })
+    return detailed_data
@@ -0,0 +1,360 @@
+"""Benchmarks reproducibles de la simulación y de la API.
+
+Arma corredores sintéticos (número de secciones, edges por sección, tipos de
+vehículo, filas de conteo e intervalos configurables, con semilla fija) y
+mide cada etapa por separado:
+
+- ``build_delta_tensor``: tabla de conteos -> tensor de deltas.
+- ``interval_replay``: reproducción de la jornada completa.
+- ``recompute``: densidad UCP y ocupación de todas las secciones.
+- ``edge_colors``: códigos de color de los edges de la ruta.
+- ``build_snapshot``: instantánea con los payloads serializados.
+- ``scheduler_tick``: un tick completo del planificador (incluye publicar).
+- ``tick_event``: delta del tick para /api/stream.
+- ``GET /api/...``: cada endpoint con el cliente de prueba de Flask (y la
+  revalidación con ``If-None-Match`` de los que tienen ETag).
+
+Reporta latencia media, p50/p90/p99, máximo y operaciones por segundo, y
+agrega cada corrida como una línea JSON (con el commit actual) a
+``--output`` para comparar commits con ``--compare``.
+
+    python benchmarks.py [--sections 6,60,600] [--edges-per-section 20] [--vehicle-types 11]
+        [--rows 50000] [--intervals 96] [--repeat 50] [--no-endpoints] [--compare]
+"""
+import argparse
+import json
+import logging
+import os
+import platform
+import subprocess
+import time
+
+import numpy as np
+from shapely.geometry import Polygon
+
+from backend import UCP_WEIGHTS
+from corridor_scheduler import CorridorRuntime, CorridorScheduler
+from corridors import CorridorConfig
+from section_state import EdgeColorIndex, IntervalReplay, occupancy_color_codes
+from simulation_engine import build_delta_tensor
+from snapshot import build_snapshot
+from spatial_index import EdgeSpatialIndex
+from tick_stream import build_tick_event
+from traffic_table import TrafficTable
+
+RESULTS_FILE = os.path.join('cache', 'benchmarks.jsonl')
+MATCH_PROBES = 1000  # Puntos GPS por consulta del índice espacial
+SNAPSHOT_ENDPOINTS = ('/api/road_data', '/api/road_state', '/api/road_geometry', '/api/traffic_data',
+                      '/api/kpis', '/api/current_interval', '/api/debug')
+QUERY_ENDPOINTS = ('/api/status', '/api/intervals', '/api/ucp_by_interval',
+                   '/api/vehicles_by_interval_and_segment')
+
+
+# ============================================
+# GENERADORES SINTÉTICOS
+# ============================================
+
+def synthetic_vehicle_types(count):
+    """Los tipos reales primero; si se piden más, tipos extra con peso 1 UCP."""
+    vehicle_types = list(UCP_WEIGHTS)[:count]
+    weights = {vtype: UCP_WEIGHTS[vtype] for vtype in vehicle_types}
+    for k in range(len(vehicle_types), count):
+        vehicle_types.append(f'Tipo {k + 1}')
+        weights[vehicle_types[-1]] = 1.0
+    return vehicle_types, weights
+
+
+def synthetic_route(sections, edges_per_section, rng):
+    """``road_segments_data`` y secciones con la forma que produce ``route_builder``."""
+    road_segments_data = {}
+    route_sections = []
+    directions = ('IDA', 'VUELTA')
+    for s in range(sections):
+        direction = directions[s % 2]
+        edges = set()
+        for e in range(edges_per_section):
+            road_id = f'{s}_{e}_0'
+            lat, lon = -12.1 - s * 1e-3, -76.9 - e * 1e-4
+            road_segments_data[road_id] = {
+                'id': road_id,
+                'name': f'Vía sintética {s}',
+                'coords': [[lat, lon], [lat + 5e-5, lon + 5e-5], [lat + 1e-4, lon + 1e-4]],
+                'color': 'gray',
+                'length': float(rng.uniform(30, 150)),
+            }
+            edges.add(road_id)
+        total_length = sum(road_segments_data[road_id]['length'] for road_id in edges)
+        route_sections.append({
+            'section_id': f'{direction}_{s // 2}',
+            'segment_name': f'{s // 2 + 1} - Sección sintética {direction}',
+            'direction': direction,
+            'edges': edges,
+            'total_length_meters': round(total_length, 2),
+            'ucp_capacity': round(total_length / 6 * 3, 2),
+        })
+    # Vías del polígono que no pertenecen a ninguna sección
+    for e in range(sections * edges_per_section // 2):
+        road_id = f'x_{e}_0'
+        road_segments_data[road_id] = {'id': road_id, 'name': 'Vía sin nombre', 'coords': [[-12.0, -77.0]] * 2,
+                                       'color': 'gray', 'length': 50.0}
+    return road_segments_data, route_sections
+
+
+def synthetic_traffic(route_sections, vehicle_types, rows, intervals, rng):
+    """Tabla de conteos aleatoria y el ``segment_mapping`` que la traduce a secciones.
+
+    Cada sección tiene un punto de entrada (+1) y uno de salida (-1); las
+    salidas pesan algo menos que las entradas para que las secciones se
+    llenen y se dispare la regla de evacuación."""
+    segment_mapping = {}
+    for s, section in enumerate(route_sections):
+        segment_mapping[(s + 1, 1)] = (section['segment_name'], 1)
+        segment_mapping[(s + 1, 2)] = (section['segment_name'], -1)
+    pairs = np.array(list(segment_mapping), dtype=np.int64)
+    pair_of_row = rng.integers(0, len(pairs), rows)
+    quantity = rng.integers(0, 40, rows)
+    quantity[pairs[pair_of_row, 1] == 2] //= 2
+    time_intervals = [f'Intervalo {i + 1:04d}' for i in range(intervals)]
+    table = TrafficTable(time_intervals, vehicle_types, rng.integers(0, intervals, rows),
+                         pairs[pair_of_row, 0], pairs[pair_of_row, 1],
+                         rng.integers(0, len(vehicle_types), rows), quantity)
+    return table, segment_mapping
+
+
+def synthetic_corridor(sections=6, edges_per_section=20, vehicle_types=11, rows=50000, intervals=96,
+                       seed=0, corridor_id='sintetico'):
+    """``CorridorRuntime`` sintético con el motor construido, más sus tipos de vehículo y pesos."""
+    rng = np.random.default_rng(seed)
+    vehicle_types, ucp_weights = synthetic_vehicle_types(vehicle_types)
+    road_segments_data, route_sections = synthetic_route(sections, edges_per_section, rng)
+    traffic, segment_mapping = synthetic_traffic(route_sections, vehicle_types, rows, intervals, rng)
+    initial_inventory = {section['segment_name']: {vtype: int(rng.integers(0, 20)) for vtype in vehicle_types}
+                         for section in route_sections}
+    config = CorridorConfig(
+        corridor_id=corridor_id,
+        name=f'Corredor sintético ({sections} secciones)',
+        route_polygon=Polygon([(-77.0, -12.0), (-76.8, -12.0), (-76.8, -12.2), (-77.0, -12.2)]),
+        directions=('IDA', 'VUELTA'),
+        key_intersections_ida=[],
+        key_intersections_vuelta=[],
+        segment_names={},
+        segment_mapping=segment_mapping,
+        initial_inventory=initial_inventory,
+        traffic_file='',
+        route_cache_dir='',
+        traffic_table_file='',
+    )
+    runtime = CorridorRuntime(config)
+    runtime.road_segments_data = road_segments_data
+    runtime.sections = route_sections
+    runtime.traffic_table = traffic
+    runtime.time_intervals = list(traffic.time_intervals)
+    runtime.build_engine(vehicle_types, ucp_weights)
+    return runtime, vehicle_types, ucp_weights
+
+
+# ============================================
+# MEDICIÓN
+# ============================================
+
+def measure(fn, repeat, warmup=2):
+    """Duración en segundos de ``repeat`` llamadas a ``fn`` (tras ``warmup`` llamadas descartadas)."""
+    for _ in range(warmup):
+        fn()
+    samples = np.empty(repeat, dtype=np.float64)
+    for i in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples[i] = time.perf_counter() - start
+    return samples
+
+
+def latency_stats(samples):
+    ms = samples * 1000.0
+    return {
+        'n': int(len(samples)),
+        'mean_ms': round(float(ms.mean()), 4),
+        'p50_ms': round(float(np.percentile(ms, 50)), 4),
+        'p90_ms': round(float(np.percentile(ms, 90)), 4),
+        'p99_ms': round(float(np.percentile(ms, 99)), 4),
+        'max_ms': round(float(ms.max()), 4),
+        'ops_per_s': round(float(len(samples) / samples.sum()), 1) if samples.sum() > 0 else None,
+    }
+
+
+def bench_stages(synthetic_params, runtime, vehicle_types, ucp_weights, repeat):
+    """Etapas del motor sobre un corredor sintético ya construido con ``synthetic_params``."""
+    config = runtime.config
+    store = runtime.section_state
+    publisher = runtime.publisher
+    results = {}
+
+    results['build_delta_tensor'] = measure(
+        lambda: build_delta_tensor(runtime.traffic_table, runtime.time_intervals, store.section_names,
+                                   vehicle_types, config.segment_mapping), max(3, repeat // 10))
+    results['interval_replay'] = measure(
+        lambda: IntervalReplay.build(store, config.initial_inventory, runtime.traffic_deltas,
+                                     runtime.time_intervals), max(3, repeat // 10))
+    results['recompute'] = measure(store.recompute, repeat)
+    edge_index = EdgeColorIndex(runtime.sections, runtime.road_segments_data)
+    results['edge_colors'] = measure(
+        lambda: edge_index.edge_color_codes(occupancy_color_codes(store.occupancy)), repeat)
+    results['build_snapshot'] = measure(
+        lambda: build_snapshot(runtime.update_counter, runtime.last_update_timestamp, 0, 'N/A',
+                               len(runtime.time_intervals), runtime.sections, runtime.road_segments_data,
+                               store, runtime.edge_index, runtime.edge_color_codes,
+                               runtime.geometry.version), repeat)
+    results['spatial_index_build'] = measure(
+        lambda: EdgeSpatialIndex.build(runtime.road_segments_data, edge_index), max(3, repeat // 10))
+    spatial = EdgeSpatialIndex.build(runtime.road_segments_data, edge_index)
+    rng = np.random.default_rng(0)
+    coords = np.concatenate([np.asarray(segment['coords']) for segment in runtime.road_segments_data.values()])
+    probes = coords[rng.integers(0, len(coords), MATCH_PROBES)] + rng.normal(0, 1e-4, (MATCH_PROBES, 2))
+    results[f'match_{MATCH_PROBES}_points'] = measure(lambda: spatial.match(probes[:, 0], probes[:, 1]), repeat)
+    previous = publisher.latest()
+    results['tick_event'] = measure(lambda: build_tick_event(previous, publisher.latest()), repeat)
+
+    # El planificador toma los conteos del corredor como vista: se mide sobre una copia
+    clone, _, _ = synthetic_corridor(**synthetic_params)
+    scheduler = CorridorScheduler([clone], vehicle_types, ucp_weights)
+    results['scheduler_tick'] = measure(scheduler.tick, repeat)
+    return {name: latency_stats(samples) for name, samples in results.items()}
+
+
+def bench_endpoints(runtime, vehicle_types, ucp_weights, repeat):
+    """Endpoints de app.py con el cliente de prueba de Flask, sirviendo el corredor sintético
+    (sin el log INFO por petición, que solo mediría la consola)."""
+    import backend
+    backend.install_corridor_runtimes([runtime], vehicle_types, ucp_weights)
+    backend.scheduler.tick()
+    from app import app
+
+    client = app.test_client()
+    logging.disable(logging.INFO)
+    try:
+        return measure_endpoints(client, repeat)
+    finally:
+        logging.disable(logging.NOTSET)
+
+
+def measure_endpoints(client, repeat):
+    results = {}
+    for path in SNAPSHOT_ENDPOINTS + QUERY_ENDPOINTS:
+        response = client.get(path)
+        if response.status_code != 200:
+            logging.warning(f"⚠️ {path} respondió {response.status_code}")
+            continue
+        results[f'GET {path}'] = latency_stats(measure(lambda: client.get(path), repeat))
+        etag = response.headers.get('ETag')
+        if etag:
+            results[f'GET {path} (304)'] = latency_stats(
+                measure(lambda: client.get(path, headers={'If-None-Match': etag}), repeat))
+    return results
+
+
+# ============================================
+# RESULTADOS
+# ============================================
+
+def current_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def save_run(path, run):
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    with open(path, 'a', encoding='utf-8') as f:
+        f.write(json.dumps(run, ensure_ascii=False) + '\n')
+
+
+def previous_run(path, params):
+    """Última corrida guardada con los mismos parámetros, o ``None``."""
+    if not os.path.exists(path):
+        return None
+    match = None
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            run = json.loads(line)
+            if run.get('params') == params:
+                match = run
+    return match
+
+
+def report(run, baseline=None):
+    for case, stages in run['results'].items():
+        logging.info(f"\n📏 {case}")
+        base_stages = (baseline or {}).get('results', {}).get(case, {})
+        for name, stats in stages.items():
+            line = (f"  {name:<48} p50 {stats['p50_ms']:>10.3f} ms | p90 {stats['p90_ms']:>10.3f} ms | "
+                    f"p99 {stats['p99_ms']:>10.3f} ms | {stats['ops_per_s'] or 0:>10.1f} op/s")
+            if name in base_stages and base_stages[name]['p50_ms'] > 0:
+                ratio = stats['p50_ms'] / base_stages[name]['p50_ms']
+                line += f" | x{ratio:.2f} vs {baseline.get('commit') or 'corrida anterior'}"
+            logging.info(line)
+
+
+def parse_sizes(value):
+    return [int(v) for v in value.split(',') if v.strip()]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmarks de la simulación y de los endpoints.")
+    parser.add_argument('--sections', type=parse_sizes, default=[6, 60, 600],
+                        help="Número de secciones de cada caso, separados por coma.")
+    parser.add_argument('--edges-per-section', type=int, default=20)
+    parser.add_argument('--vehicle-types', type=int, default=len(UCP_WEIGHTS))
+    parser.add_argument('--rows', type=int, default=50000, help="Filas de conteo (registros del Excel).")
+    parser.add_argument('--intervals', type=int, default=96)
+    parser.add_argument('--repeat', type=int, default=50)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--no-endpoints', action='store_true', help="No medir los endpoints de Flask.")
+    parser.add_argument('--output', default=RESULTS_FILE)
+    parser.add_argument('--compare', action='store_true',
+                        help="Comparar con la última corrida guardada con los mismos parámetros.")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+
+    params = {
+        'sections': args.sections,
+        'edges_per_section': args.edges_per_section,
+        'vehicle_types': args.vehicle_types,
+        'rows': args.rows,
+        'intervals': args.intervals,
+        'repeat': args.repeat,
+        'seed': args.seed,
+        'endpoints': not args.no_endpoints,
+    }
+    baseline = previous_run(args.output, params) if args.compare else None
+
+    results = {}
+    for sections in args.sections:
+        synthetic_params = dict(sections=sections, edges_per_section=args.edges_per_section,
+                                vehicle_types=args.vehicle_types, rows=args.rows,
+                                intervals=args.intervals, seed=args.seed)
+        runtime, vehicle_types, ucp_weights = synthetic_corridor(**synthetic_params)
+        case = f'{sections} secciones'
+        logging.info(f"⏱️ Midiendo {case} ({len(runtime.road_segments_data)} edges, {args.rows} filas)...")
+        results[case] = bench_stages(synthetic_params, runtime, vehicle_types, ucp_weights, args.repeat)
+        if not args.no_endpoints:
+            results[case].update(bench_endpoints(runtime, vehicle_types, ucp_weights, args.repeat))
+
+    run = {
+        'commit': current_commit(),
+        'timestamp': time.time(),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'machine': platform.machine(),
+        'params': params,
+        'results': results,
+    }
+    report(run, baseline)
+    save_run(args.output, run)
+    logging.info(f"\n💾 Resultados agregados a '{args.output}'")
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,178 @@
+"""Caché binario columnar de la red vial y las secciones de la ruta.
+
+Reemplaza a ``segments_cache.json`` / ``sections_cache.json``. Cada columna se
+guarda como un ``.npy`` independiente dentro de un directorio, de modo que
+se puede abrir con ``mmap_mode='r'`` y solo se leen las páginas que se usan:
+
+- ``edge_ids`` / ``edge_id_offsets``: ids de edge en UTF-8 concatenados.
+- ``coords`` / ``coord_offsets``: coordenadas ``[lat, lon]`` de todos los
+  edges en un solo array (N × 2) más los offsets de cada edge.
+- ``name_index`` + ``names`` / ``name_offsets``: nombre de vía categorizado.
+- ``lengths``: longitud en metros de cada edge.
+- ``section_edges`` / ``section_edge_offsets``: índices de edge por sección.
+
+``header.json`` guarda la versión del formato, la huella de la configuración
+de la ruta (polígono, intersecciones clave, nombres de segmentos, capacidad)
+y los metadatos escalares de cada sección. Si la huella no coincide, el
+caché se considera inválido.
+"""
+import hashlib
+import json
+import logging
+import os
+import shutil
+from collections.abc import Mapping
+
+import numpy as np
+
+BINARY_CACHE_VERSION = 1
+
+
+def route_fingerprint(route_polygon, key_intersections_ida, key_intersections_vuelta,
+                      segment_names, lanes_per_road, meters_per_ucp):
+    """Huella de la configuración de la ruta de la que depende el caché."""
+    payload = json.dumps({
+        'polygon': route_polygon.wkt,
+        'ida': key_intersections_ida,
+        'vuelta': key_intersections_vuelta,
+        'segment_names': segment_names,
+        'lanes_per_road': lanes_per_road,
+        'meters_per_ucp': meters_per_ucp,
+    }, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha1(payload.encode('utf-8')).hexdigest()
+
+
+def _pack_strings(values):
+    """Concatena cadenas en un buffer UTF-8 con offsets (len + 1 posiciones)."""
+    encoded = [v.encode('utf-8') for v in values]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    if encoded:
+        offsets[1:] = np.cumsum([len(e) for e in encoded])
+    return np.frombuffer(b''.join(encoded), dtype=np.uint8).copy(), offsets
+
+
+def _unpack_string(buffer, offsets, index):
+    return bytes(buffer[offsets[index]:offsets[index + 1]]).decode('utf-8')
+
+
+class RoadSegmentTable(Mapping):
+    """Vista de solo lectura ``road_id -> segmento`` sobre las columnas del caché.
+
+    Se comporta como el antiguo diccionario ``road_segments_data`` pero solo
+    construye el dict de un segmento cuando se accede a él.
+    """
+
+    def __init__(self, columns):
+        self._columns = columns
+        self._edge_ids = [_unpack_string(columns['edge_ids'], columns['edge_id_offsets'], i)
+                          for i in range(len(columns['edge_id_offsets']) - 1)]
+        self._position = {road_id: i for i, road_id in enumerate(self._edge_ids)}
+        self._names = [_unpack_string(columns['names'], columns['name_offsets'], i)
+                       for i in range(len(columns['name_offsets']) - 1)]
+
+    def __getitem__(self, road_id):
+        i = self._position[road_id]
+        columns = self._columns
+        start, end = columns['coord_offsets'][i], columns['coord_offsets'][i + 1]
+        return {
+            'id': road_id,
+            'name': self._names[columns['name_index'][i]],
+            'coords': columns['coords'][start:end].tolist(),
+            'color': 'gray',
+            'length': float(columns['lengths'][i])
+        }
+
+    def __contains__(self, road_id):
+        return road_id in self._position
+
+    def __iter__(self):
+        return iter(self._edge_ids)
+
+    def __len__(self):
+        return len(self._edge_ids)
+
+    def edge_position(self, road_id):
+        return self._position[road_id]
+
+
+def save_binary_cache(cache_dir, fingerprint, road_segments_data, sections):
+    """Escribe el caché binario de forma atómica (directorio temporal + rename)."""
+    edge_ids = list(road_segments_data.keys())
+    position = {road_id: i for i, road_id in enumerate(edge_ids)}
+    segments = [road_segments_data[road_id] for road_id in edge_ids]
+
+    name_table = {}
+    name_index = np.array([name_table.setdefault(s['name'], len(name_table)) for s in segments], dtype=np.int32)
+    coord_counts = [len(s['coords']) for s in segments]
+    coord_offsets = np.zeros(len(segments) + 1, dtype=np.int64)
+    coord_offsets[1:] = np.cumsum(coord_counts)
+    coords = np.array([pt for s in segments for pt in s['coords']], dtype=np.float64).reshape(-1, 2)
+
+    section_edge_lists = [sorted(position[e] for e in s['edges'] if e in position) for s in sections]
+    section_edge_offsets = np.zeros(len(sections) + 1, dtype=np.int64)
+    section_edge_offsets[1:] = np.cumsum([len(lst) for lst in section_edge_lists])
+
+    edge_id_buffer, edge_id_offsets = _pack_strings(edge_ids)
+    names_buffer, name_offsets = _pack_strings(list(name_table))
+    columns = {
+        'edge_ids': edge_id_buffer,
+        'edge_id_offsets': edge_id_offsets,
+        'coords': coords,
+        'coord_offsets': coord_offsets,
+        'name_index': name_index,
+        'names': names_buffer,
+        'name_offsets': name_offsets,
+        'lengths': np.array([s['length'] for s in segments], dtype=np.float64),
+        'section_edges': np.array([e for lst in section_edge_lists for e in lst], dtype=np.int32),
+        'section_edge_offsets': section_edge_offsets,
+    }
+    header = {
+        'version': BINARY_CACHE_VERSION,
+        'fingerprint': fingerprint,
+        'edge_count': len(edge_ids),
+        'sections': [{
+            key: value for key, value in s.items()
+            if key not in ('edges', 'vehicle_counts', 'ucp_density', 'occupancy_percentage')
+        } for s in sections],
+    }
+
+    tmp_dir = cache_dir + '.tmp'
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+    for name, array in columns.items():
+        np.save(os.path.join(tmp_dir, f'{name}.npy'), array)
+    with open(os.path.join(tmp_dir, 'header.json'), 'w', encoding='utf-8') as f:
+        json.dump(header, f, ensure_ascii=False)
+    shutil.rmtree(cache_dir, ignore_errors=True)
+    os.replace(tmp_dir, cache_dir)
+
+
+def load_binary_cache(cache_dir, fingerprint):
+    """Abre el caché binario con mmap. Devuelve ``(road_segments, sections)`` o
+    ``None`` si no existe, es de otra versión o su huella no coincide."""
+    header_path = os.path.join(cache_dir, 'header.json')
+    if not os.path.exists(header_path):
+        return None
+    with open(header_path, 'r', encoding='utf-8') as f:
+        header = json.load(f)
+    if header.get('version') != BINARY_CACHE_VERSION:
+        logging.info("⚠️ Caché binario de otra versión, se ignora")
+        return None
+    if header.get('fingerprint') != fingerprint:
+        logging.info("⚠️ Caché binario generado con otra configuración de ruta, se ignora")
+        return None
+
+    columns = {}
+    for entry in os.listdir(cache_dir):
+        if entry.endswith('.npy'):
+            columns[entry[:-4]] = np.load(os.path.join(cache_dir, entry), mmap_mode='r')
+
+    road_segments = RoadSegmentTable(columns)
+    offsets = columns['section_edge_offsets']
+    edge_ids = list(road_segments)
+    sections = []
+    for i, meta in enumerate(header['sections']):
+        section = dict(meta)
+        section['edges'] = {edge_ids[e] for e in columns['section_edges'][offsets[i]:offsets[i + 1]]}
+        sections.append(section)
+    return road_segments, sections
@@ -0,0 +1,62 @@
+"""Variantes comprimidas de los cuerpos preserializados.
+
+Los cuerpos JSON de cada instantánea (y la geometría de la ruta) se
+comprimen una sola vez al publicarse, con gzip y, si está instalado el
+paquete ``brotli``, también con brotli. Cada petición solo elige la
+variante según ``Accept-Encoding``: no se comprime nada por petición.
+"""
+import gzip
+
+try:
+    import brotli
+except ImportError:  # brotli es opcional: sin él solo se ofrece gzip
+    brotli = None
+
+MIN_COMPRESS_SIZE = 512  # Por debajo de esto la compresión no compensa
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+PREFERRED_ENCODINGS = ('br', 'gzip')
+
+
+def compress_variants(body):
+    """``{codificación: bytes}`` con las variantes que resultan más chicas que ``body``."""
+    if len(body) < MIN_COMPRESS_SIZE:
+        return {}
+    # mtime=0: mismos bytes en todos los workers para la misma instantánea
+    variants = {'gzip': gzip.compress(body, GZIP_LEVEL, mtime=0)}
+    if brotli is not None:
+        variants['br'] = brotli.compress(body, quality=BROTLI_QUALITY)
+    return {encoding: data for encoding, data in variants.items() if len(data) < len(body)}
+
+
+def accepted_encodings(accept_encoding):
+    """Codificaciones aceptadas (q > 0) de una cabecera ``Accept-Encoding``."""
+    accepted = set()
+    rejected = set()
+    for item in (accept_encoding or '').split(','):
+        name, _, params = item.strip().partition(';')
+        name = name.strip().lower()
+        if not name:
+            continue
+        quality = 1.0
+        for param in params.split(';'):
+            key, _, value = param.strip().partition('=')
+            if key.strip().lower() == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        (accepted if quality > 0 else rejected).add(name)
+    if '*' in accepted:
+        accepted.update(e for e in PREFERRED_ENCODINGS if e not in rejected)
+    return accepted
+
+
+def select_variant(body, variants, accept_encoding):
+    """``(cuerpo, codificación)`` a enviar; la codificación es ``None`` para el original."""
+    if variants:
+        accepted = accepted_encodings(accept_encoding)
+        for encoding in PREFERRED_ENCODINGS:
+            if encoding in variants and encoding in accepted:
+                return variants[encoding], encoding
+    return body, None
@@ -0,0 +1,237 @@
+"""Estado por corredor y planificador único de la simulación.
+
+Cada corredor (``CorridorRuntime``) tiene su ruta, su tabla de tráfico, su
+tensor de deltas, su jornada reproducida y su propio publicador de
+instantáneas y log de eventos. El ``CorridorScheduler`` avanza todos los
+corredores en un mismo tick: los conteos de todos viven en una única matriz
+(secciones de todos los corredores × tipos de vehículo) y el almacén de cada
+corredor es una vista de sus filas, así que sumar deltas, aplicar la regla
+de evacuación y recalcular densidad, ocupación, velocidad y tiempo de viaje
+son una sola operación vectorizada para todos los corredores.
+"""
+import threading
+import time
+
+import numpy as np
+
+from section_state import SectionStateStore, EdgeColorIndex, IntervalReplay, occupancy_color_codes
+from simulation_engine import build_delta_tensor, initial_counts_matrix, apply_deltas, evacuate_overflow
+from snapshot import SnapshotPublisher, build_snapshot
+from tick_stream import TickEventLog, build_tick_event
+from metrics import RECOMPUTE_SECONDS, SNAPSHOT_SECONDS
+from geometry import RouteGeometry
+from state_delta import SnapshotHistory
+from spatial_index import EdgeSpatialIndex
+
+# Con conteos en vivo (ver live_ingest.py) no hay intervalo de la jornada
+LIVE_INTERVAL_INDEX = -2
+LIVE_INTERVAL_LABEL = 'EN VIVO'
+
+
+class CorridorRuntime:
+    """Datos cargados y estado de simulación de un corredor."""
+
+    def __init__(self, config):
+        self.config = config
+        self.road_segments_data = {}
+        self.sections = []
+        self.traffic_table = None  # TrafficTable columnar con los conteos del Excel
+        self.time_intervals = []
+        self.traffic_deltas = None  # Tensor (intervalos × secciones × tipos de vehículo)
+        self.section_state = None  # SectionStateStore con conteos, capacidades y ocupación
+        self.edge_index = None  # EdgeColorIndex: edge de la ruta -> índice de sección
+        self.interval_replay = None  # IntervalReplay: estado de la jornada completa por intervalo
+        self.edge_color_codes = None  # Código de color actual de cada edge de la ruta
+        self.geometry = None  # RouteGeometry: geometría compacta de los edges de la ruta
+        self._spatial_index = None  # EdgeSpatialIndex, se arma con la primera consulta
+        self._spatial_index_lock = threading.Lock()
+        self.simulation_step = 0
+        self.update_counter = 0
+        self.last_update_timestamp = 0
+        self.publisher = SnapshotPublisher()  # Última instantánea publicada del corredor
+        self.event_log = TickEventLog()  # Últimos deltas por tick para /api/stream
+        self.history = SnapshotHistory()  # Últimas instantáneas para /api/changes?since=
+
+    @property
+    def corridor_id(self):
+        return self.config.corridor_id
+
+    @property
+    def route_loaded(self):
+        return bool(self.road_segments_data) and bool(self.sections)
+
+    @property
+    def has_traffic(self):
+        return self.traffic_table is not None and not self.traffic_table.empty and bool(self.time_intervals)
+
+    def spatial_index(self):
+        """``EdgeSpatialIndex`` de los edges del corredor (se arma una vez, al primer uso)."""
+        with self._spatial_index_lock:
+            if self._spatial_index is None:
+                self._spatial_index = EdgeSpatialIndex.build(self.road_segments_data, self.edge_index)
+            return self._spatial_index
+
+    def build_engine(self, vehicle_types, ucp_weights):
+        """Agrupa una sola vez los conteos en el tensor de deltas y reproduce la jornada."""
+        config = self.config
+        self.section_state = SectionStateStore.from_sections(self.sections, vehicle_types, ucp_weights,
+                                                             config.lanes_per_road, config.meters_per_ucp,
+                                                             config.free_flow_speed_kmh)
+        self.edge_index = EdgeColorIndex(self.sections, self.road_segments_data)
+        self.geometry = RouteGeometry.build(self.edge_index, self.road_segments_data)
+        self._spatial_index = None
+        self.section_state.reset(self.config.initial_inventory)
+        self.traffic_deltas = build_delta_tensor(self.traffic_table, self.time_intervals,
+                                                 self.section_state.section_names, vehicle_types,
+                                                 self.config.segment_mapping)
+        self.interval_replay = IntervalReplay.build(self.section_state, self.config.initial_inventory,
+                                                    self.traffic_deltas, self.time_intervals)
+        self.refresh_colors()
+        self.publish(0, "N/A")
+
+    def refresh_colors(self, version=None, timestamp=None):
+        """Nueva versión del estado: colores de los edges a partir de la ocupación ya calculada.
+
+        Sin argumentos la versión y la marca de tiempo son las siguientes
+        locales; un worker lector pasa las del escritor.
+        """
+        self.last_update_timestamp = time.time() if timestamp is None else timestamp
+        self.update_counter = self.update_counter + 1 if version is None else version
+        self.edge_color_codes = self.edge_index.edge_color_codes(
+            occupancy_color_codes(self.section_state.occupancy))
+
+    def shared_record(self, step, interval_index):
+        """Estado mínimo para publicar en el archivo compartido (ver shared_state.py)."""
+        return (self.update_counter, self.last_update_timestamp, step, interval_index, self.section_state.counts)
+
+    def apply_shared_state(self, record):
+        """Adopta el estado publicado por el worker escritor y publica la misma instantánea."""
+        store = self.section_state
+        store.counts[:] = record.counts
+        with RECOMPUTE_SECONDS.time(source='shared_state'):
+            store.recompute()
+        self.refresh_colors(record.version, record.timestamp)
+        if record.interval_index == LIVE_INTERVAL_INDEX:
+            current_interval = LIVE_INTERVAL_LABEL
+            self.simulation_step = record.simulation_step
+        elif 0 <= record.interval_index < len(self.time_intervals):
+            current_interval = self.time_intervals[record.interval_index]
+            # Si este worker pasa a escribir, sigue con el intervalo siguiente
+            self.simulation_step = (record.interval_index + 1) % len(self.time_intervals)
+        else:
+            current_interval = "N/A"
+            self.simulation_step = 0
+        self.publish(record.simulation_step, current_interval)
+
+    def publish(self, step, current_interval):
+        """Publica la instantánea inmutable del estado recién recalculado.
+
+        El delta del tick se registra antes de publicar, así los clientes del
+        canal de eventos que despiertan con la nueva versión ya lo encuentran.
+        """
+        with SNAPSHOT_SECONDS.time():
+            snapshot = build_snapshot(
+                self.update_counter, self.last_update_timestamp, step, current_interval, len(self.time_intervals),
+                self.sections, self.road_segments_data, self.section_state, self.edge_index, self.edge_color_codes,
+                self.geometry.version)
+        self.event_log.append(snapshot.version, build_tick_event(self.publisher.latest(), snapshot))
+        self.history.append(snapshot)
+        self.publisher.publish(snapshot)
+
+
+class CorridorTick:
+    """Resultado de un tick para un corredor (para registro)."""
+    __slots__ = ('runtime', 'step', 'interval', 'evacuated', 'restarted', 'interval_index')
+
+    def __init__(self, runtime, step, interval, evacuated, restarted, interval_index=None):
+        self.runtime = runtime
+        self.step = step
+        self.interval = interval
+        self.evacuated = evacuated
+        self.restarted = restarted
+        self.interval_index = step if interval_index is None else interval_index
+
+
+class CorridorScheduler:
+    """Avanza todos los corredores con datos en un único paso vectorizado."""
+
+    def __init__(self, runtimes, vehicle_types, ucp_weights, threshold=100.0, keep_ratio=0.45,
+                 require_traffic=True):
+        # Con conteos en vivo basta la ruta: la jornada del Excel no se usa
+        self.runtimes = [r for r in runtimes
+                         if r.section_state is not None and (r.has_traffic or not require_traffic)]
+        self.threshold = threshold
+        self.keep_ratio = keep_ratio
+
+        bounds = np.cumsum([0] + [len(r.section_state) for r in self.runtimes])
+        self.slices = [slice(int(a), int(b)) for a, b in zip(bounds[:-1], bounds[1:])]
+        self.counts = np.zeros((int(bounds[-1]), len(vehicle_types)), dtype=np.int32)
+        self._initial_counts = np.zeros_like(self.counts)
+        self._step_deltas = np.zeros(self.counts.shape, dtype=np.int64)
+
+        # Estructura combinada (pesos, capacidades, longitudes y parámetros del diagrama
+        # fundamental) para la densidad y la velocidad de todas las secciones
+        def combined(attr):
+            return np.concatenate([getattr(r.section_state, attr) for r in self.runtimes]) if self.runtimes else []
+
+        self._combined = SectionStateStore(
+            [name for r in self.runtimes for name in r.section_state.section_names],
+            vehicle_types, ucp_weights, combined('capacity'), combined('length'),
+            combined('lanes'), combined('jam_density'), combined('free_flow_speed'))
+
+        for runtime, rows in zip(self.runtimes, self.slices):
+            store = runtime.section_state
+            self.counts[rows] = store.counts
+            self._initial_counts[rows] = initial_counts_matrix(store.section_names, store.vehicle_types,
+                                                               runtime.config.initial_inventory)
+            # El almacén del corredor pasa a ser una vista de sus filas en la matriz combinada
+            store.counts = self.counts[rows]
+
+    def __len__(self):
+        return len(self.runtimes)
+
+    def tick(self, live_deltas=None):
+        """Aplica el intervalo actual de cada corredor, publica sus instantáneas
+        y los avanza al siguiente intervalo. Devuelve un ``CorridorTick`` por corredor.
+
+        Con ``live_deltas`` (``{corridor_id: deltas (secciones × tipos)}``) se
+        aplican esos conteos en vivo en lugar del intervalo de la jornada, que
+        no avanza ni se reinicia."""
+        restarted = []
+        for runtime, rows in zip(self.runtimes, self.slices):
+            if live_deltas is not None:
+                restarted.append(False)
+                deltas = live_deltas.get(runtime.corridor_id)
+                self._step_deltas[rows] = 0 if deltas is None else deltas
+                continue
+            restarted.append(runtime.simulation_step == 0)
+            if runtime.simulation_step == 0:
+                self.counts[rows] = self._initial_counts[rows]
+            self._step_deltas[rows] = runtime.traffic_deltas[runtime.simulation_step]
+
+        apply_deltas(self.counts, self._step_deltas)
+        overflow = evacuate_overflow(self.counts, self._combined.weights, self._combined.capacity,
+                                     self.threshold, self.keep_ratio)
+        with RECOMPUTE_SECONDS.time(source='tick'):
+            ucp_density, occupancy = self._combined.density_and_occupancy(self.counts)
+            speed, travel_time = self._combined.speed_and_travel_time(ucp_density)
+
+        results = []
+        for runtime, rows, was_restarted in zip(self.runtimes, self.slices, restarted):
+            store = runtime.section_state
+            store.ucp_density = ucp_density[rows]
+            store.occupancy = occupancy[rows]
+            store.speed = speed[rows]
+            store.travel_time = travel_time[rows]
+            step = runtime.simulation_step
+            if live_deltas is None:
+                interval, interval_index = runtime.time_intervals[step], step
+            else:
+                interval, interval_index = LIVE_INTERVAL_LABEL, LIVE_INTERVAL_INDEX
+            runtime.refresh_colors()
+            runtime.publish(step, interval)
+            results.append(CorridorTick(runtime, step, interval, np.flatnonzero(overflow[rows]), was_restarted,
+                                        interval_index))
+            if live_deltas is None:
+                runtime.simulation_step = (step + 1) % len(runtime.time_intervals)
+        return results
@@ -0,0 +1,141 @@
+"""Definiciones de corredores viales.
+
+Cada corredor tiene su polígono, sus intersecciones clave por sentido, los
+nombres de sus secciones, el mapeo de puntos de control del Excel a
+secciones, su inventario inicial y su propio archivo de conteos. El
+corredor por defecto (Av. Pachacútec) sale de ``route_config.py``; se pueden
+declarar más en un JSON (``corridors.json`` o la ruta de la variable de
+entorno ``CORRIDORS_FILE``) con esta forma::
+
+    [
+      {
+        "id": "pachacutec",
+        "name": "Av. Pachacútec",
+        "polygon": [[lon, lat], ...],
+        "directions": ["VMT→SJM", "SJM→VMT"],
+        "key_intersections": {"VMT→SJM": [[lat, lon], ...], "SJM→VMT": [...]},
+        "segment_names": {"VMT→SJM": ["..."], "SJM→VMT": ["..."]},
+        "segment_mapping": [[nro_punto, sentido, "sección", 1], ...],
+        "initial_inventory": {"sección": {"Auto": 20, ...}},
+        "traffic_file": "data_transito.xlsx",
+        "overpass_dir": "cache",
+        "lanes_per_road": 3,
+        "meters_per_ucp": 6,
+        "free_flow_speed_kmh": 40
+      }
+    ]
+
+Si el JSON no existe se usa solo el corredor por defecto.
+"""
+import json
+import logging
+import os
+from dataclasses import dataclass, field
+
+from shapely.geometry import Polygon
+
+import route_config
+from binary_cache import route_fingerprint
+
+CORRIDORS_FILE = os.environ.get('CORRIDORS_FILE', 'corridors.json')
+CACHE_DIR = 'cache'
+
+
+@dataclass(frozen=True)
+class CorridorConfig:
+    """Configuración estática de un corredor."""
+    corridor_id: str
+    name: str
+    route_polygon: Polygon
+    directions: tuple  # (ida, vuelta)
+    key_intersections_ida: list
+    key_intersections_vuelta: list
+    segment_names: dict
+    segment_mapping: dict  # (NroPunto, Sentido) -> (sección, +1 / -1)
+    initial_inventory: dict
+    traffic_file: str = 'data_transito.xlsx'
+    overpass_dir: str = CACHE_DIR
+    lanes_per_road: int = route_config.LANES_PER_ROAD
+    meters_per_ucp: float = route_config.METERS_PER_UCP
+    free_flow_speed_kmh: float = route_config.FREE_FLOW_SPEED_KMH
+    route_cache_dir: str = field(default=None)
+    traffic_table_file: str = field(default=None)
+
+    def __post_init__(self):
+        # Cada corredor tiene sus propios archivos de caché salvo que se indiquen
+        if self.route_cache_dir is None:
+            object.__setattr__(self, 'route_cache_dir',
+                               os.path.join(CACHE_DIR, f'route_cache_{self.corridor_id}'))
+        if self.traffic_table_file is None:
+            object.__setattr__(self, 'traffic_table_file',
+                               os.path.join(CACHE_DIR, f'traffic_table_{self.corridor_id}.npz'))
+
+    def fingerprint(self):
+        """Huella de la configuración de la ruta; invalida el caché binario si cambia."""
+        return route_fingerprint(self.route_polygon, self.key_intersections_ida, self.key_intersections_vuelta,
+                                 self.segment_names, self.lanes_per_road, self.meters_per_ucp)
+
+
+DEFAULT_CORRIDOR = CorridorConfig(
+    corridor_id=route_config.CORRIDOR_ID,
+    name=route_config.CORRIDOR_NAME,
+    route_polygon=route_config.ROUTE_POLYGON,
+    directions=route_config.DIRECTIONS,
+    key_intersections_ida=route_config.KEY_INTERSECTIONS_IDA,
+    key_intersections_vuelta=route_config.KEY_INTERSECTIONS_VUELTA,
+    segment_names=route_config.SEGMENT_NAMES,
+    segment_mapping=route_config.SEGMENT_MAPPING,
+    initial_inventory=route_config.INITIAL_INVENTORY,
+    # Rutas históricas del corredor original (las genera el build)
+    route_cache_dir=os.path.join(CACHE_DIR, 'route_cache'),
+    traffic_table_file=os.path.join(CACHE_DIR, 'traffic_table.npz'),
+)
+
+
+def corridor_from_dict(entry):
+    """``CorridorConfig`` a partir de una entrada del JSON de corredores."""
+    corridor_id = entry['id']
+    directions = tuple(entry.get('directions') or list(entry['segment_names']))
+    if len(directions) != 2:
+        raise ValueError(f"El corredor '{corridor_id}' debe declarar dos sentidos (ida y vuelta)")
+    key_intersections = entry['key_intersections']
+    optional = {key: entry[key] for key in ('traffic_file', 'overpass_dir', 'lanes_per_road', 'meters_per_ucp',
+                                            'free_flow_speed_kmh')
+                if key in entry}
+    if 'route_cache_dir' in entry:
+        optional['route_cache_dir'] = entry['route_cache_dir']
+    if 'traffic_table_file' in entry:
+        optional['traffic_table_file'] = entry['traffic_table_file']
+    return CorridorConfig(
+        corridor_id=corridor_id,
+        name=entry.get('name', corridor_id),
+        route_polygon=Polygon(entry['polygon']),
+        directions=directions,
+        key_intersections_ida=key_intersections[directions[0]],
+        key_intersections_vuelta=key_intersections[directions[1]],
+        segment_names=entry['segment_names'],
+        segment_mapping={(int(point), int(direction)): (segment_name, int(operation))
+                         for point, direction, segment_name, operation in entry['segment_mapping']},
+        initial_inventory=entry.get('initial_inventory', {}),
+        **optional,
+    )
+
+
+def load_corridor_configs(path=CORRIDORS_FILE):
+    """Corredores declarados en ``path``, o solo el corredor por defecto si no existe."""
+    if not os.path.exists(path):
+        return [DEFAULT_CORRIDOR]
+    with open(path, 'r', encoding='utf-8') as f:
+        entries = json.load(f)
+    corridors = []
+    for entry in entries:
+        # El corredor por defecto se puede listar solo por id para conservar su definición
+        if set(entry) == {'id'} and entry['id'] == DEFAULT_CORRIDOR.corridor_id:
+            corridors.append(DEFAULT_CORRIDOR)
+        else:
+            corridors.append(corridor_from_dict(entry))
+    ids = [c.corridor_id for c in corridors]
+    if len(set(ids)) != len(ids):
+        raise ValueError(f"Ids de corredor repetidos en '{path}': {ids}")
+    logging.info(f"🛣️ {len(corridors)} corredor(es) configurado(s) desde '{path}': {ids}")
+    return corridors
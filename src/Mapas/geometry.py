@@ -0,0 +1,93 @@
+"""Geometría compacta de la ruta para los clientes del mapa.
+
+La geometría de los edges de la ruta no cambia después del arranque, así
+que se sirve una sola vez (``/api/road_geometry``) con cada edge codificado
+como polyline (algoritmo de Google, precisión 5 = ~1 m). El cuerpo se
+identifica por su hash de contenido: pedido con ``?v=<hash>`` se puede
+cachear para siempre. En cada sondeo basta ``/api/road_state``, que solo
+trae un dígito de color por edge en el mismo orden que la geometría.
+"""
+import hashlib
+
+import numpy as np
+
+from compression import compress_variants
+from snapshot import serialize_payload
+
+POLYLINE_PRECISION = 5
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+
+def encode_polyline(coords, precision=POLYLINE_PRECISION):
+    """Codifica ``[[lat, lon], ...]`` con el algoritmo de polyline de Google."""
+    if len(coords) == 0:
+        return ''
+    quantized = np.round(np.asarray(coords, dtype=np.float64) * 10 ** precision).astype(np.int64)
+    deltas = np.diff(quantized, axis=0, prepend=np.zeros((1, 2), dtype=np.int64)).reshape(-1)
+    # Zigzag: el signo pasa al bit menos significativo
+    values = np.where(deltas < 0, ~(deltas << 1), deltas << 1).tolist()
+    chars = []
+    for value in values:
+        while value >= 0x20:
+            chars.append(chr((0x20 | (value & 0x1f)) + 63))
+            value >>= 5
+        chars.append(chr(value + 63))
+    return ''.join(chars)
+
+
+def decode_polyline(encoded, precision=POLYLINE_PRECISION):
+    """Inversa de ``encode_polyline`` (para verificar y para clientes en Python)."""
+    values = []
+    value = shift = 0
+    for char in encoded:
+        byte = ord(char) - 63
+        value |= (byte & 0x1f) << shift
+        shift += 5
+        if byte < 0x20:
+            values.append(~(value >> 1) if value & 1 else value >> 1)
+            value = shift = 0
+    coords = np.cumsum(np.array(values, dtype=np.int64).reshape(-1, 2), axis=0) / 10 ** precision
+    return coords.tolist()
+
+
+class RouteGeometry:
+    """Geometría de los edges de la ruta, en el orden de ``EdgeColorIndex.route_edges``."""
+
+    def __init__(self, payload, body, version):
+        self.payload = payload
+        self.body = body
+        self.version = version
+        self.encoded = compress_variants(body)
+
+    @classmethod
+    def build(cls, edge_index, road_segments_data, precision=POLYLINE_PRECISION):
+        street_names = []
+        street_index = {}
+        streets, polylines, lengths = [], [], []
+        for road_id in edge_index.route_edges:
+            segment = road_segments_data[road_id]
+            name = segment.get('name', '')
+            if name not in street_index:
+                street_index[name] = len(street_names)
+                street_names.append(name)
+            streets.append(street_index[name])
+            polylines.append(encode_polyline(segment['coords'], precision))
+            lengths.append(round(float(segment.get('length', 0)), 1))
+
+        payload = {
+            'encoding': 'polyline',
+            'precision': precision,
+            'count': len(edge_index),
+            'ids': list(edge_index.route_edges),
+            'polylines': polylines,
+            'sections': edge_index.edge_section.tolist(),  # índice en /api/traffic_data 'sections'
+            'street_names': street_names,
+            'streets': streets,
+            'lengths': lengths,
+        }
+        version = hashlib.sha1(serialize_payload(payload)).hexdigest()[:16]
+        payload['version'] = version
+        return cls(payload, serialize_payload(payload), version)
+
+    def __len__(self):
+        return self.payload['count']
@@ -0,0 +1,367 @@
+"""Historial persistente de ocupación por sección y KPIs (serie temporal en disco).
+
+Cada corredor tiene un directorio ``cache/history/<corridor_id>/`` con:
+
+- ``ticks.bin``: un registro de ancho fijo por tick (marca de tiempo,
+  versión, intervalo, ocupación global, secciones en rojo y, por sección,
+  densidad UCP, ocupación y vehículos), solo se agregan bytes al final.
+- ``rollup_3600.bin`` / ``rollup_86400.bin``: agregados por hora y por día
+  (media y máximo de ocupación, medias de UCP y vehículos) de los periodos
+  ya cerrados.
+- ``meta.json``: secciones y formato. Si la ruta cambia, el historial
+  anterior se archiva y se empieza uno nuevo.
+
+Solo el worker escritor registra ticks: ``record`` arma el registro y lo
+encola, y un hilo aparte escribe en lotes (cada ``FLUSH_RECORDS`` registros
+o ``FLUSH_SECONDS`` segundos), así el tick nunca espera al disco. Las
+consultas de cualquier worker mapean los archivos en memoria y ubican el
+rango con búsqueda binaria sobre las marcas de tiempo (que solo crecen).
+"""
+import atexit
+import json
+import logging
+import os
+import queue
+import threading
+import time
+
+import numpy as np
+
+from metrics import HISTORY_FLUSH_SECONDS, HISTORY_DROPPED
+
+HISTORY_DIR = os.path.join('cache', 'history')
+HISTORY_FORMAT_VERSION = 1
+FLUSH_RECORDS = 30
+FLUSH_SECONDS = 30.0
+QUEUE_SIZE = 10000
+ROLLUP_RESOLUTIONS = {'hour': 3600, 'day': 86400}
+# Los días se cortan a medianoche de Lima (UTC-5, sin horario de verano)
+LOCAL_UTC_OFFSET = -5 * 3600
+MAX_POINTS = 10000
+_CLOSE = object()  # Señal para que el hilo escriba lo pendiente y termine
+
+
+def tick_dtype(sections):
+    return np.dtype([
+        ('timestamp', '<f8'),
+        ('version', '<i8'),
+        ('interval_index', '<i4'),
+        ('red_sections', '<i4'),
+        ('overall_occupancy', '<f4'),
+        ('ucp', '<f4', (sections,)),
+        ('occupancy', '<f4', (sections,)),
+        ('vehicles', '<i4', (sections,)),
+    ])
+
+
+def rollup_dtype(sections):
+    return np.dtype([
+        ('start', '<f8'),
+        ('count', '<i4'),
+        ('overall_occupancy_mean', '<f4'),
+        ('overall_occupancy_max', '<f4'),
+        ('ucp_mean', '<f4', (sections,)),
+        ('occupancy_mean', '<f4', (sections,)),
+        ('occupancy_max', '<f4', (sections,)),
+        ('vehicles_mean', '<f4', (sections,)),
+    ])
+
+
+def bucket_starts(timestamps, resolution):
+    """Inicio del periodo (hora o día local) de cada marca de tiempo."""
+    local = np.asarray(timestamps, dtype=np.float64) + LOCAL_UTC_OFFSET
+    return np.floor(local / resolution) * resolution - LOCAL_UTC_OFFSET
+
+
+def aggregate(ticks, resolution, sections):
+    """Agrega registros de ticks (ordenados por tiempo) en periodos de ``resolution`` segundos."""
+    rollups = np.zeros(0, dtype=rollup_dtype(sections))
+    if len(ticks) == 0:
+        return rollups
+    starts = bucket_starts(ticks['timestamp'], resolution)
+    boundaries = np.flatnonzero(np.diff(starts)) + 1
+    offsets = np.concatenate([[0], boundaries])
+    counts = np.diff(np.concatenate([offsets, [len(ticks)]]))
+
+    rollups = np.zeros(len(offsets), dtype=rollup_dtype(sections))
+    rollups['start'] = starts[offsets]
+    rollups['count'] = counts
+    # Las sumas en float64: en un día hay miles de ticks por periodo
+    rollups['overall_occupancy_mean'] = np.add.reduceat(ticks['overall_occupancy'], offsets, dtype=np.float64) / counts
+    rollups['overall_occupancy_max'] = np.maximum.reduceat(ticks['overall_occupancy'], offsets)
+    if sections:
+        per_bucket = counts[:, None]
+        rollups['ucp_mean'] = np.add.reduceat(ticks['ucp'], offsets, axis=0, dtype=np.float64) / per_bucket
+        rollups['occupancy_mean'] = np.add.reduceat(ticks['occupancy'], offsets, axis=0, dtype=np.float64) / per_bucket
+        rollups['occupancy_max'] = np.maximum.reduceat(ticks['occupancy'], offsets, axis=0)
+        rollups['vehicles_mean'] = np.add.reduceat(ticks['vehicles'], offsets, axis=0, dtype=np.float64) / per_bucket
+    return rollups
+
+
+def _read_array(path, dtype):
+    """Vista de solo lectura (mmap) de los registros completos de ``path``."""
+    try:
+        size = os.path.getsize(path)
+    except OSError:
+        return np.zeros(0, dtype=dtype)
+    rows = size // dtype.itemsize
+    if rows == 0:
+        return np.zeros(0, dtype=dtype)
+    return np.memmap(path, dtype=dtype, mode='r', shape=(rows,))
+
+
+class HistoryStore:
+    """Historial de un corredor: escritura en lotes (escritor) y consultas por rango (todos)."""
+
+    def __init__(self, corridor_id, section_names, directory=HISTORY_DIR):
+        self.corridor_id = corridor_id
+        self.section_names = list(section_names)
+        self.directory = os.path.join(directory, corridor_id)
+        self.tick_dtype = tick_dtype(len(self.section_names))
+        self.rollup_dtype = rollup_dtype(len(self.section_names))
+        self.ticks_path = os.path.join(self.directory, 'ticks.bin')
+        self._queue = None
+        self._thread = None
+        self._last_timestamp = -np.inf
+
+    def rollup_path(self, resolution):
+        return os.path.join(self.directory, f'rollup_{resolution}.bin')
+
+    def _meta(self):
+        return {
+            'version': HISTORY_FORMAT_VERSION,
+            'corridor': self.corridor_id,
+            'sections': self.section_names,
+            'record_size': self.tick_dtype.itemsize,
+        }
+
+    def matches_disk(self):
+        """``True`` si los archivos en disco son de estas mismas secciones y formato."""
+        try:
+            with open(os.path.join(self.directory, 'meta.json'), 'r', encoding='utf-8') as f:
+                return json.load(f) == self._meta()
+        except (OSError, ValueError):
+            return False
+
+    # ---------- escritura (solo el worker escritor) ----------
+
+    def open_writer(self):
+        """Prepara los archivos y lanza el hilo que escribe en lotes."""
+        if self._thread is not None:
+            return self
+        meta_path = os.path.join(self.directory, 'meta.json')
+        if os.path.exists(self.directory) and not self.matches_disk():
+            archived = f'{self.directory}.{int(time.time())}'
+            os.replace(self.directory, archived)
+            logging.warning(f"⚠️ La ruta de '{self.corridor_id}' cambió: historial anterior archivado en '{archived}'")
+        os.makedirs(self.directory, exist_ok=True)
+        with open(meta_path, 'w', encoding='utf-8') as f:
+            json.dump(self._meta(), f, ensure_ascii=False)
+        # Un corte a mitad de un registro deja bytes sueltos: se descartan
+        for path, dtype in [(self.ticks_path, self.tick_dtype)] + [
+                (self.rollup_path(r), self.rollup_dtype) for r in ROLLUP_RESOLUTIONS.values()]:
+            if os.path.exists(path):
+                size = os.path.getsize(path)
+                if size % dtype.itemsize:
+                    with open(path, 'r+b') as f:
+                        f.truncate(size - size % dtype.itemsize)
+        self._update_rollups()
+        ticks = _read_array(self.ticks_path, self.tick_dtype)
+        if len(ticks):
+            self._last_timestamp = float(ticks['timestamp'][-1])
+
+        self._queue = queue.Queue(maxsize=QUEUE_SIZE)
+        self._thread = threading.Thread(target=self._write_loop, name=f'history-{self.corridor_id}', daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+        return self
+
+    def record(self, snapshot, interval_index):
+        """Encola el registro del tick de ``snapshot`` (no bloquea; si la cola está llena se descarta)."""
+        if self._queue is None or snapshot.timestamp <= self._last_timestamp:
+            return  # Las consultas buscan por marca de tiempo: solo se agregan ticks posteriores
+        self._last_timestamp = snapshot.timestamp
+        state = snapshot.state
+        row = np.zeros(1, dtype=self.tick_dtype)
+        row['timestamp'] = snapshot.timestamp
+        row['version'] = snapshot.version
+        row['interval_index'] = interval_index
+        row['red_sections'] = snapshot.kpis['red_segments_count']
+        row['overall_occupancy'] = snapshot.kpis['overall_occupancy_percentage']
+        row['ucp'] = state.ucp_density
+        row['occupancy'] = state.occupancy
+        row['vehicles'] = state.total_vehicles()
+        try:
+            self._queue.put_nowait(row)
+        except queue.Full:
+            HISTORY_DROPPED.inc(corridor=self.corridor_id)
+
+    def _write_loop(self):
+        pending = []
+        deadline = time.monotonic() + FLUSH_SECONDS
+        while True:
+            try:
+                item = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+            except queue.Empty:
+                item = None
+            control = item is None or isinstance(item, threading.Event) or item is _CLOSE
+            if not control:
+                pending.append(item)
+            if pending and (control or len(pending) >= FLUSH_RECORDS):
+                try:
+                    self._append(np.concatenate(pending))
+                except Exception as e:
+                    logging.error(f"❌ Error al escribir el historial de '{self.corridor_id}': {e}")
+                pending = []
+            if not pending:
+                deadline = time.monotonic() + FLUSH_SECONDS
+            if isinstance(item, threading.Event):
+                item.set()
+            elif item is _CLOSE:
+                return
+
+    def _append(self, rows):
+        with HISTORY_FLUSH_SECONDS.time(corridor=self.corridor_id):
+            with open(self.ticks_path, 'ab') as f:
+                f.write(rows.tobytes())
+            self._update_rollups()
+
+    def _update_rollups(self):
+        """Agrega los periodos que ya cerraron y todavía no están en los archivos de rollup."""
+        ticks = _read_array(self.ticks_path, self.tick_dtype)
+        if len(ticks) == 0:
+            return
+        for resolution in ROLLUP_RESOLUTIONS.values():
+            path = self.rollup_path(resolution)
+            existing = _read_array(path, self.rollup_dtype)
+            first = 0
+            if len(existing):
+                first = int(np.searchsorted(ticks['timestamp'], existing['start'][-1] + resolution, side='left'))
+            open_start = bucket_starts(ticks['timestamp'][-1:], resolution)[0]
+            last = int(np.searchsorted(ticks['timestamp'], open_start, side='left'))
+            if last > first:
+                closed = aggregate(ticks[first:last], resolution, len(self.section_names))
+                with open(path, 'ab') as f:
+                    f.write(closed.tobytes())
+
+    def flush(self, timeout=5.0):
+        """Escribe ya lo encolado y espera a que termine (pruebas y apagado)."""
+        if self._queue is None:
+            return False
+        done = threading.Event()
+        self._queue.put(done)
+        return done.wait(timeout)
+
+    def close(self):
+        if self._thread is None:
+            return
+        self._queue.put(_CLOSE)
+        self._thread.join(timeout=5.0)
+        self._thread = None
+        self._queue = None
+
+    # ---------- consultas (cualquier worker) ----------
+
+    def ticks_between(self, start, end):
+        """Registros de ticks con ``start <= timestamp < end`` (vista mmap)."""
+        ticks = _read_array(self.ticks_path, self.tick_dtype)
+        timestamps = ticks['timestamp']
+        lo = int(np.searchsorted(timestamps, start, side='left'))
+        hi = int(np.searchsorted(timestamps, end, side='left'))
+        return ticks[lo:hi]
+
+    def rollups_between(self, resolution, start, end):
+        """Agregados por periodo que empiezan en ``[start, end)``; el periodo
+        en curso (aún sin archivar) se calcula al vuelo desde los ticks."""
+        stored = _read_array(self.rollup_path(resolution), self.rollup_dtype)
+        stored_end = stored['start'][-1] + resolution if len(stored) else -np.inf
+        first_bucket = bucket_starts([start], resolution)[0]
+        lo = int(np.searchsorted(stored['start'], first_bucket, side='left'))
+        hi = int(np.searchsorted(stored['start'], end, side='left'))
+        parts = [np.asarray(stored[lo:hi])]
+        if end > stored_end:
+            tail = self.ticks_between(max(first_bucket, stored_end), end)
+            parts.append(aggregate(tail, resolution, len(self.section_names)))
+        return np.concatenate(parts)
+
+    def time_range(self):
+        ticks = _read_array(self.ticks_path, self.tick_dtype)
+        if len(ticks) == 0:
+            return None, None
+        return float(ticks['timestamp'][0]), float(ticks['timestamp'][-1])
+
+
+def choose_resolution(start, end):
+    """Resolución automática: ticks hasta 6 horas, horas hasta 60 días, días más allá."""
+    span = end - start
+    if span <= 6 * 3600:
+        return 'raw'
+    if span <= 60 * 86400:
+        return 'hour'
+    return 'day'
+
+
+def history_payload(store, start, end, resolution='auto', section=None):
+    """Serie temporal de ``store`` en ``[start, end)`` lista para JSON.
+
+    ``section`` limita las series a una sección (por nombre o índice).
+    Devuelve ``(payload, status)``.
+    """
+    if end <= start:
+        return {'error': "'from' debe ser anterior a 'to'"}, 400
+    if resolution == 'auto':
+        resolution = choose_resolution(start, end)
+    if resolution != 'raw' and resolution not in ROLLUP_RESOLUTIONS:
+        return {'error': f"Resolución desconocida: '{resolution}'",
+                'resolutions': ['auto', 'raw'] + list(ROLLUP_RESOLUTIONS)}, 400
+
+    names = store.section_names
+    columns = slice(None)
+    if section is not None:
+        index = int(section) if str(section).isdigit() else (names.index(section) if section in names else None)
+        if index is None or not 0 <= index < len(names):
+            return {'error': f"Sección desconocida: '{section}'", 'sections': names}, 404
+        columns = slice(index, index + 1)
+        names = names[columns]
+
+    if not store.matches_disk():
+        # Sin historial aún (o de otra versión de la ruta, hasta que el escritor lo archive)
+        rows = np.zeros(0, dtype=store.tick_dtype if resolution == 'raw' else store.rollup_dtype)
+    elif resolution == 'raw':
+        rows = store.ticks_between(start, end)
+    else:
+        rows = store.rollups_between(ROLLUP_RESOLUTIONS[resolution], start, end)
+    if len(rows) > MAX_POINTS:
+        return {'error': f"El rango tiene {len(rows)} puntos (máximo {MAX_POINTS}); "
+                         "use una resolución mayor o un rango menor"}, 400
+
+    payload = {
+        'corridor': store.corridor_id,
+        'resolution': resolution,
+        'from': start,
+        'to': end,
+        'sections': names,
+        'points': int(len(rows)),
+    }
+    if resolution == 'raw':
+        payload.update({
+            'timestamps': rows['timestamp'].tolist(),
+            'update_counters': rows['version'].tolist(),
+            'overall_occupancy': np.round(rows['overall_occupancy'], 2).tolist(),
+            'red_sections': rows['red_sections'].tolist(),
+            'occupancy': np.round(rows['occupancy'][:, columns], 2).tolist(),
+            'ucp': np.round(rows['ucp'][:, columns], 2).tolist(),
+            'vehicles': rows['vehicles'][:, columns].tolist(),
+        })
+    else:
+        payload.update({
+            'timestamps': rows['start'].tolist(),
+            'ticks': rows['count'].tolist(),
+            'overall_occupancy_mean': np.round(rows['overall_occupancy_mean'], 2).tolist(),
+            'overall_occupancy_max': np.round(rows['overall_occupancy_max'], 2).tolist(),
+            'occupancy_mean': np.round(rows['occupancy_mean'][:, columns], 2).tolist(),
+            'occupancy_max': np.round(rows['occupancy_max'][:, columns], 2).tolist(),
+            'ucp_mean': np.round(rows['ucp_mean'][:, columns], 2).tolist(),
+            'vehicles_mean': np.round(rows['vehicles_mean'][:, columns], 2).tolist(),
+        })
+    return payload, 200
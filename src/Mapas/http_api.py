@@ -0,0 +1,347 @@
+"""Capa HTTP común a los servidores WSGI (app.py) y ASGI (asgi_app.py).
+
+El ruteo, CORS, las cabeceras anti-caché, las respuestas precomprimidas con
+ETag fuerte y 304 según Accept-Encoding, la página del mapa, los archivos
+estáticos y la latencia por endpoint de /metrics se resuelven aquí una sola
+vez. Cada servidor solo arma un ``ApiRequest`` con su petición, llama a
+``handle`` y escribe el ``ApiResponse`` que recibe.
+
+Lo único propio de cada servidor es cómo espera los ticks en /api/stream:
+``handle`` reserva el cupo del canal y devuelve la respuesta con ``stream``;
+el servidor itera los eventos (con un hilo o con asyncio) y libera el cupo
+al cerrar la conexión.
+"""
+import json
+import logging
+import mimetypes
+import os
+import time
+from datetime import datetime
+
+import backend
+from compression import select_variant
+from geometry import IMMUTABLE_CACHE_CONTROL
+from live_ingest import MAX_BODY_BYTES
+from metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE, REQUEST_SECONDS
+from snapshot import serialize_payload
+from tick_stream import stream_slots
+
+TEMPLATE_FILE = os.path.join('templates', 'map.html')
+STATIC_DIR = os.path.join('..', 'imagenes')
+STATIC_PREFIX = '/static/imagenes/'
+STATIC_ENDPOINT = STATIC_PREFIX + '<path:filename>'
+# Cuerpo máximo de un POST (lotes de /api/ingest y de /api/match)
+MAX_REQUEST_BODY_BYTES = MAX_BODY_BYTES
+
+CORS_HEADERS = [
+    ('Access-Control-Allow-Origin', '*'),
+    ('Access-Control-Expose-Headers', 'X-Timestamp, ETag'),
+]
+PREFLIGHT_HEADERS = [
+    ('Access-Control-Allow-Methods', 'GET, POST, OPTIONS'),
+    ('Access-Control-Allow-Headers', 'Content-Type, Cache-Control, X-Requested-With, If-None-Match'),
+    ('Access-Control-Max-Age', '0'),
+]
+NO_CACHE_HEADERS = [
+    ('Cache-Control', 'no-store, no-cache, must-revalidate, post-check=0, pre-check=0, max-age=0'),
+    ('Pragma', 'no-cache'),
+    ('Expires', '-1'),
+    ('X-Accel-Expires', '0'),
+]
+
+
+class ApiRequest:
+    """Lo que usan los handlers de una petición, sin depender del servidor.
+
+    ``headers`` lleva los nombres en minúscula y ``args`` el primer valor de
+    cada parámetro. El servidor carga ``body`` en los POST: ``None`` si
+    superó ``MAX_REQUEST_BODY_BYTES``.
+    """
+
+    def __init__(self, method, path, args, headers):
+        self.started = time.perf_counter()
+        self.method = method
+        self.path = path
+        self.args = args
+        self.headers = headers
+        self.body = b''
+
+    def if_none_match(self, etag):
+        header = self.headers.get('if-none-match')
+        if not header:
+            return False
+        tags = [tag.strip() for tag in header.split(',')]
+        return '*' in tags or any(tag.removeprefix('W/').strip('"') == etag for tag in tags)
+
+    def json_body(self):
+        """Cuerpo JSON decodificado, o ``None`` si no es JSON válido."""
+        try:
+            return json.loads(self.body)
+        except ValueError:
+            return None
+
+
+class ApiResponse:
+    """Estado, cabeceras y cuerpo de la respuesta. En /api/stream, ``stream``
+    es ``(runtime, last_version)`` y el cupo del canal ya está reservado."""
+    __slots__ = ('status', 'body', 'headers', 'stream')
+
+    def __init__(self, status=200, body=b'', content_type=None, headers=(), stream=None):
+        self.status = status
+        self.body = body
+        self.headers = list(CORS_HEADERS) + list(headers)
+        if content_type is not None:
+            self.headers.append(('Content-Type', content_type))
+        self.stream = stream
+
+
+def timestamp_header():
+    return ('X-Timestamp', str(datetime.now().timestamp()))
+
+
+def json_response(payload, status=200, no_cache=False):
+    headers = list(NO_CACHE_HEADERS) + [timestamp_header()] if no_cache else []
+    return ApiResponse(status, serialize_payload(payload), 'application/json', headers)
+
+
+def encoded_response(request, body, variants, etag, headers=()):
+    """Respuesta con la variante precomprimida que acepte el cliente (br, gzip o
+    sin comprimir) y su ETag fuerte; 304 sin cuerpo si el cliente ya la tiene."""
+    data, encoding = select_variant(body, variants, request.headers.get('accept-encoding'))
+    if encoding is not None:
+        etag = f'{etag}-{encoding}'
+    headers = [('ETag', f'"{etag}"'), ('Vary', 'Accept-Encoding')] + list(headers)
+    if request.if_none_match(etag):
+        return ApiResponse(304, headers=headers)
+    if encoding is not None:
+        headers.append(('Content-Encoding', encoding))
+    return ApiResponse(200, data, 'application/json', headers)
+
+
+# ============================================
+# ENDPOINTS
+# ============================================
+
+def corridor_route(handler):
+    """``handler(request, runtime)`` con el corredor de ?corridor=<id> (por
+    defecto, el primero configurado); 404 si no existe."""
+    def route(request):
+        corridor_id = request.args.get('corridor')
+        runtime = backend.resolve_corridor(corridor_id)
+        if runtime is None:
+            return json_response(backend.unknown_corridor_payload(corridor_id), 404)
+        return handler(request, runtime)
+    return route
+
+
+def snapshot_response(request, runtime, payload_name):
+    """Responde con el JSON preserializado de la última instantánea.
+
+    Usa un ETag fuerte por versión: si el cliente ya tiene esa versión
+    (If-None-Match) se responde 304 sin cuerpo. ``no-cache`` obliga a
+    revalidar en cada sondeo, así que la frescura se mantiene.
+    """
+    snapshot = runtime.publisher.latest()
+    return encoded_response(request, snapshot.bodies[payload_name], snapshot.encoded[payload_name],
+                            snapshot.etags[payload_name], [('Cache-Control', 'no-cache'), timestamp_header()])
+
+
+def snapshot_route(payload_name):
+    return corridor_route(lambda request, runtime: snapshot_response(request, runtime, payload_name))
+
+
+def payload_route(payload_builder):
+    """Payload de ``backend`` para el corredor pedido, sin caché."""
+    return corridor_route(lambda request, runtime: json_response(payload_builder(runtime), no_cache=True))
+
+
+def map_page(request):
+    """Ruta raíz - sirve el mapa HTML"""
+    try:
+        with open(TEMPLATE_FILE, 'rb') as f:
+            body = f.read()
+    except OSError as e:
+        # Si no se puede leer el template, devolver info de la API
+        logging.error(f"Error rendering map.html: {e}")
+        payload = backend.api_info_payload(datetime.now())
+        payload['error'] = 'Map template not available'
+        return json_response(payload)
+    return ApiResponse(200, body, 'text/html; charset=utf-8', NO_CACHE_HEADERS + [timestamp_header()])
+
+
+def api_info(request):
+    """Información de la API"""
+    return json_response(backend.api_info_payload(datetime.now()))
+
+
+def health_check(request):
+    return json_response(backend.health_payload(datetime.now()))
+
+
+def get_corridors(request):
+    """Corredores configurados con su estado de carga y su última versión publicada."""
+    return json_response(backend.corridors_payload(), no_cache=True)
+
+
+def get_road_data(request, runtime):
+    if logging.getLogger().isEnabledFor(logging.DEBUG):
+        # Una línea por petición solo en DEBUG: la latencia por endpoint está en /metrics
+        snapshot = runtime.publisher.latest()
+        color_counts = snapshot.color_counts
+        logging.debug(f"📡 /api/road_data #{snapshot.version} → {len(snapshot.road_data['segments'])} segmentos: "
+                      f"🟢{color_counts['green']} 🟡{color_counts['yellow']} 🔴{color_counts['red']}")
+    return snapshot_response(request, runtime, 'road_data')
+
+
+def get_road_geometry(request, runtime):
+    """Geometría compacta de la ruta (polylines). No cambia tras el arranque:
+    pedida con ?v=<version> se cachea para siempre."""
+    geometry = runtime.geometry
+    if geometry is None:
+        return json_response(backend.route_not_loaded_payload(runtime), 503, no_cache=True)
+    cache_control = IMMUTABLE_CACHE_CONTROL if request.args.get('v') == geometry.version else 'no-cache'
+    return encoded_response(request, geometry.body, geometry.encoded, geometry.version,
+                            [('Cache-Control', cache_control)])
+
+
+def get_changes(request, runtime):
+    """Secciones y edges que cambiaron desde ?since=<update_counter> (estado
+    completo con full=true si esa versión ya no está en el buffer)."""
+    delta = backend.changes_since(runtime, request.args.get('since'))
+    return encoded_response(request, delta.body, delta.encoded, delta.etag,
+                            [('Cache-Control', 'no-cache'), timestamp_header()])
+
+
+def get_history(request, runtime):
+    """Historial de ocupación por sección y KPIs entre ?from= y ?to=, por tick o
+    agregado por hora/día (?resolution=, automática según el rango)."""
+    payload, status = backend.history_query_payload(runtime, request.args, time.time())
+    return json_response(payload, status, no_cache=True)
+
+
+def match_points(request, runtime):
+    """Edge y sección más cercanos a cada punto: ?points=lat,lon;lat,lon o, para
+    lotes grandes, POST con {"points": [[lat, lon], ...], "max_distance": m}."""
+    options = request.args
+    if request.method == 'POST':
+        if request.body is None:
+            return json_response({'error': f'Máximo {MAX_REQUEST_BODY_BYTES} bytes por petición'}, 413)
+        options = request.json_body()
+        if not isinstance(options, dict):
+            return json_response({'error': 'Se esperaba un objeto JSON con "points"'}, 400)
+    payload, status = backend.match_points_payload(runtime, options.get('points'), options.get('max_distance'),
+                                                   options.get('route_only', False))
+    return json_response(payload, status, no_cache=True)
+
+
+def ingest_counts(request):
+    """Lote de conteos en vivo (NroPunto, Sentido, TipoVehiculo, Cantidad) para
+    el próximo tick; solo con TRAFFIC_SOURCE=live."""
+    if request.body is None:
+        return json_response({'error': f'Máximo {MAX_REQUEST_BODY_BYTES} bytes por lote'}, 413)
+    batch = request.json_body()
+    if batch is None:
+        return json_response({'error': 'Se esperaba un cuerpo JSON'}, 400)
+    payload, status = backend.ingest_payload(batch, request.args.get('corridor'))
+    return json_response(payload, status, no_cache=True)
+
+
+def stream_updates(request, runtime):
+    """Canal Server-Sent Events: un delta por tick de simulación, con heartbeats.
+
+    Se puede reanudar con la cabecera Last-Event-ID (la envía EventSource al
+    reconectar) o con ?since=<update_counter>. La conexión se cierra tras
+    STREAM_MAX_SECONDS y hay un cupo de STREAM_MAX_CLIENTS por worker.
+    """
+    last_event_id = request.headers.get('last-event-id') or request.args.get('since')
+    try:
+        last_version = int(last_event_id) if last_event_id is not None else None
+    except ValueError:
+        last_version = None
+    # Con el cupo lleno el cliente sigue con el sondeo
+    if not stream_slots.acquire():
+        payload, status = backend.stream_busy_payload()
+        response = json_response(payload, status, no_cache=True)
+        response.headers.append(('Retry-After', str(payload['retry_after'])))
+        return response
+    return ApiResponse(200, content_type='text/event-stream; charset=utf-8',
+                       headers=[('Cache-Control', 'no-cache'), ('X-Accel-Buffering', 'no')],
+                       stream=(runtime, last_version))
+
+
+def get_vehicles_by_interval_and_segment(request, runtime):
+    return json_response(backend.vehicles_by_interval_payload(runtime, request.args.get('interval')))
+
+
+def get_metrics(request):
+    """Métricas de este worker en formato de texto de Prometheus."""
+    return ApiResponse(200, backend.metrics_body(), METRICS_CONTENT_TYPE, [('Cache-Control', 'no-store')])
+
+
+def static_file(request):
+    root = os.path.abspath(STATIC_DIR)
+    path = os.path.abspath(os.path.join(root, request.path[len(STATIC_PREFIX):]))
+    if not path.startswith(root + os.sep) or not os.path.isfile(path):
+        return json_response({'error': 'Not found'}, 404)
+    with open(path, 'rb') as f:
+        body = f.read()
+    content_type = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+    return ApiResponse(200, body, content_type, [('Cache-Control', 'no-cache')])
+
+
+ROUTES = {
+    '/': map_page,
+    '/api/info': api_info,
+    '/health': health_check,
+    '/api/status': payload_route(backend.status_payload),
+    '/api/road_data': corridor_route(get_road_data),
+    '/api/traffic_data': snapshot_route('traffic_data'),
+    '/api/kpis': snapshot_route('kpis'),
+    '/api/current_interval': snapshot_route('current_interval_data'),
+    '/api/debug': snapshot_route('debug'),
+    '/api/road_geometry': corridor_route(get_road_geometry),
+    '/api/road_state': snapshot_route('road_state'),
+    '/api/changes': corridor_route(get_changes),
+    '/api/history': corridor_route(get_history),
+    '/api/match': corridor_route(match_points),
+    '/api/stream': corridor_route(stream_updates),
+    '/api/corridors': get_corridors,
+    '/api/intervals': payload_route(backend.intervals_payload),
+    '/api/ucp_by_interval': payload_route(backend.ucp_by_interval_payload),
+    '/api/vehicles_by_interval_and_segment': corridor_route(get_vehicles_by_interval_and_segment),
+    '/metrics': get_metrics,
+}
+# Únicas rutas que aceptan POST
+POST_ROUTES = {
+    '/api/ingest': ingest_counts,
+    '/api/match': corridor_route(match_points),
+}
+
+
+def resolve(request):
+    """Handler de la petición y la etiqueta de su endpoint en /metrics."""
+    if request.method == 'OPTIONS':
+        known = request.path in ROUTES or request.path in POST_ROUTES
+        return (lambda request: ApiResponse(200, headers=PREFLIGHT_HEADERS)), request.path if known else 'unmatched'
+    handler = (POST_ROUTES if request.method == 'POST' else ROUTES).get(request.path)
+    if handler is not None and request.method in ('GET', 'HEAD', 'POST'):
+        return handler, request.path
+    if handler is None and request.method in ('GET', 'HEAD') and request.path.startswith(STATIC_PREFIX):
+        return static_file, STATIC_ENDPOINT
+    if request.path in ROUTES or request.path in POST_ROUTES:
+        return (lambda request: json_response({'error': 'Method not allowed'}, 405)), request.path
+    return (lambda request: json_response({'error': 'Not found'}, 404)), 'unmatched'
+
+
+def handle(request):
+    """Respuesta a ``request``; registra la latencia hasta este punto (en
+    SSE, hasta abrir el canal)."""
+    handler, endpoint = resolve(request)
+    try:
+        response = handler(request)
+    except Exception as e:
+        logging.exception(f"❌ Error en {request.method} {request.path}: {e}")
+        response = json_response({'error': 'Internal server error'}, 500)
+    REQUEST_SECONDS.observe(time.perf_counter() - request.started, method=request.method,
+                            endpoint=endpoint, status=response.status)
+    return response
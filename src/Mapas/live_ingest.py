@@ -0,0 +1,474 @@
+"""Ingesta en vivo de conteos vehiculares (en lugar de repetir la jornada del Excel).
+
+Con ``TRAFFIC_SOURCE=live`` el escritor ya no reproduce ``data_transito.xlsx``:
+en cada tick aplica, como un micro-lote, los conteos recibidos desde el tick
+anterior. Los conteos traen las mismas columnas que el Excel (``NroPunto``,
+``Sentido``, ``TipoVehiculo``, ``Cantidad``) y llegan por dos vías:
+
+- ``POST /api/ingest``: un lote JSON (lista de filas u objeto de columnas).
+  En el worker escritor va directo a la cola; en un lector se agrega como
+  una línea a ``cache/ingest/http-<pid>.jsonl`` y lo aplica el escritor.
+- Archivos JSON Lines en ``cache/ingest/`` (un lote por línea): el escritor
+  los sigue como ``tail -f`` y guarda hasta dónde leyó de cada uno.
+
+Los archivos consumidos por completo se borran cuando llevan
+``INGEST_SPOOL_IDLE_SECONDS`` sin escrituras o superan
+``INGEST_SPOOL_ROLL_BYTES`` (así el de un lector activo no crece sin límite).
+Quien escribe toma ``flock`` sobre el archivo durante el ``append`` y, si el
+escritor lo borró mientras esperaba, lo vuelve a crear (``append_line``). Un
+productor externo sin ``flock`` debe abrir el archivo en modo append en cada
+lote: con un archivo abierto por más que el tiempo de inactividad, lo que
+escriba después del borrado se pierde.
+
+La cola está acotada en filas: si se llena, POST responde 429 y el lector de
+archivos deja de avanzar hasta que haya lugar (los archivos hacen de buffer).
+
+Productor de prueba a partir de la tabla de tráfico de un corredor::
+
+    python live_ingest.py --seconds-per-interval 10
+    python live_ingest.py --url http://localhost:5000 --corridor pachacutec
+"""
+import argparse
+import json
+import logging
+import os
+import threading
+import time
+import urllib.request
+
+import numpy as np
+
+from metrics import INGEST_ROWS, INGEST_QUEUE_ROWS
+
+INGEST_DIR = os.path.join('cache', 'ingest')
+OFFSETS_FILE = '.offsets.json'
+COLUMNS = ('NroPunto', 'Sentido', 'TipoVehiculo', 'Cantidad')
+MAX_PENDING_ROWS = int(os.environ.get('INGEST_MAX_PENDING_ROWS', 200000))
+MAX_BATCH_ROWS = 50000
+MAX_BODY_BYTES = 16 * 1024 * 1024
+# Límites por fila: los conteos de las secciones son int32 (ver section_state.py)
+MAX_CODE = int(np.iinfo(np.int32).max)
+MAX_QUANTITY = 1000000
+TAIL_POLL_SECONDS = 0.5
+TAIL_READ_BYTES = 4 * 1024 * 1024
+# Una línea (un lote) puede superar TAIL_READ_BYTES; más larga que esto se descarta
+MAX_LINE_BYTES = MAX_BODY_BYTES
+SPOOL_ROLL_BYTES = int(os.environ.get('INGEST_SPOOL_ROLL_BYTES', 64 * 1024 * 1024))
+SPOOL_IDLE_SECONDS = float(os.environ.get('INGEST_SPOOL_IDLE_SECONDS', 60))
+
+
+class IngestError(ValueError):
+    """Lote con formato inválido (se responde 400)."""
+
+
+def batch_corridor(batch, corridor_id, default_corridor_id):
+    """Corredor del lote: su campo ``corridor``, si no ``?corridor=``, si no el primero."""
+    if isinstance(batch, dict) and batch.get('corridor'):
+        return str(batch['corridor'])
+    return corridor_id or default_corridor_id
+
+
+def integer_column(values, name, low, high):
+    """Columna de enteros entre ``low`` y ``high`` como ``int64``.
+
+    Se rechazan textos, booleanos, nulos y números con decimales (``2.0`` vale,
+    ``2.9`` no): truncarlos aplicaría el conteo a otro punto o con otra
+    cantidad. El rango se valida antes de convertir, porque ``astype`` da
+    la vuelta en silencio con valores fuera de ``int64``.
+    """
+    try:
+        # numpy convierte True en 1 dentro de una lista de enteros: se descartan antes
+        array = None if any(type(v) is bool for v in values) else np.asarray(values)
+    except (TypeError, ValueError):
+        array = None
+    if array is None or array.ndim != 1 or (array.size and array.dtype.kind not in 'iuf'):
+        raise IngestError(f"{name} debe ser una lista de enteros")
+    if array.size == 0:
+        return np.zeros(0, dtype=np.int64)
+    if array.dtype.kind == 'f' and not (np.isfinite(array).all() and (array == np.trunc(array)).all()):
+        raise IngestError(f"{name} debe ser una lista de enteros")
+    if array.min() < low or array.max() > high:
+        raise IngestError(f"{name} debe estar entre {low} y {high}")
+    return array.astype(np.int64)
+
+
+def batch_columns(batch):
+    """``(NroPunto, Sentido, TipoVehiculo, Cantidad)`` de un lote como columnas.
+
+    El lote es una lista de filas ``{columna: valor}``, un objeto de columnas
+    ``{columna: [valores]}`` o cualquiera de los dos bajo la clave ``rows``.
+    """
+    rows = batch.get('rows', batch) if isinstance(batch, dict) else batch
+    if isinstance(rows, dict):
+        columns = {name: rows.get(name) for name in COLUMNS}
+        if any(not isinstance(values, list) for values in columns.values()):
+            raise IngestError(f"El objeto de columnas necesita las listas {', '.join(COLUMNS)}")
+    elif isinstance(rows, list):
+        try:
+            columns = {name: [row[name] for row in rows] for name in COLUMNS}
+        except (KeyError, TypeError):
+            raise IngestError(f"Cada fila necesita las columnas {', '.join(COLUMNS)}")
+    else:
+        raise IngestError("El lote debe ser una lista de filas o un objeto de columnas")
+
+    lengths = {len(values) for values in columns.values()}
+    if len(lengths) != 1:
+        raise IngestError("Las columnas del lote tienen largos distintos")
+    if lengths.pop() > MAX_BATCH_ROWS:
+        raise IngestError(f"Máximo {MAX_BATCH_ROWS} filas por lote")
+    point = integer_column(columns['NroPunto'], 'NroPunto', -MAX_CODE, MAX_CODE)
+    direction = integer_column(columns['Sentido'], 'Sentido', -MAX_CODE, MAX_CODE)
+    quantity = integer_column(columns['Cantidad'], 'Cantidad', -MAX_QUANTITY, MAX_QUANTITY)
+    vehicle_types = [str(v).strip() for v in columns['TipoVehiculo']]
+    return point, direction, vehicle_types, quantity
+
+
+class CountMapper:
+    """Traduce filas de conteo de un corredor a deltas firmados por (sección,
+    tipo de vehículo), con las mismas reglas que ``build_delta_tensor``."""
+
+    def __init__(self, section_names, vehicle_types, segment_mapping):
+        section_index = {name: i for i, name in enumerate(section_names)}
+        self.pairs = {pair: (section_index[name], operation)
+                      for pair, (name, operation) in segment_mapping.items() if name in section_index}
+        self.vehicle_index = {vtype: i for i, vtype in enumerate(vehicle_types)}
+        self.shape = (len(section_names), len(vehicle_types))
+
+    def map(self, point, direction, vehicle_types, quantity):
+        """``(secciones, tipos, cantidades firmadas)`` de las filas válidas y
+        cuántas filas se descartaron (punto, sentido o tipo desconocidos, o
+        cantidad negativa)."""
+        if len(quantity) == 0:
+            empty = np.zeros(0, dtype=np.intp)
+            return (empty, empty, np.zeros(0, dtype=np.int64)), 0
+        # Pocos pares (punto, sentido) distintos: se resuelven una vez y se expanden
+        pairs, pair_of_row = np.unique(np.stack([point, direction], axis=1), axis=0, return_inverse=True)
+        resolved = [self.pairs.get(pair, (-1, 0)) for pair in map(tuple, pairs.tolist())]
+        pair_section = np.array([section for section, _ in resolved], dtype=np.intp)
+        pair_sign = np.array([sign for _, sign in resolved], dtype=np.int64)
+        pair_of_row = pair_of_row.reshape(-1)
+        sections = pair_section[pair_of_row]
+        vehicles = np.array([self.vehicle_index.get(v, -1) for v in vehicle_types], dtype=np.intp)
+
+        valid = (sections >= 0) & (vehicles >= 0) & (quantity >= 0)
+        signed = quantity[valid] * pair_sign[pair_of_row[valid]]
+        return (sections[valid], vehicles[valid], signed), int(len(quantity) - valid.sum())
+
+
+class IngestQueue:
+    """Cola acotada (en filas) de conteos ya traducidos, por corredor."""
+
+    def __init__(self, max_rows=MAX_PENDING_ROWS):
+        self.max_rows = max_rows
+        self._pending = {}  # corridor_id -> [(secciones, tipos, cantidades), ...]
+        self._rows = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return self._rows
+
+    def offer(self, corridor_id, mapped):
+        """Encola ``mapped``; ``False`` (y no encola nada) si no hay lugar."""
+        rows = len(mapped[2])
+        with self._lock:
+            if self._rows + rows > self.max_rows:
+                return False
+            self._pending.setdefault(corridor_id, []).append(mapped)
+            self._rows += rows
+        INGEST_QUEUE_ROWS.set(self._rows)
+        return True
+
+    def drain(self, shapes):
+        """Vacía la cola: ``{corridor_id: deltas (secciones × tipos)}`` sumando todos los lotes."""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            self._rows = 0
+        INGEST_QUEUE_ROWS.set(0)
+        deltas = {}
+        for corridor_id, batches in pending.items():
+            matrix = np.zeros(shapes[corridor_id], dtype=np.int64)
+            for sections, vehicles, quantities in batches:
+                np.add.at(matrix, (sections, vehicles), quantities)
+            deltas[corridor_id] = matrix
+        return deltas
+
+
+class LiveIngest:
+    """Entrada de los conteos en vivo en el worker escritor: valida, traduce y encola."""
+
+    def __init__(self, runtimes, vehicle_types, default_corridor_id, max_rows=MAX_PENDING_ROWS):
+        self.mappers = {runtime.corridor_id: CountMapper(runtime.section_state.section_names, vehicle_types,
+                                                         runtime.config.segment_mapping)
+                        for runtime in runtimes if runtime.section_state is not None}
+        self.default_corridor_id = default_corridor_id
+        self.queue = IngestQueue(max_rows)
+
+    def submit(self, batch, corridor_id=None):
+        """Valida un lote y lo encola. Devuelve ``(payload, status)``."""
+        corridor_id = batch_corridor(batch, corridor_id, self.default_corridor_id)
+        mapper = self.mappers.get(corridor_id)
+        if mapper is None:
+            return {'error': f"Corredor desconocido: '{corridor_id}'", 'corridors': list(self.mappers)}, 404
+        try:
+            columns = batch_columns(batch)
+        except IngestError as e:
+            return {'error': str(e)}, 400
+        mapped, rejected = mapper.map(*columns)
+        accepted = len(mapped[2])
+        if not self.queue.offer(corridor_id, mapped):
+            INGEST_ROWS.inc(accepted, corridor=corridor_id, result='dropped')
+            return {'error': 'Cola de ingesta llena, reintente más tarde', 'queued_rows': len(self.queue)}, 429
+        INGEST_ROWS.inc(accepted, corridor=corridor_id, result='accepted')
+        if rejected:
+            INGEST_ROWS.inc(rejected, corridor=corridor_id, result='rejected')
+        return {'corridor': corridor_id, 'accepted': accepted, 'rejected': rejected,
+                'queued_rows': len(self.queue)}, 202
+
+    def drain(self):
+        """Micro-lote del tick: deltas acumulados por corredor desde el tick anterior."""
+        return self.queue.drain({corridor_id: mapper.shape for corridor_id, mapper in self.mappers.items()})
+
+
+def spool_batch(batch, corridor_id, known_corridors, directory=INGEST_DIR):
+    """Lector: valida el lote y lo agrega como una línea JSON al archivo de
+    este proceso, que el escritor sigue. Devuelve ``(payload, status)``."""
+    if corridor_id not in known_corridors:
+        return {'error': f"Corredor desconocido: '{corridor_id}'", 'corridors': list(known_corridors)}, 404
+    try:
+        rows = len(batch_columns(batch)[3])
+    except IngestError as e:
+        return {'error': str(e)}, 400
+    line = json.dumps({'corridor': corridor_id, 'rows': batch.get('rows', batch) if isinstance(batch, dict) else batch},
+                      ensure_ascii=False, separators=(',', ':')).encode('utf-8') + b'\n'
+    if len(line) > MAX_LINE_BYTES:
+        return {'error': f'Máximo {MAX_LINE_BYTES} bytes por lote'}, 413
+    os.makedirs(directory, exist_ok=True)
+    append_line(os.path.join(directory, f'http-{os.getpid()}.jsonl'), line)
+    return {'corridor': corridor_id, 'accepted': rows, 'spooled': True}, 202
+
+
+def lock_file(f, blocking=True):
+    """``flock`` exclusivo sobre ``f``. Devuelve ``False`` si está tomado (sin
+    bloquear). Sin ``fcntl`` (p. ej. Windows en desarrollo) no hace nada."""
+    try:
+        import fcntl
+    except ImportError:
+        return True
+    try:
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        return False
+    return True
+
+
+def append_line(path, line):
+    """Agrega ``line`` (bytes) al final de ``path`` con el archivo bloqueado.
+    Si el escritor lo borró mientras se esperaba el candado, lo crea de nuevo."""
+    while True:
+        # Modo 'a' = O_APPEND: cada lote es una sola escritura al final del archivo
+        with open(path, 'ab') as f:
+            lock_file(f)
+            if os.fstat(f.fileno()).st_nlink == 0:
+                continue  # Borrado por SpoolTailer: se reabre (y se crea) el archivo
+            f.write(line)
+            return
+
+
+class SpoolTailer:
+    """Sigue los ``*.jsonl`` de ``directory`` y pasa cada línea completa a ``ingest``.
+    Borra los archivos ya consumidos que quedaron inactivos o son muy grandes."""
+
+    def __init__(self, ingest, directory=INGEST_DIR, poll_seconds=TAIL_POLL_SECONDS):
+        self.ingest = ingest
+        self.directory = directory
+        self.poll_seconds = poll_seconds
+        self.offsets_path = os.path.join(directory, OFFSETS_FILE)
+        self.offsets = {}
+        self._skipping = set()  # Archivos en medio de una línea más larga que MAX_LINE_BYTES
+        self._thread = None
+        try:
+            with open(self.offsets_path, 'r', encoding='utf-8') as f:
+                self.offsets = json.load(f)
+        except (OSError, ValueError):
+            pass
+
+    def poll_once(self):
+        """Procesa lo nuevo de cada archivo. Devuelve la cantidad de lotes leídos."""
+        if not os.path.isdir(self.directory):
+            return 0
+        batches = 0
+        names = sorted(name for name in os.listdir(self.directory) if name.endswith('.jsonl'))
+        # Offsets de archivos que ya no existen (borrados aquí o por afuera)
+        stale = set(self.offsets) - set(names)
+        for name in stale:
+            del self.offsets[name]
+        changed = bool(stale)
+        for name in names:
+            path = os.path.join(self.directory, name)
+            offset = self.offsets.get(name, 0)
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            if stat.st_size < offset:
+                offset = 0  # Archivo truncado o reemplazado: se lee desde el principio
+            with open(path, 'rb') as f:
+                chunk, start = self._read_lines(name, f, offset)
+            if start != offset:
+                offset = start
+                changed = True
+            for line in chunk.splitlines(keepends=True):
+                if line.strip():
+                    try:
+                        batch = json.loads(line)
+                    except ValueError as e:
+                        logging.warning(f"⚠️ Línea inválida en '{name}' (byte {offset}): {e}")
+                        batch = None
+                    if batch is not None:
+                        payload, status = self.ingest.submit(batch)
+                        if status == 429:
+                            break  # Cola llena: se reintenta esta línea en la próxima pasada
+                        if status != 202:
+                            logging.warning(f"⚠️ Lote descartado de '{name}' (byte {offset}): {payload['error']}")
+                        batches += 1
+                offset += len(line)
+                changed = True
+            self.offsets[name] = offset
+            if (offset >= stat.st_size and name not in self._skipping
+                    and (stat.st_size >= SPOOL_ROLL_BYTES or time.time() - stat.st_mtime >= SPOOL_IDLE_SECONDS)
+                    and self._remove_consumed(path, offset)):
+                del self.offsets[name]
+                changed = True
+        if changed:
+            tmp_path = self.offsets_path + '.tmp'
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(self.offsets, f)
+            os.replace(tmp_path, self.offsets_path)
+        return batches
+
+    def _remove_consumed(self, path, offset):
+        """Borra ``path`` si sigue leído hasta ``offset``. Con el candado tomado
+        ningún ``append_line`` está escribiendo; si alguno lo tiene, se reintenta
+        en la próxima pasada."""
+        try:
+            with open(path, 'rb') as f:
+                if not lock_file(f, blocking=False) or os.fstat(f.fileno()).st_size != offset:
+                    return False
+                os.unlink(path)
+        except FileNotFoundError:
+            return True
+        logging.info(f"🧹 Archivo de ingesta consumido y borrado: '{os.path.basename(path)}' ({offset} bytes)")
+        return True
+
+    def _read_lines(self, name, f, offset):
+        """Líneas completas desde ``offset`` (unos ``TAIL_READ_BYTES``; una línea
+        más larga se lee entera). Devuelve ``(bytes, offset donde empiezan)``:
+        el offset avanza si se descartó una línea de más de ``MAX_LINE_BYTES``."""
+        if name in self._skipping:
+            offset, found = self._skip_line(f, offset)
+            if not found:
+                return b'', offset
+            self._skipping.discard(name)
+        f.seek(offset)
+        chunk = f.read(TAIL_READ_BYTES)
+        while b'\n' not in chunk:
+            if len(chunk) > MAX_LINE_BYTES:
+                logging.warning(f"⚠️ Línea de más de {MAX_LINE_BYTES} bytes descartada en '{name}' (byte {offset})")
+                self._skipping.add(name)
+                return self._read_lines(name, f, offset + len(chunk))
+            more = f.read(TAIL_READ_BYTES)
+            if not more:
+                return b'', offset  # Sin líneas completas todavía
+            chunk += more
+        return chunk[:chunk.rfind(b'\n') + 1], offset
+
+    @staticmethod
+    def _skip_line(f, offset):
+        """Avanza hasta después del próximo salto de línea: ``(offset, encontrado)``."""
+        f.seek(offset)
+        while True:
+            block = f.read(TAIL_READ_BYTES)
+            if not block:
+                return offset, False
+            end = block.find(b'\n')
+            if end >= 0:
+                return offset + end + 1, True
+            offset += len(block)
+
+    def run(self):
+        while True:
+            try:
+                self.poll_once()
+            except Exception as e:
+                logging.error(f"❌ Error al leer los archivos de ingesta: {e}")
+            time.sleep(self.poll_seconds)
+
+    def start(self):
+        if self._thread is None:
+            os.makedirs(self.directory, exist_ok=True)
+            self._thread = threading.Thread(target=self.run, name='ingest-tailer', daemon=True)
+            self._thread.start()
+        return self._thread
+
+
+# ============================================
+# PRODUCTOR DE PRUEBA
+# ============================================
+
+def interval_batches(table):
+    """Un lote de columnas por intervalo de una ``TrafficTable``, en orden."""
+    vehicle_names = np.array(table.vehicle_types, dtype=object)
+    for i, interval in enumerate(table.time_intervals):
+        rows = table.interval_id == i
+        yield interval, {
+            'NroPunto': table.point[rows].tolist(),
+            'Sentido': table.direction[rows].tolist(),
+            'TipoVehiculo': vehicle_names[table.vehicle_type_id[rows]].tolist(),
+            'Cantidad': table.quantity[rows].tolist(),
+        }
+
+
+def post_batch(url, corridor_id, rows):
+    request = urllib.request.Request(
+        f"{url.rstrip('/')}/api/ingest?corridor={corridor_id}",
+        data=json.dumps({'rows': rows}).encode('utf-8'),
+        headers={'Content-Type': 'application/json'}, method='POST')
+    with urllib.request.urlopen(request, timeout=10) as response:
+        return json.load(response)
+
+
+def main(argv=None):
+    from corridors import load_corridor_configs
+    from traffic_table import load_or_convert
+
+    parser = argparse.ArgumentParser(description="Productor de conteos en vivo a partir de la tabla de tráfico")
+    parser.add_argument('--corridor', help="Corredor (por defecto, el primero configurado)")
+    parser.add_argument('--url', help="Servidor al que enviar los lotes por POST (sin esto, se escriben en --directory)")
+    parser.add_argument('--directory', default=INGEST_DIR, help="Directorio que sigue el escritor")
+    parser.add_argument('--seconds-per-interval', type=float, default=10.0)
+    parser.add_argument('--loops', type=int, default=1, help="Vueltas a la jornada (0 = sin fin)")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    configs = {config.corridor_id: config for config in load_corridor_configs()}
+    config = configs[args.corridor] if args.corridor else next(iter(configs.values()))
+    table = load_or_convert(config.traffic_file, config.traffic_table_file)
+    spool_path = os.path.join(args.directory, f'producer-{os.getpid()}.jsonl')
+    if not args.url:
+        os.makedirs(args.directory, exist_ok=True)
+
+    loop = 0
+    while args.loops == 0 or loop < args.loops:
+        for interval, rows in interval_batches(table):
+            if args.url:
+                result = post_batch(args.url, config.corridor_id, rows)
+                logging.info(f"📤 {interval}: {result}")
+            else:
+                append_line(spool_path, (json.dumps({'corridor': config.corridor_id, 'rows': rows}) + '\n').encode('utf-8'))
+                logging.info(f"📤 {interval}: {len(rows['Cantidad'])} filas → '{spool_path}'")
+            time.sleep(args.seconds_per_interval)
+        loop += 1
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,233 @@
+"""Métricas de rendimiento en formato de texto de Prometheus (sin dependencias).
+
+Contadores, gauges e histogramas mínimos, seguros entre hilos, para medir
+los caminos calientes (carga de datos, ticks, recálculo de estado y
+peticiones HTTP). ``/metrics`` devuelve ``REGISTRY.render()``.
+
+Cada worker de gunicorn/uvicorn tiene su propio registro: las métricas de
+ticks solo aparecen en el worker escritor y ``atu_worker_info`` indica el
+rol del worker que respondió.
+"""
+import bisect
+import math
+import threading
+import time
+from contextlib import contextmanager
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Segundos: desde microsegundos (recálculos vectorizados) hasta el periodo del tick
+DEFAULT_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+                   0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+LOAD_BUCKETS = (0.01, 0.05, 0.1, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+
+
+def _format_value(value):
+    if isinstance(value, float):
+        if math.isinf(value):
+            return '+Inf' if value > 0 else '-Inf'
+        return repr(value)
+    return str(value)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name}: se esperaban las etiquetas {self.labelnames}, no {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def header(self):
+        return [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.kind}']
+
+    def samples(self):
+        raise NotImplementedError
+
+    def render(self):
+        return self.header() + self.samples()
+
+
+class Counter(_Metric):
+    """Valor que solo crece (p. ej. ticks ejecutados)."""
+    kind = 'counter'
+
+    def header(self):
+        return [f'# HELP {self.name}_total {self.documentation}', f'# TYPE {self.name}_total {self.kind}']
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self._values.get(self._key(labels), 0)
+
+    def samples(self):
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f'{self.name}_total{_format_labels(self.labelnames, key)} {_format_value(value)}'
+                for key, value in items]
+
+
+class Gauge(_Metric):
+    """Valor que sube y baja. Con ``set_function`` se calcula al exportar."""
+    kind = 'gauge'
+
+    def __init__(self, name, documentation, labelnames=()):
+        super().__init__(name, documentation, labelnames)
+        self._function = None
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def set_function(self, function):
+        """``function()`` devuelve ``{(valores de etiquetas...): valor}`` en cada exportación."""
+        self._function = function
+
+    def samples(self):
+        if self._function is not None:
+            items = sorted((tuple(str(v) for v in key), value) for key, value in self._function().items())
+        else:
+            with self._lock:
+                items = sorted(self._values.items())
+        return [f'{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}'
+                for key, value in items]
+
+
+class Histogram(_Metric):
+    """Distribución de duraciones en cubetas acumuladas, con suma y conteo."""
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def count(self, **labels):
+        state = self._values.get(self._key(labels))
+        return state[2] if state else 0
+
+    def samples(self):
+        with self._lock:
+            items = sorted((key, (list(state[0]), state[1], state[2])) for key, state in self._values.items())
+        lines = []
+        for key, (bucket_counts, total, count) in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (math.inf,), bucket_counts):
+                cumulative += bucket_count
+                le = (('le', _format_value(float(bound))),)
+                lines.append(f'{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}')
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f'{self.name}_sum{labels} {_format_value(total)}')
+            lines.append(f'{self.name}_count{labels} {count}')
+        return lines
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name, documentation, labelnames=()):
+        return self.register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return ('\n'.join(lines) + '\n').encode('utf-8')
+
+
+REGISTRY = MetricsRegistry()
+
+LOAD_SECONDS = REGISTRY.histogram(
+    'atu_load_duration_seconds', 'Duración de cada etapa de carga de datos por corredor.',
+    ('corridor', 'stage'), LOAD_BUCKETS)
+TICK_SECONDS = REGISTRY.histogram(
+    'atu_tick_duration_seconds', 'Duración de un tick del planificador (todos los corredores).')
+TICK_LAG_SECONDS = REGISTRY.histogram(
+    'atu_tick_lag_seconds', 'Atraso del inicio de cada tick respecto de su horario fijo.')
+TICKS = REGISTRY.counter('atu_ticks', 'Ticks de simulación ejecutados por este worker.')
+EVACUATIONS = REGISTRY.counter(
+    'atu_evacuations', 'Secciones evacuadas por superar el umbral de ocupación.', ('corridor',))
+RECOMPUTE_SECONDS = REGISTRY.histogram(
+    'atu_state_recompute_seconds', 'Recálculo de densidad UCP y ocupación.', ('source',))
+SNAPSHOT_SECONDS = REGISTRY.histogram(
+    'atu_snapshot_build_seconds', 'Armado y serialización de la instantánea de un corredor.')
+SHARED_STATE_SYNC_SECONDS = REGISTRY.histogram(
+    'atu_shared_state_sync_seconds', 'Lectura del estado compartido en un worker lector.')
+REQUEST_SECONDS = REGISTRY.histogram(
+    'atu_http_request_duration_seconds', 'Latencia de las peticiones HTTP hasta la respuesta.',
+    ('method', 'endpoint', 'status'))
+SNAPSHOT_VERSION = REGISTRY.gauge(
+    'atu_snapshot_version', 'Versión (update_counter) de la última instantánea publicada.', ('corridor',))
+SNAPSHOT_AGE_SECONDS = REGISTRY.gauge(
+    'atu_snapshot_age_seconds', 'Segundos desde el tick de la última instantánea publicada.', ('corridor',))
+HISTORY_FLUSH_SECONDS = REGISTRY.histogram(
+    'atu_history_flush_seconds', 'Escritura de un lote de ticks (y sus rollups) en el historial.', ('corridor',))
+HISTORY_DROPPED = REGISTRY.counter(
+    'atu_history_dropped_records', 'Ticks descartados del historial por cola de escritura llena.', ('corridor',))
+INGEST_ROWS = REGISTRY.counter(
+    'atu_ingest_rows', 'Filas de conteo en vivo recibidas por resultado (accepted, rejected, dropped).',
+    ('corridor', 'result'))
+INGEST_QUEUE_ROWS = REGISTRY.gauge('atu_ingest_queue_rows', 'Filas de conteo en vivo esperando el próximo tick.')
+STREAM_CLIENTS = REGISTRY.gauge('atu_stream_clients', 'Conexiones abiertas de /api/stream en este worker.')
+STREAM_REJECTED = REGISTRY.counter(
+    'atu_stream_rejected', 'Conexiones de /api/stream rechazadas con 503 por cupo lleno.')
+WORKER_INFO = REGISTRY.gauge('atu_worker_info', 'Proceso que respondió y su rol.', ('pid', 'role', 'stage'))
@@ -0,0 +1,269 @@
+"""Construcción incremental de las secciones de la ruta, con caché por contenido.
+
+Cambiar ``KEY_INTERSECTIONS_IDA``/``KEY_INTERSECTIONS_VUELTA`` o
+``SEGMENT_NAMES`` invalida el caché binario de la ruta, pero no hace falta
+volver a descargar el grafo ni recalcular todos los caminos. Cada paso
+guarda su resultado en ``cache/build/<grafo>/`` identificado por sus
+entradas:
+
+- ``graph.npz`` + ``segments/``: el grafo vial en forma compacta (nodos con
+  coordenadas y edges con su longitud mínima) y sus segmentos de
+  calle. La clave del directorio es la huella del polígono y de las
+  respuestas de Overpass usadas (o de la descarga de OSM).
+- ``snaps.json``: nodo más cercano de cada coordenada de intersección.
+- ``paths.json``: edges del camino más corto entre cada par de nodos.
+
+Solo se recalculan los nodos de las intersecciones nuevas y los caminos de
+las secciones cuyos extremos cambiaron; renombrar una sección no calcula
+nada. osmnx solo hace falta para construir el grafo la primera vez: el
+nodo más cercano se busca sobre las coordenadas compactas (distancia
+haversine, como ``ox.nearest_nodes``) y los caminos que faltan se calculan
+con ``networkx.shortest_path`` sobre un ``DiGraph`` armado desde los arrays.
+"""
+import hashlib
+import json
+import logging
+import os
+import re
+import time
+import numpy as np
+
+from binary_cache import save_binary_cache, load_binary_cache
+from traffic_table import file_sha1
+
+BUILD_DIR = os.path.join('cache', 'build')
+BUILD_CACHE_VERSION = 1
+EARTH_RADIUS_M = 6371008.8
+_OVERPASS_CACHE_NAME = re.compile(r'^[0-9a-f]{40}\.json$')
+
+
+def find_overpass_responses(cache_dir):
+    """Rutas de las respuestas de Overpass guardadas por la caché HTTP de osmnx."""
+    if not os.path.isdir(cache_dir):
+        return []
+    return sorted(os.path.join(cache_dir, name) for name in os.listdir(cache_dir)
+                  if _OVERPASS_CACHE_NAME.match(name))
+
+
+def graph_key(route_polygon, overpass_paths, network_type='drive'):
+    """Huella de las entradas del grafo: polígono y contenido de las respuestas de
+    Overpass (sin respuestas locales, el grafo se descarga de OSM)."""
+    payload = json.dumps({
+        'version': BUILD_CACHE_VERSION,
+        'polygon': route_polygon.wkt,
+        'network_type': network_type,
+        'sources': sorted(file_sha1(path) for path in overpass_paths) or ['osm-download'],
+    }, sort_keys=True)
+    return hashlib.sha1(payload.encode('utf-8')).hexdigest()
+
+
+def section_from_edges(road_segments_data, dir_name, index, edges, segment_names, lanes_per_road, meters_per_ucp):
+    """Sección ``index`` del sentido ``dir_name`` a partir de los edges de su camino."""
+    names_for_direction = segment_names.get(dir_name, [])
+    segment_name = names_for_direction[index] if index < len(names_for_direction) else f"Segmento {index+1} ({dir_name})"
+    total_length = sum(road_segments_data[edge_id]['length'] for edge_id in edges)
+    section_info = {
+        "section_id": f"{dir_name}_{index}",
+        "segment_name": segment_name,
+        "direction": dir_name,
+        "edges": set(edges),
+        "total_length_meters": round(total_length, 2),
+        "ucp_capacity": 0.0
+    }
+    if meters_per_ucp > 0:
+        capacity = (total_length / meters_per_ucp) * lanes_per_road
+        section_info['ucp_capacity'] = round(capacity, 2)
+    return section_info
+
+
+class CompactGraph:
+    """Grafo vial en arrays: coordenadas de los nodos, sucesores con la longitud
+    mínima entre edges paralelos y las claves de los edges de cada par de nodos."""
+
+    def __init__(self, arrays):
+        self.arrays = arrays
+        self.node_ids = arrays['node_ids']
+        self._lat = np.radians(arrays['node_lat'])
+        self._lon = np.radians(arrays['node_lon'])
+        self._nx = None
+        self.keys = {}
+        for u, v, key in zip(arrays['edge_u'].tolist(), arrays['edge_v'].tolist(), arrays['edge_key'].tolist()):
+            self.keys.setdefault((u, v), []).append(key)
+
+    @classmethod
+    def from_graph(cls, graph):
+        nodes = list(graph.nodes(data=True))
+        succ = [(u, v, min(data.get('length', 1) for data in keyed.values()))
+                for u, neighbors in graph.succ.items() for v, keyed in neighbors.items()]
+        edges = list(graph.edges(keys=True))
+        return cls({
+            'node_ids': np.array([n for n, _ in nodes], dtype=np.int64),
+            'node_lat': np.array([data['y'] for _, data in nodes], dtype=np.float64),
+            'node_lon': np.array([data['x'] for _, data in nodes], dtype=np.float64),
+            'succ_u': np.array([e[0] for e in succ], dtype=np.int64),
+            'succ_v': np.array([e[1] for e in succ], dtype=np.int64),
+            'succ_weight': np.array([e[2] for e in succ], dtype=np.float64),
+            'edge_u': np.array([e[0] for e in edges], dtype=np.int64),
+            'edge_v': np.array([e[1] for e in edges], dtype=np.int64),
+            'edge_key': np.array([e[2] for e in edges], dtype=np.int64),
+        })
+
+    def save(self, path):
+        tmp_path = path + '.tmp.npz'
+        np.savez(tmp_path, **self.arrays)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path, allow_pickle=False) as data:
+            return cls({name: data[name] for name in data.files})
+
+    def nearest_nodes(self, lats, lons):
+        """Nodo más cercano (distancia haversine) a cada coordenada."""
+        lat = np.radians(np.asarray(lats, dtype=np.float64))[:, None]
+        lon = np.radians(np.asarray(lons, dtype=np.float64))[:, None]
+        h = (np.sin((self._lat - lat) / 2) ** 2
+             + np.cos(lat) * np.cos(self._lat) * np.sin((self._lon - lon) / 2) ** 2)
+        return self.node_ids[np.argmin(h, axis=1)].tolist()
+
+    def to_networkx(self):
+        """``DiGraph`` de networkx con la longitud mínima de cada par de nodos
+        (la que usa el camino más corto de un ``MultiDiGraph``)."""
+        if self._nx is None:
+            import networkx as nx  # Solo si hay caminos que recalcular
+            self._nx = nx.DiGraph()
+            self._nx.add_nodes_from(self.node_ids.tolist())
+            self._nx.add_weighted_edges_from(zip(self.arrays['succ_u'].tolist(), self.arrays['succ_v'].tolist(),
+                                                 self.arrays['succ_weight'].tolist()), weight='length')
+        return self._nx
+
+    def shortest_path(self, source, target):
+        """Camino más corto por longitud (lista de nodos) o ``None`` si no hay,
+        con ``networkx.shortest_path`` como ``ox.shortest_path``."""
+        import networkx as nx
+        try:
+            return nx.shortest_path(self.to_networkx(), source, target, weight='length')
+        except (nx.NetworkXNoPath, nx.NodeNotFound):
+            return None
+
+    def path_edges(self, path_nodes):
+        """Ids de edge (``u_v_key``) de todos los edges paralelos del camino."""
+        return sorted(f"{u}_{v}_{key}" for u, v in zip(path_nodes, path_nodes[1:])
+                      for key in self.keys.get((u, v), ()))
+
+
+class RouteBuildCache:
+    """Pasos de la construcción de la ruta de un corredor, cada uno cacheado por sus entradas.
+
+    ``load_graph`` devuelve el ``MultiDiGraph`` de osmnx (o ``None``) y solo
+    se llama si el grafo compacto de estas entradas todavía no existe.
+    """
+
+    def __init__(self, key, load_graph, directory=BUILD_DIR):
+        self.key = key
+        self.directory = os.path.join(directory, key)
+        self._load_graph = load_graph
+        self._graph = None
+        self._segments = None
+        self.snaps = self._read_json('snaps.json')
+        self.paths = self._read_json('paths.json')
+        self.stats = {'snapped': 0, 'paths_computed': 0, 'paths_reused': 0}
+
+    @classmethod
+    def for_corridor(cls, corridor, load_graph, overpass_paths=None, directory=BUILD_DIR):
+        if overpass_paths is None:
+            overpass_paths = find_overpass_responses(corridor.overpass_dir)
+        return cls(graph_key(corridor.route_polygon, overpass_paths), load_graph, directory)
+
+    def _read_json(self, name):
+        try:
+            with open(os.path.join(self.directory, name), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _write_json(self, name, value):
+        path = os.path.join(self.directory, name)
+        with open(path + '.tmp', 'w', encoding='utf-8') as f:
+            json.dump(value, f)
+        os.replace(path + '.tmp', path)
+
+    def graph(self):
+        """Grafo compacto; la primera vez se construye con ``load_graph`` y se guarda."""
+        if self._graph is not None:
+            return self._graph
+        graph_path = os.path.join(self.directory, 'graph.npz')
+        segments_dir = os.path.join(self.directory, 'segments')
+        if os.path.exists(graph_path) and load_binary_cache(segments_dir, self.key) is not None:
+            self._graph = CompactGraph.load(graph_path)
+            return self._graph
+
+        graph = self._load_graph()
+        if graph is None:
+            raise RuntimeError("No se pudo obtener el grafo vial")
+        from route_builder import extract_road_segments  # osmnx solo para el grafo nuevo
+        os.makedirs(self.directory, exist_ok=True)
+        save_binary_cache(segments_dir, self.key, extract_road_segments(graph), [])
+        self._graph = CompactGraph.from_graph(graph)
+        self._graph.save(graph_path)
+        logging.info(f"💾 Grafo compacto guardado en '{self.directory}' ({len(self._graph.node_ids)} nodos)")
+        return self._graph
+
+    def road_segments_data(self):
+        if self._segments is None:
+            cached = load_binary_cache(os.path.join(self.directory, 'segments'), self.key)
+            if cached is None:
+                self.graph()
+                cached = load_binary_cache(os.path.join(self.directory, 'segments'), self.key)
+            self._segments = cached[0]
+        return self._segments
+
+    def snap(self, points):
+        """Nodo más cercano de cada ``[lat, lon]``; solo se calculan los que no estaban."""
+        keys = [f"{float(lat)!r},{float(lon)!r}" for lat, lon in points]
+        missing = [i for i, key in enumerate(keys) if key not in self.snaps]
+        if missing:
+            nodes = self.graph().nearest_nodes([points[i][0] for i in missing], [points[i][1] for i in missing])
+            for i, node in zip(missing, nodes):
+                self.snaps[keys[i]] = node
+            self.stats['snapped'] += len(missing)
+        return [self.snaps[key] for key in keys]
+
+    def section_edges(self, start_node, end_node):
+        """Edges del camino más corto entre dos nodos (``None`` si no hay camino)."""
+        key = f"{start_node}-{end_node}"
+        if key in self.paths:
+            self.stats['paths_reused'] += 1
+            return self.paths[key]
+        graph = self.graph()
+        path_nodes = graph.shortest_path(start_node, end_node)
+        self.paths[key] = graph.path_edges(path_nodes) if path_nodes else None
+        self.stats['paths_computed'] += 1
+        return self.paths[key]
+
+    def structure_route(self, corridor):
+        """Segmentos de calle y secciones de la ruta de ``corridor``: nodo más cercano a
+        cada intersección clave y camino más corto entre nodos consecutivos de cada sentido."""
+        start = time.perf_counter()
+        road_segments_data = self.road_segments_data()
+        directions = {
+            corridor.directions[0]: self.snap(corridor.key_intersections_ida),
+            corridor.directions[1]: self.snap(corridor.key_intersections_vuelta),
+        }
+        sections = []
+        for dir_name, nodes_order in directions.items():
+            for i in range(len(nodes_order) - 1):
+                edges = self.section_edges(nodes_order[i], nodes_order[i + 1])
+                if not edges:
+                    logging.warning(f"⚠️ Sin camino para la sección {i} ({dir_name})")
+                    continue
+                sections.append(section_from_edges(road_segments_data, dir_name, i, edges, corridor.segment_names,
+                                                   corridor.lanes_per_road, corridor.meters_per_ucp))
+        if self.stats['snapped'] or self.stats['paths_computed']:
+            os.makedirs(self.directory, exist_ok=True)
+            self._write_json('snaps.json', self.snaps)
+            self._write_json('paths.json', self.paths)
+        logging.info(f"♻️ Ruta '{corridor.corridor_id}' en {(time.perf_counter() - start) * 1000:.1f} ms: "
+                     f"{self.stats['paths_reused']} secciones reutilizadas, "
+                     f"{self.stats['paths_computed']} recalculadas, {self.stats['snapped']} intersecciones ubicadas")
+        return road_segments_data, sections
@@ -0,0 +1,141 @@
+"""Construcción de la red vial y las secciones de la ruta.
+
+Puede trabajar sin red: arma el grafo ``drive`` directamente desde la
+respuesta de Overpass que ya está guardada en ``cache/<hash>.json`` (la caché
+HTTP de osmnx), replicando los pasos de ``ox.graph_from_polygon`` con
+``clean_periphery=True``. Como script genera el caché binario de cada
+corredor configurado (ver corridors.py) en tiempo de build:
+
+    python route_builder.py [--corridors corridors.json] [--corridor <id> --overpass cache/<hash>.json ...]
+"""
+import argparse
+import json
+import logging
+
+import osmnx as ox
+# Internos de osmnx 1.9 (versión fijada en requirements.txt) para armar el grafo
+# a partir de respuestas de Overpass ya descargadas: ver check_osmnx_version.
+from osmnx import graph as ox_graph, projection, simplification, truncate
+
+from binary_cache import save_binary_cache
+from route_build_cache import RouteBuildCache, find_overpass_responses
+from corridors import CORRIDORS_FILE, load_corridor_configs
+from route_config import ROUTE_POLYGON
+
+CACHE_DIR = 'cache'
+PERIPHERY_BUFFER_METERS = 500
+SUPPORTED_OSMNX_VERSION = (1, 9)
+
+
+def load_overpass_responses(paths):
+    responses = []
+    for path in paths:
+        with open(path, 'r', encoding='utf-8') as f:
+            response = json.load(f)
+        if 'elements' in response:
+            responses.append(response)
+    return responses
+
+
+def check_osmnx_version():
+    """``graph_from_overpass_json`` usa ``_create_graph`` y la firma de
+    ``truncate_graph_polygon`` de osmnx 1.9, que cambian en otras versiones."""
+    version = tuple(int(part) for part in ox.__version__.split('.')[:2] if part.isdigit())
+    if version != SUPPORTED_OSMNX_VERSION:
+        raise RuntimeError(
+            f"El grafo offline requiere osmnx {'.'.join(map(str, SUPPORTED_OSMNX_VERSION))}.x "
+            f"(instalado: {ox.__version__}); instala la versión de requirements.txt")
+
+
+def graph_from_overpass_json(response_jsons, polygon=ROUTE_POLYGON, network_type='drive'):
+    """Grafo simplificado y recortado al polígono, sin acceso a la red."""
+    check_osmnx_version()
+    poly_proj, crs_utm = projection.project_geometry(polygon)
+    poly_buff, _ = projection.project_geometry(poly_proj.buffer(PERIPHERY_BUFFER_METERS),
+                                               crs=crs_utm, to_latlong=True)
+    bidirectional = network_type in ox.settings.bidirectional_network_types
+    graph = ox_graph._create_graph(response_jsons, retain_all=True, bidirectional=bidirectional)
+    graph = truncate.truncate_graph_polygon(graph, poly_buff, retain_all=True, truncate_by_edge=False)
+    graph = simplification.simplify_graph(graph)
+    return truncate.truncate_graph_polygon(graph, polygon, retain_all=False, truncate_by_edge=False)
+
+
+def load_offline_graph(cache_dir=CACHE_DIR, overpass_paths=None, polygon=ROUTE_POLYGON):
+    """Grafo construido desde las respuestas de Overpass locales, o ``None`` si no hay."""
+    paths = overpass_paths if overpass_paths is not None else find_overpass_responses(cache_dir)
+    responses = load_overpass_responses(paths)
+    if not responses:
+        return None
+    logging.info(f"📦 Construyendo grafo offline desde {len(responses)} respuesta(s) de Overpass locales")
+    return graph_from_overpass_json(responses, polygon)
+
+
+def extract_road_segments(graph):
+    """Segmentos de calle del grafo con la forma de ``road_segments_data``."""
+    road_segments_data = {}
+    edges_gdf = ox.graph_to_gdfs(graph, nodes=False, edges=True)
+    for (u, v, key), edge_data in edges_gdf.iterrows():
+        road_id = f"{u}_{v}_{key}"
+        road_segments_data[road_id] = {
+            'id': road_id,
+            'name': str(edge_data.get('name', 'Vía sin nombre')),
+            'coords': [[lat, lon] for lon, lat in list(edge_data.geometry.coords)],
+            'color': 'gray',
+            'length': float(edge_data.get('length', 100))
+        }
+    return road_segments_data
+
+
+def build_corridor_cache(corridor, overpass_paths=None):
+    """Genera el caché binario de un corredor. Devuelve ``True`` si lo logró.
+
+    Los pasos (grafo, nodos clave y camino de cada sección) se reutilizan del
+    caché de construcción: solo se recalculan las secciones que cambiaron.
+    """
+    logging.info(f"🛣️ Corredor '{corridor.corridor_id}' ({corridor.name})")
+    if overpass_paths is None:
+        overpass_paths = find_overpass_responses(corridor.overpass_dir)
+    if not overpass_paths:
+        logging.critical(f"❌ No hay respuestas de Overpass locales en '{corridor.overpass_dir}'")
+        return False
+    build_cache = RouteBuildCache.for_corridor(
+        corridor, lambda: load_offline_graph(corridor.overpass_dir, overpass_paths, corridor.route_polygon),
+        overpass_paths)
+    road_segments_data, sections = build_cache.structure_route(corridor)
+    if not sections:
+        logging.critical("❌ No se pudo calcular ninguna sección de la ruta")
+        return False
+    save_binary_cache(corridor.route_cache_dir, corridor.fingerprint(), road_segments_data, sections)
+    logging.info(f"✅ Caché de ruta generado: {len(road_segments_data)} segmentos, {len(sections)} secciones")
+    return True
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Genera el caché binario de las rutas sin acceso a la red.")
+    parser.add_argument('--corridors', default=CORRIDORS_FILE,
+                        help="JSON de corredores. Si no existe, solo el corredor por defecto.")
+    parser.add_argument('--corridor', default=None, help="Generar solo este corredor (id).")
+    parser.add_argument('--overpass', nargs='*', default=None,
+                        help="Respuestas de Overpass (JSON). Por defecto, las de la caché de osmnx del corredor.")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    corridors = load_corridor_configs(args.corridors)
+    if args.corridor is not None:
+        corridors = [c for c in corridors if c.corridor_id == args.corridor]
+        if not corridors:
+            logging.critical(f"❌ Corredor desconocido: '{args.corridor}'")
+            return 1
+    elif args.overpass is not None and len(corridors) > 1:
+        logging.critical("❌ --overpass requiere --corridor cuando hay varios corredores")
+        return 1
+
+    failed = [c.corridor_id for c in corridors if not build_corridor_cache(c, args.overpass)]
+    if failed:
+        logging.critical(f"❌ Corredores sin caché: {failed}")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
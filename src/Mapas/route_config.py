@@ -0,0 +1,125 @@
+"""Definición del corredor Av. Pachacútec (corredor por defecto).
+
+Lo comparten el servidor (app.py), la configuración de corredores
+(corridors.py) y el build offline de la red vial (route_builder.py), por eso
+vive aparte y no tiene efectos al importarse.
+"""
+from shapely.geometry import Polygon
+
+CORRIDOR_ID = 'pachacutec'
+CORRIDOR_NAME = 'Av. Pachacútec'
+DIRECTIONS = ("VMT→SJM", "SJM→VMT")  # (ida, vuelta)
+
+KEY_INTERSECTIONS_IDA = [
+    [-12.180248, -76.943505],
+    [-12.178283, -76.944721],
+    [-12.175114, -76.946517],
+    [-12.172546, -76.948311],
+]
+
+KEY_INTERSECTIONS_VUELTA = [
+    [-12.172839, -76.948411],
+    [-12.175273, -76.946697],
+    [-12.178550, -76.944770],
+    [-12.180411, -76.943712]
+]
+
+SEGMENT_NAMES = {
+    "VMT→SJM": [
+        "1 - Av. Pachacutec VTM -> SJM",
+        "2 - Av. Pachacutec VTM -> SJM",
+        "3 - Av. Pachacutec VTM -> SJM"
+    ],
+    "SJM→VMT": [
+        "1 - Av. Pachacutec SJM -> VTM",
+        "2 - Av. Pachacutec SJM -> VTM",
+        "3 - Av. Pachacutec SJM -> VTM"
+    ]
+}
+
+ROUTE_POLYGON = Polygon([
+    (-76.94355863975865, -12.18080522540366),
+    (-76.9428990071678, -12.180607162560918),
+    (-76.94334006307575, -12.179922712836785),
+    (-76.94429571770476, -12.178458973336589),
+    (-76.94484503099531, -12.177591023489583),
+    (-76.94536424492756, -12.176686293086448),
+    (-76.9458526857877, -12.17580328561742),
+    (-76.94820456213188, -12.172334810185774),
+    (-76.94907327632758, -12.170901808986514),
+    (-76.95086499935601, -12.167850021415546),
+    (-76.95259436691164, -12.165433986253731),
+    (-76.95667637078154, -12.160155764369861),
+    (-76.9575326302631, -12.159535874497408),
+    (-76.97851207110256, -12.150930872310184),
+    (-76.97884478211589, -12.150956550503054),
+    (-76.980511693104, -12.150227570036975),
+    (-76.98083774391753, -12.149818078382467),
+    (-76.98203186797949, -12.150378347584223),
+    (-76.95765399374115, -12.160145797317284),
+    (-76.95693651367517, -12.160752397028816),
+    (-76.95195760705587, -12.167003830854469),
+    (-76.95136005724406, -12.167755623271432),
+    (-76.95112234024414, -12.168323687844904),
+    (-76.9493331158722, -12.171640214762647),
+    (-76.94903944653328, -12.171668850944926),
+    (-76.94866434183058, -12.172705097151251),
+    (-76.94691855998008, -12.175175997426535),
+    (-76.94355863975865, -12.18080522540366)
+])
+
+LANES_PER_ROAD = 3
+METERS_PER_UCP = 6
+
+# Diagrama fundamental: velocidad a flujo libre y velocidad mínima en congestión (km/h)
+FREE_FLOW_SPEED_KMH = 40
+MIN_SPEED_KMH = 5
+
+# (NroPunto, Sentido) del Excel -> (sección, +1 entra / -1 sale)
+SEGMENT_MAPPING = {
+    (1, 2): ("3 - Av. Pachacutec SJM -> VTM", -1),
+    (1, 3): ("1 - Av. Pachacutec VTM -> SJM", +1),
+    (2, 1): ("1 - Av. Pachacutec VTM -> SJM", -1),
+    (2, 2): ("2 - Av. Pachacutec SJM -> VTM", -1),
+    (2, 3): ("2 - Av. Pachacutec VTM -> SJM", +1),
+    (2, 4): ("3 - Av. Pachacutec SJM -> VTM", +1),
+    (3, 1): ("2 - Av. Pachacutec VTM -> SJM", -1),
+    (3, 2): ("1 - Av. Pachacutec SJM -> VTM", -1),
+    (3, 3): ("3 - Av. Pachacutec VTM -> SJM", +1),
+    (3, 4): ("2 - Av. Pachacutec SJM -> VTM", +1),
+    (4, 1): ("3 - Av. Pachacutec VTM -> SJM", -1),
+    (4, 4): ("1 - Av. Pachacutec SJM -> VTM", +1),
+}
+
+INITIAL_INVENTORY = {
+    "1 - Av. Pachacutec VTM -> SJM": {
+        'Auto': 20, 'Taxi': 15, 'Omnibus': 5, 'Microbús': 8,
+        'Camioneta rural': 10, 'Moto lineal': 12, 'Mototaxi': 18,
+        'Bicicleta': 8, 'Camión': 6, 'Tráiler': 2, 'Bus Interprovincial': 3
+    },
+    "2 - Av. Pachacutec VTM -> SJM": {
+        'Auto': 35, 'Taxi': 25, 'Omnibus': 8, 'Microbús': 12,
+        'Camioneta rural': 15, 'Moto lineal': 20, 'Mototaxi': 25,
+        'Bicicleta': 12, 'Camión': 10, 'Tráiler': 3, 'Bus Interprovincial': 5
+    },
+    "3 - Av. Pachacutec VTM -> SJM": {
+        'Auto': 40, 'Taxi': 30, 'Omnibus': 10, 'Microbús': 15,
+        'Camioneta rural': 18, 'Moto lineal': 25, 'Mototaxi': 30,
+        'Bicicleta': 15, 'Camión': 12, 'Tráiler': 4, 'Bus Interprovincial': 6
+    },
+    "1 - Av. Pachacutec SJM -> VTM": {
+        'Auto': 35, 'Taxi': 28, 'Omnibus': 8, 'Microbús': 12,
+        'Camioneta rural': 16, 'Moto lineal': 22, 'Mototaxi': 28,
+        'Bicicleta': 13, 'Camión': 11, 'Tráiler': 3, 'Bus Interprovincial': 5
+    },
+    "2 - Av. Pachacutec SJM -> VTM": {
+        'Auto': 30, 'Taxi': 22, 'Omnibus': 7, 'Microbús': 10,
+        'Camioneta rural': 14, 'Moto lineal': 18, 'Mototaxi': 23,
+        'Bicicleta': 10, 'Camión': 9, 'Tráiler': 2, 'Bus Interprovincial': 4
+    },
+    "3 - Av. Pachacutec SJM -> VTM": {
+        'Auto': 38, 'Taxi': 26, 'Omnibus': 9, 'Microbús': 13,
+        'Camioneta rural': 17, 'Moto lineal': 21, 'Mototaxi': 27,
+        'Bicicleta': 14, 'Camión': 10, 'Tráiler': 3, 'Bus Interprovincial': 5
+    }
+}
@@ -0,0 +1,273 @@
+"""Ejecución acelerada de la simulación y escenarios "qué pasaría si".
+
+El tick en vivo avanza un intervalo cada ``SIMULATION_TICK_SECONDS``. Para
+planificación, en cambio, se reproducen N intervalos seguidos sin esperas y
+para muchos escenarios a la vez: cada escenario cambia carriles por vía,
+metros por UCP, inventario inicial o la regla de evacuación, y devuelve la
+tabla de ocupación por intervalo y sección.
+
+Los escenarios se agrupan en lotes que avanzan con una sola operación
+vectorizada (ver ``simulation_engine.replay_batch``) y los lotes se reparten
+entre un pool de procesos. Los datos del corredor (``ScenarioBase``) se
+envían una sola vez a cada proceso.
+
+    python scenarios.py --grid lanes_per_road=2,3,4 meters_per_ucp=5,6,7 threshold=90,100 \\
+        [--corridor pachacutec] [--intervals 96] [--workers 4] [--output escenarios.json]
+"""
+import argparse
+import itertools
+import json
+import logging
+import math
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import asdict, dataclass, field, fields
+
+import numpy as np
+
+from simulation_engine import initial_counts_matrix, replay_batch
+
+DEFAULT_THRESHOLD = 100.0
+DEFAULT_KEEP_RATIO = 0.45
+BATCHES_PER_WORKER = 4
+# Un lote vectorizado simula cientos de escenarios en milisegundos: por debajo
+# de esto por proceso, arrancar el pool cuesta más de lo que ahorra
+MIN_SCENARIOS_PER_PROCESS = 500
+
+
+@dataclass(frozen=True)
+class Scenario:
+    """Variante de un corredor. Los campos en ``None`` toman el valor del corredor."""
+    name: str
+    lanes_per_road: float = None
+    meters_per_ucp: float = None
+    inventory_scale: float = 1.0  # Multiplica el inventario inicial de todas las secciones
+    initial_inventory: dict = field(default=None)  # Reemplaza el inventario de las secciones indicadas
+    threshold: float = DEFAULT_THRESHOLD  # % de ocupación que dispara la evacuación
+    keep_ratio: float = DEFAULT_KEEP_RATIO  # Fracción de vehículos que quedan tras evacuar
+
+
+def scenario_from_dict(entry):
+    known = {f.name for f in fields(Scenario)}
+    unknown = set(entry) - known
+    if unknown:
+        raise ValueError(f"Parámetros de escenario desconocidos: {sorted(unknown)}")
+    return Scenario(**entry)
+
+
+def scenario_grid(**axes):
+    """Un escenario por cada combinación de los valores de ``axes``
+    (p. ej. ``lanes_per_road=[2, 3]``, ``threshold=[90, 100]``)."""
+    names = list(axes)
+    scenarios = []
+    for values in itertools.product(*(axes[name] for name in names)):
+        label = ','.join(f'{name}={value}' for name, value in zip(names, values))
+        scenarios.append(Scenario(name=label or 'base', **dict(zip(names, values))))
+    return scenarios
+
+
+class ScenarioBase:
+    """Datos de un corredor necesarios para simular escenarios (solo arrays, se serializa barato)."""
+
+    def __init__(self, corridor_id, section_names, vehicle_types, weights, lengths, capacity,
+                 initial_inventory, deltas, time_intervals, lanes_per_road, meters_per_ucp):
+        self.corridor_id = corridor_id
+        self.section_names = list(section_names)
+        self.vehicle_types = list(vehicle_types)
+        self.weights = np.asarray(weights, dtype=np.float64)
+        self.lengths = np.asarray(lengths, dtype=np.float64)
+        self.capacity = np.asarray(capacity, dtype=np.float64)
+        self.initial_inventory = initial_inventory
+        self.deltas = deltas
+        self.time_intervals = list(time_intervals)
+        self.lanes_per_road = lanes_per_road
+        self.meters_per_ucp = meters_per_ucp
+        self.initial_counts = initial_counts_matrix(self.section_names, self.vehicle_types, initial_inventory)
+
+    @classmethod
+    def from_runtime(cls, runtime):
+        """Base a partir de un ``CorridorRuntime`` con el motor ya construido."""
+        store = runtime.section_state
+        config = runtime.config
+        return cls(runtime.corridor_id, store.section_names, store.vehicle_types, store.weights,
+                   store.length, store.capacity, config.initial_inventory, runtime.traffic_deltas,
+                   runtime.time_intervals, config.lanes_per_road, config.meters_per_ucp)
+
+    def capacity_for(self, scenario):
+        """Capacidad UCP por sección; misma fórmula que ``route_build_cache.section_from_edges``."""
+        lanes = self.lanes_per_road if scenario.lanes_per_road is None else scenario.lanes_per_road
+        meters = self.meters_per_ucp if scenario.meters_per_ucp is None else scenario.meters_per_ucp
+        if (lanes, meters) == (self.lanes_per_road, self.meters_per_ucp):
+            return self.capacity
+        if meters <= 0:
+            return np.zeros_like(self.lengths)
+        return np.round(self.lengths / meters * lanes, 2)
+
+    def initial_counts_for(self, scenario):
+        counts = self.initial_counts
+        if scenario.initial_inventory:
+            inventory = dict(self.initial_inventory)
+            inventory.update(scenario.initial_inventory)
+            counts = initial_counts_matrix(self.section_names, self.vehicle_types, inventory)
+        if scenario.inventory_scale != 1.0:
+            counts = (counts * scenario.inventory_scale).astype(np.int64)
+        return counts
+
+    def run(self, scenarios, steps=None):
+        """Simula un lote de escenarios en este proceso. Devuelve un ``ScenarioResult`` por escenario."""
+        steps = len(self.time_intervals) if steps is None else steps
+        ucp_density, occupancy, evacuated = replay_batch(
+            np.stack([self.initial_counts_for(s) for s in scenarios]),
+            self.deltas,
+            self.weights,
+            np.stack([self.capacity_for(s) for s in scenarios]),
+            [s.threshold for s in scenarios],
+            [s.keep_ratio for s in scenarios],
+            steps)
+        intervals = [self.time_intervals[k % len(self.time_intervals)] for k in range(steps)] \
+            if self.time_intervals else []
+        return [ScenarioResult(scenario, intervals, self.section_names,
+                               ucp_density[i], occupancy[i], evacuated[i])
+                for i, scenario in enumerate(scenarios)]
+
+
+class ScenarioResult:
+    """Tabla por intervalo (pasos × secciones) de un escenario."""
+
+    def __init__(self, scenario, intervals, section_names, ucp_density, occupancy, evacuated):
+        self.scenario = scenario
+        self.intervals = intervals
+        self.section_names = section_names
+        self.ucp_density = ucp_density
+        self.occupancy = occupancy
+        self.evacuated = evacuated
+
+    def summary(self):
+        occupancy = self.occupancy
+        return {
+            'peak_occupancy': round(float(occupancy.max()), 2) if occupancy.size else 0.0,
+            'mean_occupancy': round(float(occupancy.mean()), 2) if occupancy.size else 0.0,
+            'evacuations': int(self.evacuated.sum()),
+            'peak_occupancy_by_section': dict(zip(self.section_names,
+                                                  np.round(occupancy.max(axis=0), 2).tolist()))
+                                         if occupancy.size else {},
+        }
+
+    def to_dict(self):
+        return {
+            'scenario': asdict(self.scenario),
+            'intervals': self.intervals,
+            'sections': self.section_names,
+            'occupancy': np.round(self.occupancy, 2).tolist(),
+            'ucp_density': self.ucp_density.tolist(),
+            'evacuated': self.evacuated.astype(np.int8).tolist(),
+            'summary': self.summary(),
+        }
+
+
+# Base del corredor en cada proceso del pool (se envía una vez con el inicializador)
+_worker_base = None
+
+
+def _init_worker(base):
+    global _worker_base
+    _worker_base = base
+
+
+def _run_in_worker(scenarios, steps):
+    return _worker_base.run(scenarios, steps)
+
+
+def run_scenarios(base, scenarios, steps=None, workers=None):
+    """Simula todos los ``scenarios`` sobre ``base`` tan rápido como se pueda.
+
+    Con ``workers`` igual a 1 (o un solo lote) todo corre en este proceso; si
+    no, los lotes se reparten en un ``ProcessPoolExecutor``. Sin ``workers``
+    se usa un proceso por cada ``MIN_SCENARIOS_PER_PROCESS`` escenarios, hasta
+    el número de CPUs. Los resultados salen en el mismo orden que ``scenarios``.
+    """
+    scenarios = list(scenarios)
+    if not scenarios:
+        return []
+    if workers is None:
+        workers = min(os.cpu_count() or 1, math.ceil(len(scenarios) / MIN_SCENARIOS_PER_PROCESS))
+    batch_size = max(1, math.ceil(len(scenarios) / (workers * BATCHES_PER_WORKER)))
+    batches = [scenarios[i:i + batch_size] for i in range(0, len(scenarios), batch_size)]
+    if workers == 1 or len(batches) == 1:
+        return [result for batch in batches for result in base.run(batch, steps)]
+
+    with ProcessPoolExecutor(max_workers=min(workers, len(batches)),
+                             initializer=_init_worker, initargs=(base,)) as pool:
+        futures = [pool.submit(_run_in_worker, batch, steps) for batch in batches]
+        return [result for future in futures for result in future.result()]
+
+
+def load_scenario_base(corridor_id=None):
+    """Carga la ruta y el tráfico de un corredor (desde los cachés del build) y arma su base."""
+    import backend
+
+    runtime = backend.resolve_corridor(corridor_id)
+    if runtime is None:
+        raise ValueError(f"Corredor desconocido: '{corridor_id}'")
+    backend.load_and_structure_data(runtime)
+    if not runtime.route_loaded:
+        raise RuntimeError(f"No se pudieron cargar datos del mapa del corredor '{runtime.corridor_id}'")
+    backend.load_traffic_data(runtime)
+    runtime.build_engine(backend.VEHICLE_TYPES, backend.UCP_WEIGHTS)
+    return ScenarioBase.from_runtime(runtime)
+
+
+def parse_grid(items):
+    """``["lanes_per_road=2,3", "threshold=90,100"]`` -> ``{'lanes_per_road': [2.0, 3.0], ...}``."""
+    axes = {}
+    for item in items:
+        name, _, values = item.partition('=')
+        axes[name.strip()] = [float(v) for v in values.split(',') if v.strip()]
+    return axes
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Simula escenarios de un corredor sin esperas entre intervalos.")
+    parser.add_argument('--corridor', default=None, help="Id del corredor (por defecto, el primero configurado).")
+    parser.add_argument('--scenarios', default=None, help="JSON con la lista de escenarios.")
+    parser.add_argument('--grid', nargs='*', default=[],
+                        help="Ejes de una grilla de escenarios, p. ej. lanes_per_road=2,3,4 threshold=90,100.")
+    parser.add_argument('--intervals', type=int, default=None,
+                        help="Intervalos a simular (por defecto, una jornada).")
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--output', default=None, help="Archivo JSON con las tablas de ocupación.")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    scenarios = []
+    if args.scenarios:
+        with open(args.scenarios, 'r', encoding='utf-8') as f:
+            scenarios.extend(scenario_from_dict(entry) for entry in json.load(f))
+    if args.grid:
+        scenarios.extend(scenario_grid(**parse_grid(args.grid)))
+    if not scenarios:
+        scenarios = [Scenario(name='base')]
+
+    base = load_scenario_base(args.corridor)
+    start = time.perf_counter()
+    results = run_scenarios(base, scenarios, args.intervals, args.workers)
+    elapsed = time.perf_counter() - start
+    steps = len(results[0].intervals) if results else 0
+    logging.info(f"✅ {len(results)} escenario(s) × {steps} intervalos simulados en {elapsed:.2f}s")
+
+    for result in sorted(results, key=lambda r: r.summary()['peak_occupancy']):
+        summary = result.summary()
+        logging.info(f"  📊 {result.scenario.name}: pico {summary['peak_occupancy']}% | "
+                     f"media {summary['mean_occupancy']}% | {summary['evacuations']} evacuaciones")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({'corridor': base.corridor_id, 'results': [r.to_dict() for r in results]},
+                      f, ensure_ascii=False)
+        logging.info(f"💾 Resultados guardados en '{args.output}'")
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,220 @@
+"""Almacén compacto del estado de las secciones de la ruta.
+
+En lugar de un diccionario ``{tipo: cantidad}`` por sección, los conteos se
+guardan en una matriz contigua (secciones × tipos de vehículo) junto a los
+vectores de capacidad, longitud, densidad UCP y ocupación. La densidad y la
+ocupación de todas las secciones salen de un único producto matriz-vector
+con el vector de pesos UCP, y la velocidad y el tiempo de viaje de la
+densidad, con el diagrama fundamental de ``simulation_engine``.
+"""
+import numpy as np
+
+import route_config
+from simulation_engine import (initial_counts_matrix, apply_interval, evacuate_overflow, replay_intervals,
+                               speed_and_travel_time)
+
+
+# Vectores fijos de un almacén (no cambian entre ticks)
+STRUCTURE_ATTRS = ('weights', 'capacity', 'length', 'lanes', 'jam_density', 'free_flow_speed')
+
+
+class SectionStateStore:
+    """Estado vectorizado de todas las secciones de un corredor."""
+
+    def __init__(self, section_names, vehicle_types, ucp_weights, capacities, lengths,
+                 lanes=route_config.LANES_PER_ROAD, jam_density=1000.0 / route_config.METERS_PER_UCP,
+                 free_flow_speed=route_config.FREE_FLOW_SPEED_KMH):
+        self.section_names = list(section_names)
+        self.vehicle_types = list(vehicle_types)
+        self.weights = np.array([ucp_weights.get(vt, 0) for vt in self.vehicle_types], dtype=np.float64)
+        self.capacity = np.asarray(capacities, dtype=np.float64)
+        self.length = np.asarray(lengths, dtype=np.float64)
+        # Parámetros del diagrama fundamental, un valor por sección (admiten un escalar)
+        n = len(self.section_names)
+        # (UCP por km y carril para la densidad de congestión)
+        self.lanes = np.broadcast_to(np.asarray(lanes, dtype=np.float64), (n,)).copy()
+        self.jam_density = np.broadcast_to(np.asarray(jam_density, dtype=np.float64), (n,)).copy()
+        self.free_flow_speed = np.broadcast_to(np.asarray(free_flow_speed, dtype=np.float64), (n,)).copy()
+        self.counts = np.zeros((n, len(self.vehicle_types)), dtype=np.int32)
+        self.ucp_density = np.zeros(n, dtype=np.float64)
+        self.occupancy = np.zeros(n, dtype=np.float64)
+        self.speed, self.travel_time = self.speed_and_travel_time(self.ucp_density)
+
+    @classmethod
+    def from_sections(cls, sections, vehicle_types, ucp_weights, lanes=route_config.LANES_PER_ROAD,
+                      meters_per_ucp=route_config.METERS_PER_UCP, free_flow_speed=route_config.FREE_FLOW_SPEED_KMH):
+        """Crea el almacén a partir de la lista de secciones estructuradas.
+
+        La densidad de congestión es un vehículo equivalente cada ``meters_per_ucp``
+        metros de carril, la misma regla que fija ``ucp_capacity``.
+        """
+        return cls(
+            [s['segment_name'] for s in sections],
+            vehicle_types,
+            ucp_weights,
+            [s.get('ucp_capacity', 0) for s in sections],
+            [s.get('total_length_meters', 0) for s in sections],
+            lanes,
+            1000.0 / meters_per_ucp if meters_per_ucp > 0 else 0.0,
+            free_flow_speed,
+        )
+
+    def __len__(self):
+        return len(self.section_names)
+
+    def reset(self, initial_inventory):
+        """Restablece los conteos al inventario inicial."""
+        self.counts[:] = initial_counts_matrix(self.section_names, self.vehicle_types, initial_inventory)
+        self.recompute()
+
+    def apply_interval(self, deltas, step):
+        """Aplica los deltas de un intervalo del tensor del motor de simulación."""
+        apply_interval(self.counts, deltas, step)
+
+    def evacuate(self, threshold=100.0, keep_ratio=0.45):
+        """Aplica la regla de evacuación y devuelve los índices de secciones evacuadas."""
+        overflow = evacuate_overflow(self.counts, self.weights, self.capacity, threshold, keep_ratio)
+        return np.flatnonzero(overflow)
+
+    def recompute(self):
+        """Recalcula densidad UCP (redondeada a 2 decimales), ocupación en %,
+        velocidad (km/h) y tiempo de viaje (s)."""
+        self.ucp_density, self.occupancy = self.density_and_occupancy(self.counts)
+        self.speed, self.travel_time = self.speed_and_travel_time(self.ucp_density)
+
+    def density_and_occupancy(self, counts):
+        """Densidad UCP y ocupación para una matriz de conteos (admite lotes
+        con dimensiones iniciales extra, p. ej. intervalos × secciones × tipos)."""
+        ucp_density = np.round(counts @ self.weights, 2)
+        occupancy = np.divide(ucp_density * 100.0, self.capacity,
+                              out=np.zeros_like(ucp_density), where=self.capacity > 0)
+        return ucp_density, occupancy
+
+    def speed_and_travel_time(self, ucp_density):
+        """Velocidad (km/h) y tiempo de viaje (s) por sección para una densidad UCP
+        (admite lotes con dimensiones iniciales extra, igual que ``density_and_occupancy``)."""
+        return speed_and_travel_time(ucp_density, self.length, self.lanes, self.free_flow_speed,
+                                     self.jam_density, route_config.MIN_SPEED_KMH)
+
+    def frozen_copy(self):
+        """Copia del estado con arrays de solo lectura, apta para instantáneas."""
+        clone = self.with_state(self.counts.copy(), self.ucp_density.copy(), self.occupancy.copy(),
+                                self.speed.copy(), self.travel_time.copy())
+        for attr in STRUCTURE_ATTRS:
+            array = getattr(self, attr).copy()
+            array.flags.writeable = False
+            setattr(clone, attr, array)
+        return clone
+
+    def with_state(self, counts, ucp_density, occupancy, speed=None, travel_time=None):
+        """Vista de solo lectura que comparte la estructura de este almacén con
+        otros conteos (p. ej. una fila de la tabla de reproducción). Sin
+        ``speed``/``travel_time`` se calculan a partir de ``ucp_density``."""
+        if speed is None or travel_time is None:
+            speed, travel_time = self.speed_and_travel_time(ucp_density)
+        clone = object.__new__(SectionStateStore)
+        clone.section_names = self.section_names
+        clone.vehicle_types = self.vehicle_types
+        for attr in STRUCTURE_ATTRS:
+            setattr(clone, attr, getattr(self, attr))
+        for attr, array in (('counts', counts), ('ucp_density', ucp_density), ('occupancy', occupancy),
+                            ('speed', speed), ('travel_time', travel_time)):
+            array.flags.writeable = False
+            setattr(clone, attr, array)
+        return clone
+
+    def total_vehicles(self):
+        return self.counts.sum(axis=1)
+
+    def vehicle_counts(self, index):
+        """Conteos de una sección con la forma JSON original ``{tipo: cantidad}``."""
+        return dict(zip(self.vehicle_types, self.counts[index].tolist()))
+
+    def grouped_counts(self, group_mapping, groups, default_group):
+        """Suma los conteos por grupos de tipos de vehículo para todas las secciones.
+
+        Devuelve una matriz (secciones × grupos) en el orden de ``groups``.
+        """
+        group_index = {g: i for i, g in enumerate(groups)}
+        membership = np.zeros((len(self.vehicle_types), len(groups)), dtype=self.counts.dtype)
+        for v, vtype in enumerate(self.vehicle_types):
+            membership[v, group_index[group_mapping.get(vtype, default_group)]] = 1
+        return self.counts @ membership
+
+
+COLOR_NAMES = ('gray', 'green', 'yellow', 'red')
+OCCUPANCY_COLOR_THRESHOLDS = (50.0, 80.0)
+
+
+def occupancy_color_codes(occupancy):
+    """Código de color por sección: 1 verde (<=50%), 2 amarillo (<=80%), 3 rojo.
+
+    El código 0 (gris) queda reservado para vías fuera de la ruta.
+    """
+    return np.digitize(occupancy, OCCUPANCY_COLOR_THRESHOLDS, right=True).astype(np.int8) + 1
+
+
+class EdgeColorIndex:
+    """Índice precalculado de los edges de la ruta hacia su sección.
+
+    Permite colorear todos los edges de la ruta con una sola indexación de
+    arrays a partir de los códigos de color por sección, sin recorrer los
+    segmentos del polígono OSM que no pertenecen a ninguna sección.
+    """
+
+    def __init__(self, sections, road_segments_data):
+        edge_section = {}
+        for i, section in enumerate(sections):
+            for road_id in sorted(section['edges']):
+                if road_id in road_segments_data:
+                    # Igual que antes: si un edge está en varias secciones, gana la última
+                    edge_section[road_id] = i
+        self.route_edges = tuple(edge_section)
+        self.edge_section = np.fromiter(edge_section.values(), dtype=np.intp, count=len(edge_section))
+
+    def __len__(self):
+        return len(self.route_edges)
+
+    def edge_color_codes(self, section_color_codes):
+        """Códigos de color de cada edge de la ruta, en el orden de ``route_edges``."""
+        return np.asarray(section_color_codes)[self.edge_section]
+
+
+class IntervalReplay:
+    """Tabla por intervalo con el estado de toda la jornada reproducida.
+
+    Se calcula una vez al inicio (inventario inicial, deltas y regla de
+    evacuación), así cualquier intervalo histórico es una búsqueda O(1).
+    """
+
+    def __init__(self, template, time_intervals, counts_table):
+        self.time_intervals = list(time_intervals)
+        self._index = {interval: i for i, interval in enumerate(self.time_intervals)}
+        self._template = template.frozen_copy()
+        self.counts = counts_table
+        self.counts.flags.writeable = False
+        self.ucp_density, self.occupancy = self._template.density_and_occupancy(counts_table)
+        self.speed, self.travel_time = self._template.speed_and_travel_time(self.ucp_density)
+        self.total_ucp = np.round(self.ucp_density.sum(axis=1), 2)
+
+    @classmethod
+    def build(cls, template, initial_inventory, deltas, time_intervals,
+              threshold=100.0, keep_ratio=0.45):
+        initial = initial_counts_matrix(template.section_names, template.vehicle_types, initial_inventory)
+        table = replay_intervals(initial.astype(template.counts.dtype), deltas,
+                                 template.weights, template.capacity, threshold, keep_ratio)
+        return cls(template, time_intervals, table)
+
+    def __len__(self):
+        return len(self.time_intervals)
+
+    def index_of(self, interval):
+        return self._index.get(interval)
+
+    def state_at(self, interval):
+        """Estado de las secciones al final de ``interval`` (o ``None`` si no existe)."""
+        i = self._index.get(interval)
+        if i is None:
+            return None
+        return self._template.with_state(self.counts[i], self.ucp_density[i], self.occupancy[i],
+                                         self.speed[i], self.travel_time[i])
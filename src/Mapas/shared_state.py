@@ -0,0 +1,157 @@
+"""Estado compartido entre workers de gunicorn (un escritor, muchos lectores).
+
+Solo un proceso simula: el que obtiene el candado ``cache/simulation.lock``
+(``flock``). Después de cada tick escribe el estado mínimo de cada corredor
+(versión, marca de tiempo, paso, intervalo y matriz de conteos) en un
+archivo mapeado en memoria por corredor. Los demás workers no simulan:
+leen ese archivo y reconstruyen la misma instantánea con los mismos datos,
+así todos sirven el mismo intervalo, los mismos conteos y los mismos ETags.
+
+Cada archivo usa un seqlock: el escritor deja el contador impar mientras
+escribe y par al terminar; el lector reintenta si lo encuentra impar o si
+cambió durante la copia. Si el escritor muere, el sistema operativo libera
+el candado y otro worker toma el relevo desde el último estado publicado.
+"""
+import logging
+import mmap
+import os
+import struct
+
+import numpy as np
+
+SHARED_STATE_DIR = os.path.join('cache', 'shared_state')
+LOCK_FILE = os.path.join('cache', 'simulation.lock')
+
+_MAGIC = b'ATUSTAT1'
+# magic, seq, version, timestamp, simulation_step, interval_index, secciones, tipos
+_HEADER = struct.Struct('<8sQqdiiII')
+_SEQ_OFFSET = 8
+_SEQ = struct.Struct('<Q')
+
+
+class SharedStateRecord:
+    """Estado publicado de un corredor."""
+    __slots__ = ('version', 'timestamp', 'simulation_step', 'interval_index', 'counts')
+
+    def __init__(self, version, timestamp, simulation_step, interval_index, counts):
+        self.version = version
+        self.timestamp = timestamp
+        self.simulation_step = simulation_step
+        self.interval_index = interval_index  # -1 antes del primer intervalo ("N/A")
+        self.counts = counts
+
+
+class SharedStateFile:
+    """Archivo mapeado en memoria con el último estado de un corredor."""
+
+    def __init__(self, path, shape):
+        self.path = path
+        self.shape = tuple(shape)
+        self._size = _HEADER.size + int(np.prod(self.shape)) * np.dtype(np.int32).itemsize
+        self._mmap = None
+        self._inode = None
+
+    @classmethod
+    def for_corridor(cls, corridor_id, shape, directory=SHARED_STATE_DIR):
+        return cls(os.path.join(directory, f'{corridor_id}.state'), shape)
+
+    def _counts_view(self):
+        return np.ndarray(self.shape, dtype=np.int32, buffer=self._mmap, offset=_HEADER.size)
+
+    def _read_seq(self):
+        return _SEQ.unpack_from(self._mmap, _SEQ_OFFSET)[0]
+
+    def create(self):
+        """Crea (o recrea) el archivo para escribir; lo reemplaza de forma atómica."""
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(_HEADER.pack(_MAGIC, 0, 0, 0.0, 0, -1, *self.shape))
+            f.truncate(self._size)
+        os.replace(tmp_path, self.path)
+        self._open()
+
+    def _open(self):
+        self.close()
+        with open(self.path, 'r+b') as f:
+            self._mmap = mmap.mmap(f.fileno(), self._size)
+            self._inode = os.fstat(f.fileno()).st_ino
+
+    def close(self):
+        if self._mmap is not None:
+            self._mmap.close()
+            self._mmap = None
+
+    def write(self, version, timestamp, simulation_step, interval_index, counts):
+        seq = self._read_seq() + 1
+        _SEQ.pack_into(self._mmap, _SEQ_OFFSET, seq)  # impar: escritura en curso
+        self._counts_view()[:] = counts
+        _HEADER.pack_into(self._mmap, 0, _MAGIC, seq, version, timestamp,
+                          simulation_step, interval_index, *self.shape)
+        _SEQ.pack_into(self._mmap, _SEQ_OFFSET, seq + 1)
+
+    def _ensure_open(self):
+        """Abre el archivo (o lo reabre si el escritor lo recreó). ``False`` si no existe."""
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return False
+        if stat.st_size != self._size:
+            return False
+        if self._mmap is None or stat.st_ino != self._inode:
+            self._open()
+        return True
+
+    def read(self, retries=100):
+        """Copia consistente del último estado publicado, o ``None`` si aún no hay."""
+        if not self._ensure_open():
+            return None
+        for _ in range(retries):
+            seq = self._read_seq()
+            if seq % 2:
+                continue
+            magic, _, version, timestamp, step, interval_index, sections, types = _HEADER.unpack_from(self._mmap, 0)
+            counts = self._counts_view().copy()
+            if self._read_seq() != seq:
+                continue
+            if magic != _MAGIC or (sections, types) != self.shape or seq == 0:
+                return None
+            return SharedStateRecord(version, timestamp, step, interval_index, counts)
+        return None
+
+
+class SimulationLock:
+    """Candado exclusivo entre procesos que decide qué worker simula."""
+
+    def __init__(self, path=LOCK_FILE):
+        self.path = path
+        self._file = None
+
+    @property
+    def held(self):
+        return self._file is not None
+
+    def try_acquire(self):
+        """Intenta tomar el candado sin bloquear. Devuelve ``True`` si este proceso es el escritor."""
+        if self._file is not None:
+            return True
+        try:
+            import fcntl
+        except ImportError:
+            # Sin flock (p. ej. Windows en desarrollo) solo hay un proceso
+            self._file = True
+            return True
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        lock_file = open(self.path, 'a+')
+        try:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            return False
+        lock_file.seek(0)
+        lock_file.truncate()
+        lock_file.write(str(os.getpid()))
+        lock_file.flush()
+        self._file = lock_file
+        logging.info(f"🔒 Worker {os.getpid()} es el escritor de la simulación")
+        return True
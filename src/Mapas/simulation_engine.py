@@ -0,0 +1,178 @@
+"""Motor vectorizado de la simulación de tráfico.
+
+Los conteos del Excel se agrupan una sola vez en un tensor denso de
+deltas con forma (intervalos × secciones × tipos de vehículo), de modo que
+aplicar un intervalo es una suma de arrays más un recorte a cero.
+"""
+import numpy as np
+
+
+def build_delta_tensor(traffic, time_intervals, section_names, vehicle_types, segment_mapping):
+    """Construye el tensor de deltas firmados a partir de la tabla de tráfico.
+
+    ``traffic`` es una ``TrafficTable`` (ver ``traffic_table.py``): sus
+    categorías enteras se traducen con tablas de búsqueda a los índices del
+    tensor. Cada par (NroPunto, Sentido) se traduce con ``segment_mapping`` a
+    una sección y a una operación (+1 entra, -1 sale). Los registros cuyo
+    punto, sección, intervalo o tipo de vehículo no se conocen se descartan.
+    """
+    deltas = np.zeros((len(time_intervals), len(section_names), len(vehicle_types)), dtype=np.int64)
+    if traffic is None or traffic.empty or deltas.size == 0:
+        return deltas
+
+    interval_index = {interval: i for i, interval in enumerate(time_intervals)}
+    section_index = {name: i for i, name in enumerate(section_names)}
+    vehicle_index = {vtype: i for i, vtype in enumerate(vehicle_types)}
+
+    interval_lookup = np.array([interval_index.get(t, -1) for t in traffic.time_intervals], dtype=np.intp)
+    vehicle_lookup = np.array([vehicle_index.get(v, -1) for v in traffic.vehicle_types], dtype=np.intp)
+    i_idx = interval_lookup[traffic.interval_id] if len(interval_lookup) else np.full(len(traffic), -1)
+    v_idx = vehicle_lookup[traffic.vehicle_type_id] if len(vehicle_lookup) else np.full(len(traffic), -1)
+
+    # Pocos pares (punto, sentido) distintos: se resuelven una vez y se expanden
+    pairs, pair_of_row = np.unique(np.stack([traffic.point, traffic.direction], axis=1),
+                                   axis=0, return_inverse=True)
+    pair_section = np.full(len(pairs), -1, dtype=np.intp)
+    pair_sign = np.zeros(len(pairs), dtype=np.int64)
+    for p, (point, direction) in enumerate(pairs.tolist()):
+        segment_name, operation = segment_mapping.get((point, direction), (None, 0))
+        if segment_name in section_index:
+            pair_section[p] = section_index[segment_name]
+            pair_sign[p] = operation
+    pair_of_row = pair_of_row.reshape(-1)
+    s_idx = pair_section[pair_of_row]
+
+    valid = (s_idx >= 0) & (i_idx >= 0) & (v_idx >= 0)
+    if not valid.any():
+        return deltas
+
+    quantities = traffic.quantity[valid].astype(np.int64) * pair_sign[pair_of_row[valid]]
+    np.add.at(deltas, (i_idx[valid], s_idx[valid], v_idx[valid]), quantities)
+    return deltas
+
+
+def initial_counts_matrix(section_names, vehicle_types, initial_inventory):
+    """Matriz (secciones × tipos) con el inventario inicial de cada sección."""
+    counts = np.zeros((len(section_names), len(vehicle_types)), dtype=np.int64)
+    for s, name in enumerate(section_names):
+        inventory = initial_inventory.get(name, {})
+        for v, vtype in enumerate(vehicle_types):
+            counts[s, v] = inventory.get(vtype, 0)
+    return counts
+
+
+def apply_deltas(counts, step_deltas):
+    """Suma en sitio una matriz de deltas (secciones × tipos) y recorta negativos a cero.
+
+    La suma se hace en int64 y se satura al máximo del tipo de ``counts``
+    (int32 en el almacén), así un micro-lote enorme no da la vuelta a negativo.
+    """
+    total = np.add(counts, step_deltas, dtype=np.int64)
+    high = np.iinfo(counts.dtype).max if counts.dtype.kind in 'iu' else None
+    np.clip(total, 0, high, out=total)
+    counts[...] = total
+    return counts
+
+
+def apply_interval(counts, deltas, step):
+    """Aplica en sitio los deltas del intervalo ``step`` y recorta negativos a cero."""
+    return apply_deltas(counts, deltas[step])
+
+
+def evacuate_overflow(counts, weights, capacities, threshold=100.0, keep_ratio=0.45):
+    """Regla de evacuación: las secciones por encima de ``threshold`` % de
+    ocupación conservan solo ``keep_ratio`` de sus vehículos (truncado).
+
+    Devuelve la máscara booleana de secciones evacuadas.
+    """
+    ucp = counts @ weights
+    occupancy = np.divide(ucp * 100.0, capacities, out=np.zeros_like(ucp, dtype=float), where=capacities > 0)
+    overflow = occupancy > threshold
+    if overflow.any():
+        counts[overflow] = (counts[overflow] * keep_ratio).astype(counts.dtype)
+    return overflow
+
+
+def replay_intervals(initial_counts, deltas, weights, capacities, threshold=100.0, keep_ratio=0.45):
+    """Reproduce toda la secuencia de intervalos desde el inventario inicial.
+
+    Devuelve la tabla (intervalos × secciones × tipos) con el estado de las
+    secciones al final de cada intervalo, con la regla de evacuación aplicada
+    igual que en el tick en vivo.
+    """
+    counts = np.array(initial_counts, copy=True)
+    table = np.empty((deltas.shape[0],) + counts.shape, dtype=counts.dtype)
+    for step in range(deltas.shape[0]):
+        apply_interval(counts, deltas, step)
+        evacuate_overflow(counts, weights, capacities, threshold, keep_ratio)
+        table[step] = counts
+    return table
+
+
+def replay_batch(initial_counts, deltas, weights, capacities, thresholds, keep_ratios, steps=None):
+    """Reproduce ``steps`` intervalos para un lote de escenarios a la vez, sin esperas.
+
+    ``initial_counts`` es (escenarios × secciones × tipos), ``capacities``
+    (escenarios × secciones) y ``thresholds`` / ``keep_ratios`` un valor por
+    escenario; los deltas del intervalo se suman a todo el lote con
+    broadcasting. Igual que el tick en vivo, al volver al intervalo 0 se
+    restablece el inventario inicial, así ``steps`` puede abarcar varias
+    jornadas.
+
+    Devuelve ``(ucp_density, occupancy, evacuated)``, cada uno con forma
+    (escenarios × pasos × secciones): la densidad UCP redondeada y la
+    ocupación en % al final de cada intervalo, y la máscara de secciones
+    evacuadas en ese intervalo.
+    """
+    n_intervals = deltas.shape[0]
+    steps = n_intervals if steps is None else int(steps)
+    initial = np.asarray(initial_counts, dtype=np.int64)
+    capacities = np.asarray(capacities, dtype=np.float64)
+    counts = initial.copy()
+    batch, sections = capacities.shape
+    ucp_density = np.zeros((batch, steps, sections), dtype=np.float64)
+    occupancy = np.zeros((batch, steps, sections), dtype=np.float64)
+    evacuated = np.zeros((batch, steps, sections), dtype=bool)
+    if n_intervals == 0:
+        return ucp_density, occupancy, evacuated
+
+    thresholds = np.asarray(thresholds, dtype=np.float64)[:, None]
+    keep_ratios = np.asarray(keep_ratios, dtype=np.float64)[:, None, None]
+    has_capacity = capacities > 0
+    for k in range(steps):
+        step = k % n_intervals
+        if step == 0 and k > 0:
+            counts[:] = initial
+        apply_deltas(counts, deltas[step])
+        ucp = counts @ weights
+        step_occupancy = np.divide(ucp * 100.0, capacities, out=np.zeros_like(ucp), where=has_capacity)
+        overflow = step_occupancy > thresholds
+        if overflow.any():
+            reduced = (counts * keep_ratios).astype(counts.dtype)
+            np.copyto(counts, reduced, where=overflow[..., None])
+        ucp_density[:, k] = np.round(counts @ weights, 2)
+        np.divide(ucp_density[:, k] * 100.0, capacities, out=occupancy[:, k], where=has_capacity)
+        evacuated[:, k] = overflow
+    return ucp_density, occupancy, evacuated
+
+
+def speed_and_travel_time(ucp_density, lengths, lanes, free_flow_speed, jam_density, min_speed):
+    """Diagrama fundamental (Greenshields): densidad → velocidad → tiempo de viaje.
+
+    La densidad por carril es ``ucp_density / (km de la sección × carriles)``
+    y la velocidad cae linealmente desde ``free_flow_speed`` (km/h) hasta
+    ``min_speed`` al llegar a ``jam_density`` (UCP por km y carril). Todos los
+    argumentos se combinan con broadcasting, así sirve para un tick
+    (secciones) o para toda la jornada (intervalos × secciones).
+
+    Devuelve ``(velocidad en km/h, tiempo de viaje en segundos)``; las
+    secciones sin longitud o sin carriles quedan a velocidad libre y 0 s.
+    """
+    lane_km = np.asarray(lengths, dtype=np.float64) / 1000.0 * np.asarray(lanes, dtype=np.float64)
+    lane_density = np.divide(ucp_density, lane_km, out=np.zeros(np.broadcast(ucp_density, lane_km).shape),
+                             where=lane_km > 0)
+    ratio = np.divide(lane_density, jam_density, out=np.zeros_like(lane_density),
+                      where=np.asarray(jam_density) > 0)
+    speed = np.maximum(free_flow_speed * (1.0 - ratio), min_speed)
+    travel_time = np.asarray(lengths, dtype=np.float64) * 3.6 / speed
+    return speed, travel_time
@@ -0,0 +1,217 @@
+"""Instantáneas inmutables y versionadas del estado de la simulación.
+
+El hilo de simulación construye una instantánea al final de cada tick y la
+publica con un simple cambio de referencia. Los endpoints solo leen la
+última instantánea publicada: no recalculan estado ni tocan los
+diccionarios compartidos que el hilo de simulación modifica.
+
+Los cuerpos JSON de los endpoints de sondeo se serializan una sola vez por
+tick y se guardan como bytes junto a un ETag fuerte derivado de la versión
+(``update_counter``), para responder 304 a los sondeos sin cambios, y junto
+a sus variantes gzip/brotli (ver compression.py).
+"""
+import json
+import threading
+from dataclasses import dataclass
+from datetime import datetime
+
+import numpy as np
+
+from compression import compress_variants
+from section_state import COLOR_NAMES, SectionStateStore, EdgeColorIndex
+
+try:
+    import orjson
+except ImportError:  # orjson es opcional: sin él se usa el módulo json estándar
+    orjson = None
+
+
+@dataclass(frozen=True)
+class SimulationSnapshot:
+    """Estado de un tick de simulación, con los payloads JSON ya armados."""
+    version: int
+    timestamp: float
+    simulation_step: int
+    current_interval: str
+    state: object  # SectionStateStore congelado (arrays de solo lectura)
+    route_edges: tuple  # ids de los edges de la ruta, en el orden de edge_color_codes
+    edge_color_codes: np.ndarray
+    color_counts: dict
+    road_data: dict
+    traffic_data: dict
+    kpis: dict
+    debug: dict
+    current_interval_data: dict
+    road_state: dict
+    bodies: dict  # nombre de payload -> JSON serializado (bytes)
+    etags: dict  # nombre de payload -> ETag fuerte (sin comillas)
+    encoded: dict  # nombre de payload -> {codificación: cuerpo comprimido}
+
+
+CACHED_PAYLOADS = ('road_data', 'traffic_data', 'kpis', 'debug', 'current_interval_data', 'road_state')
+
+
+def serialize_payload(payload):
+    """Serializa un payload a JSON compacto en UTF-8 (con orjson si está instalado)."""
+    if orjson is not None:
+        return orjson.dumps(payload, option=orjson.OPT_SORT_KEYS | orjson.OPT_SERIALIZE_NUMPY)
+    return json.dumps(payload, ensure_ascii=False, sort_keys=True, separators=(',', ':')).encode('utf-8')
+
+
+def build_snapshot(version, timestamp, simulation_step, current_interval, total_intervals,
+                   sections, road_segments_data, section_state, edge_index, edge_color_codes,
+                   geometry_version=None):
+    """Congela el estado actual, arma los payloads de los endpoints de lectura
+    y los serializa una sola vez.
+
+    ``geometry_version`` es el hash de la geometría compacta de la ruta
+    (ver geometry.py) a la que corresponden los colores de ``road_state``.
+    """
+    state = section_state.frozen_copy()
+    edge_color_codes = np.array(edge_color_codes, copy=True)
+    edge_color_codes.flags.writeable = False
+    total_vehicles = state.total_vehicles()
+
+    route_segments = [dict(road_segments_data[road_id], color=COLOR_NAMES[code])
+                      for road_id, code in zip(edge_index.route_edges, edge_color_codes.tolist())]
+    color_counts = dict(zip(COLOR_NAMES, np.bincount(edge_color_codes, minlength=len(COLOR_NAMES)).tolist()))
+
+    clean_sections = []
+    for i, s in enumerate(sections):
+        clean_sections.append({
+            "segment_name": s["segment_name"],
+            "direction": s["direction"],
+            "vehicle_counts": state.vehicle_counts(i),
+            "ucp_density": float(state.ucp_density[i]),
+            "edges": sorted(s["edges"]),
+            "occupancy_percentage": round(float(state.occupancy[i]), 2),
+            "average_speed_kmh": round(float(state.speed[i]), 1),
+            "travel_time_seconds": round(float(state.travel_time[i]), 1),
+            "total_vehicles": int(total_vehicles[i])
+        })
+
+    total_segments_count = len(state)
+    total_current_ucp = float(state.ucp_density.sum())
+    total_ucp_capacity = float(state.capacity.sum())
+    red_segments_count = int((np.round(state.occupancy, 2) > 80).sum())
+
+    overall_occupancy_percentage = 0
+    if total_ucp_capacity > 0:
+        overall_occupancy_percentage = (total_current_ucp / total_ucp_capacity) * 100
+
+    congestion_percentage = 0
+    if total_segments_count > 0:
+        congestion_percentage = (red_segments_count / total_segments_count) * 100
+
+    # Tiempo de viaje de punta a punta de cada sentido (suma de sus secciones),
+    # promediado entre sentidos; la velocidad media es la de toda la ruta
+    direction_codes = {}
+    codes = [direction_codes.setdefault(s["direction"], len(direction_codes)) for s in sections]
+    average_travel_time = 0
+    if direction_codes:
+        average_travel_time = float(np.bincount(codes, weights=state.travel_time).mean())
+    total_travel_time = float(state.travel_time.sum())
+    average_speed = 0
+    if total_travel_time > 0:
+        average_speed = float(state.length.sum()) * 3.6 / total_travel_time
+
+    payloads = dict(
+        road_data={
+            'segments': route_segments,
+            'timestamp': timestamp,
+            'update_counter': version,
+            # Derivado de la marca de tiempo del tick: idéntico en todos los workers
+            'server_time': datetime.fromtimestamp(timestamp).isoformat()
+        },
+        traffic_data={
+            'sections': clean_sections,
+            'timestamp': timestamp,
+            'update_counter': version
+        },
+        kpis={
+            "overall_occupancy_percentage": round(overall_occupancy_percentage, 2),
+            "congestion_percentage": round(congestion_percentage, 2),
+            "red_segments_count": red_segments_count,
+            "total_segments_count": total_segments_count,
+            "average_travel_time_minutes": round(average_travel_time / 60, 1),
+            "average_speed_kmh": round(average_speed, 1),
+            "timestamp": timestamp,
+            "update_counter": version
+        },
+        debug={
+            'total_segments_in_polygon': len(road_segments_data),
+            'total_route_sections': len(sections),
+            'current_simulation_step': simulation_step,
+            'current_interval': current_interval,
+            'sections_info': [{
+                'name': name,
+                'ucp': float(state.ucp_density[i]),
+                'vehicles': int(total_vehicles[i])
+            } for i, name in enumerate(state.section_names)]
+        },
+        current_interval_data={
+            'current_interval': current_interval,
+            'simulation_step': simulation_step,
+            'total_intervals': total_intervals,
+            'timestamp': timestamp
+        },
+        road_state={
+            'geometry_version': geometry_version,
+            'update_counter': version,
+            'timestamp': timestamp,
+            'palette': list(COLOR_NAMES),
+            # Un dígito (índice en 'palette') por edge, en el orden de /api/road_geometry
+            'colors': ''.join(map(str, edge_color_codes.tolist())),
+        },
+    )
+
+    bodies = {name: serialize_payload(payloads[name]) for name in CACHED_PAYLOADS}
+    return SimulationSnapshot(
+        version=version,
+        timestamp=timestamp,
+        simulation_step=simulation_step,
+        current_interval=current_interval,
+        state=state,
+        route_edges=edge_index.route_edges,
+        edge_color_codes=edge_color_codes,
+        color_counts=color_counts,
+        bodies=bodies,
+        # La marca de tiempo distingue contadores repetidos tras un reinicio del proceso
+        etags={name: f"{version}-{int(timestamp * 1000):x}-{name}" for name in CACHED_PAYLOADS},
+        encoded={name: compress_variants(body) for name, body in bodies.items()},
+        **payloads,
+    )
+
+
+def empty_snapshot():
+    """Instantánea vacía (versión 0) que se sirve mientras no hay datos cargados."""
+    return build_snapshot(0, 0, 0, "N/A", 0, [], {}, SectionStateStore([], [], {}, [], []),
+                          EdgeColorIndex([], {}), np.zeros(0, dtype=np.int8))
+
+
+class SnapshotPublisher:
+    """Punto único de publicación de instantáneas (un escritor, muchos lectores).
+
+    ``latest`` es una lectura de referencia sin bloqueo; ``wait_for_newer``
+    permite a los consumidores bloquearse hasta que se publique una versión
+    posterior a la que ya tienen.
+    """
+
+    def __init__(self):
+        self._snapshot = empty_snapshot()
+        self._condition = threading.Condition()
+
+    def latest(self):
+        return self._snapshot
+
+    def publish(self, snapshot):
+        with self._condition:
+            self._snapshot = snapshot
+            self._condition.notify_all()
+
+    def wait_for_newer(self, version, timeout=None):
+        """Espera una instantánea con versión mayor a ``version`` (o hasta ``timeout``)."""
+        with self._condition:
+            self._condition.wait_for(
+                lambda: self._snapshot.version > version, timeout)
+            return self._snapshot
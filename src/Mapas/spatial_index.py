@@ -0,0 +1,134 @@
+"""Índice espacial de los edges cacheados de un corredor (map-matching en línea).
+
+Asocia coordenadas arbitrarias (GPS de buses, contadores) al edge más
+cercano de ``road_segments_data`` y a su sección, sin osmnx: las geometrías
+salen del caché de la ruta y se indexan en un ``STRtree`` de shapely. Las
+consultas son por lotes (arrays de latitudes y longitudes) y devuelven
+arrays, así miles de puntos se resuelven en una sola llamada.
+
+Las coordenadas se proyectan a metros con una proyección equirectangular
+centrada en el corredor (error despreciable a la escala de una ruta), así
+las distancias y las tolerancias están en metros.
+"""
+import math
+
+import numpy as np
+import shapely
+from shapely import STRtree
+
+EARTH_RADIUS_M = 6371008.8
+DEFAULT_MAX_DISTANCE_M = 30.0
+MAX_MATCH_POINTS = 50000
+
+
+class EdgeSpatialIndex:
+    """``STRtree`` sobre todos los edges del corredor y otro solo con los de la ruta."""
+
+    def __init__(self, road_ids, coords, edge_section):
+        self.road_ids = list(road_ids)
+        self.edge_section = np.asarray(edge_section, dtype=np.intp)
+        # Un edge con un solo punto se duplica para que sea una línea válida
+        parts = [np.asarray(c, dtype=np.float64).reshape(-1, 2) for c in coords]
+        parts = [np.repeat(p, 2, axis=0) if len(p) == 1 else p for p in parts]
+        all_coords = np.concatenate(parts) if parts else np.zeros((0, 2))
+        self.origin = all_coords.mean(axis=0) if len(all_coords) else np.zeros(2)
+        self._cos_lat = math.cos(math.radians(self.origin[0]))
+
+        # Una linestring por edge, creadas todas juntas a partir de las coordenadas concatenadas
+        x, y = self.project(all_coords[:, 0], all_coords[:, 1])
+        if parts:
+            self.lines = shapely.linestrings(np.column_stack([x, y]),
+                                             indices=np.repeat(np.arange(len(parts)), [len(p) for p in parts]))
+        else:
+            self.lines = np.empty(0, dtype=object)
+        self.tree = STRtree(self.lines)
+        self.route_positions = np.flatnonzero(self.edge_section >= 0)
+        self.route_tree = STRtree(self.lines[self.route_positions])
+
+    @classmethod
+    def build(cls, road_segments_data, edge_index):
+        """Índice de ``road_segments_data``; la sección de cada edge sale de ``EdgeColorIndex``."""
+        section_of = dict(zip(edge_index.route_edges, edge_index.edge_section.tolist()))
+        road_ids = [road_id for road_id, segment in road_segments_data.items() if segment.get('coords')]
+        return cls(road_ids, [road_segments_data[road_id]['coords'] for road_id in road_ids],
+                   [section_of.get(road_id, -1) for road_id in road_ids])
+
+    def __len__(self):
+        return len(self.road_ids)
+
+    def project(self, lats, lons):
+        """Latitudes y longitudes a metros (x hacia el este, y hacia el norte) desde el origen."""
+        lats = np.asarray(lats, dtype=np.float64)
+        lons = np.asarray(lons, dtype=np.float64)
+        x = np.radians(lons - self.origin[1]) * EARTH_RADIUS_M * self._cos_lat
+        y = np.radians(lats - self.origin[0]) * EARTH_RADIUS_M
+        return x, y
+
+    def nearest_edges(self, lats, lons, max_distance=DEFAULT_MAX_DISTANCE_M, route_only=False):
+        """Edge más cercano a cada punto: ``(posiciones, distancias en m)``.
+
+        La posición es el índice en ``road_ids`` (-1 y distancia infinita si no
+        hay ningún edge a menos de ``max_distance``). Con ``route_only`` solo se
+        consideran los edges que pertenecen a una sección.
+        """
+        points = shapely.points(*self.project(lats, lons))
+        positions = np.full(len(points), -1, dtype=np.intp)
+        distances = np.full(len(points), np.inf)
+        tree = self.route_tree if route_only else self.tree
+        if len(points) == 0 or len(tree) == 0:
+            return positions, distances
+        (point_idx, tree_idx), found = tree.query_nearest(points, max_distance=max_distance,
+                                                          return_distance=True, all_matches=False)
+        if route_only:
+            tree_idx = self.route_positions[tree_idx]
+        positions[point_idx] = tree_idx
+        distances[point_idx] = found
+        return positions, distances
+
+    def sections_for(self, lats, lons, max_distance=DEFAULT_MAX_DISTANCE_M):
+        """Sección de cada punto (la de su edge de ruta más cercano; -1 si queda lejos de la ruta)."""
+        positions, distances = self.nearest_edges(lats, lons, max_distance, route_only=True)
+        sections = np.where(positions >= 0, self.edge_section[positions], -1)
+        return sections, distances
+
+    def match(self, lats, lons, max_distance=DEFAULT_MAX_DISTANCE_M, route_only=False):
+        """Edge, sección, distancia y avance a lo largo del edge (0 a 1) de cada punto."""
+        positions, distances = self.nearest_edges(lats, lons, max_distance, route_only)
+        matched = positions >= 0
+        fractions = np.full(len(positions), np.nan)
+        if matched.any():
+            x, y = self.project(np.asarray(lats, dtype=np.float64)[matched], np.asarray(lons, dtype=np.float64)[matched])
+            fractions[matched] = shapely.line_locate_point(self.lines[positions[matched]],
+                                                           shapely.points(x, y), normalized=True)
+        sections = np.where(matched, self.edge_section[positions], -1)
+        return positions, sections, distances, fractions
+
+
+def parse_points(value):
+    """``"lat,lon;lat,lon"`` o ``[[lat, lon], ...]`` como arrays de latitudes y longitudes."""
+    if isinstance(value, str):
+        value = [item.split(',') for item in value.split(';') if item.strip()]
+    try:
+        points = np.asarray(value, dtype=np.float64).reshape(-1, 2)
+    except (TypeError, ValueError):
+        raise ValueError("Los puntos deben ser pares [lat, lon]")
+    if not np.isfinite(points).all():
+        raise ValueError("Los puntos deben ser números finitos")
+    return points[:, 0], points[:, 1]
+
+
+def match_payload(index, section_names, lats, lons, max_distance=DEFAULT_MAX_DISTANCE_M, route_only=False):
+    """Resultado de ``EdgeSpatialIndex.match`` en columnas para JSON (``None`` = sin edge cercano)."""
+    positions, sections, distances, fractions = index.match(lats, lons, max_distance, route_only)
+    matched = positions >= 0
+    return {
+        'count': int(len(positions)),
+        'matched': int(matched.sum()),
+        'max_distance': max_distance,
+        'route_only': route_only,
+        'edges': [index.road_ids[p] if p >= 0 else None for p in positions.tolist()],
+        'sections': [int(s) if s >= 0 else None for s in sections.tolist()],
+        'segment_names': [section_names[s] if s >= 0 else None for s in sections.tolist()],
+        'distances': [round(d, 2) if ok else None for d, ok in zip(distances.tolist(), matched.tolist())],
+        'fractions': [round(f, 4) if ok else None for f, ok in zip(fractions.tolist(), matched.tolist())],
+    }
@@ -0,0 +1,137 @@
+"""Cambios del estado desde una versión dada (``/api/changes?since=<update_counter>``).
+
+Cada corredor guarda en un buffer circular acotado sus últimas instantáneas
+publicadas (son inmutables, así que guardarlas no copia nada). Un cliente
+que ya tiene la versión ``since`` recibe solo las secciones cuyo color,
+ocupación, densidad o conteos cambiaron y los edges cuyo color cambió
+entre esa versión y la última. Si ``since`` ya salió del buffer (o es
+desconocida) la respuesta es el estado completo con ``full: true``.
+
+El cuerpo de cada par (``since``, última versión) se arma y se comprime una
+sola vez: en régimen estable todos los clientes piden el mismo delta.
+"""
+import threading
+from collections import OrderedDict, deque
+
+import numpy as np
+
+from compression import compress_variants
+from section_state import COLOR_NAMES, occupancy_color_codes
+from snapshot import serialize_payload
+
+SNAPSHOT_HISTORY_SIZE = 64
+DELTA_CACHE_SIZE = 8
+
+
+def snapshot_diff(previous, snapshot):
+    """Secciones y edges que cambiaron de ``previous`` a ``snapshot`` (todos con
+    ``previous=None`` o si cambió la ruta). Lo comparten ``/api/changes`` y
+    los eventos de ``/api/stream``.
+
+    Devuelve ``full``, ``sections`` (estado completo de cada sección cambiada)
+    y ``edges``: la posición de cada edge cambiado en ``/api/road_geometry``
+    (el mismo orden que ``/api/road_state``) con un dígito de color por edge.
+    """
+    state = snapshot.state
+    section_codes = occupancy_color_codes(state.occupancy)
+    occupancy = np.round(state.occupancy, 2)
+
+    full = (previous is None
+            or previous.state.section_names != state.section_names
+            or previous.route_edges != snapshot.route_edges)
+    if full:
+        changed_sections = np.arange(len(state))
+        changed_edges = np.arange(len(snapshot.route_edges))
+    else:
+        previous_state = previous.state
+        changed_sections = np.flatnonzero(
+            (section_codes != occupancy_color_codes(previous_state.occupancy))
+            | (occupancy != np.round(previous_state.occupancy, 2))
+            | (state.ucp_density != previous_state.ucp_density)
+            | (state.counts != previous_state.counts).any(axis=1))
+        changed_edges = np.flatnonzero(snapshot.edge_color_codes != previous.edge_color_codes)
+
+    total_vehicles = state.total_vehicles()
+    return {
+        'full': full,
+        'sections': [{
+            'index': int(i),
+            'segment_name': state.section_names[i],
+            'color': COLOR_NAMES[section_codes[i]],
+            'occupancy_percentage': float(occupancy[i]),
+            'ucp_density': float(state.ucp_density[i]),
+            'average_speed_kmh': round(float(state.speed[i]), 1),
+            'travel_time_seconds': round(float(state.travel_time[i]), 1),
+            'total_vehicles': int(total_vehicles[i]),
+            'vehicle_counts': state.vehicle_counts(i)
+        } for i in changed_sections],
+        'edges': {
+            'palette': list(COLOR_NAMES),
+            'indexes': changed_edges.tolist(),
+            'colors': ''.join(map(str, snapshot.edge_color_codes[changed_edges].tolist())),
+        },
+    }
+
+
+def build_state_delta(previous, snapshot, since=None):
+    """Delta de ``previous`` a ``snapshot``; con ``previous=None`` el estado completo."""
+    return {
+        'since': since,
+        'update_counter': snapshot.version,
+        'timestamp': snapshot.timestamp,
+        'current_interval': snapshot.current_interval,
+        'simulation_step': snapshot.simulation_step,
+        'geometry_version': snapshot.road_state['geometry_version'],
+        **snapshot_diff(previous, snapshot),
+        'kpis': snapshot.kpis,
+    }
+
+
+class EncodedDelta:
+    """Cuerpo serializado de un delta con sus variantes comprimidas y su ETag."""
+    __slots__ = ('body', 'encoded', 'etag')
+
+    def __init__(self, payload, etag):
+        self.body = serialize_payload(payload)
+        self.encoded = compress_variants(self.body)
+        self.etag = etag
+
+
+class SnapshotHistory:
+    """Últimas instantáneas publicadas de un corredor, por versión."""
+
+    def __init__(self, maxlen=SNAPSHOT_HISTORY_SIZE):
+        self._snapshots = deque(maxlen=maxlen)
+        self._deltas = OrderedDict()  # (since, versión, marca de tiempo) -> EncodedDelta
+        self._lock = threading.Lock()
+
+    def append(self, snapshot):
+        with self._lock:
+            if self._snapshots and snapshot.version <= self._snapshots[-1].version:
+                # Reinicio de la numeración (p. ej. otro escritor): las anteriores ya no sirven de base
+                self._snapshots.clear()
+            self._snapshots.append(snapshot)
+
+    def find(self, version):
+        with self._lock:
+            for snapshot in reversed(self._snapshots):
+                if snapshot.version == version:
+                    return snapshot
+        return None
+
+    def changes_since(self, since, latest):
+        """``EncodedDelta`` de ``since`` a ``latest`` (completo si ``since`` no está en el buffer)."""
+        key = (since, latest.version, latest.timestamp)
+        with self._lock:
+            cached = self._deltas.get(key)
+        if cached is not None:
+            return cached
+
+        previous = self.find(since) if since is not None else None
+        etag = f"{latest.version}-{int(latest.timestamp * 1000):x}-changes-{since}"
+        delta = EncodedDelta(build_state_delta(previous, latest, since), etag)
+        with self._lock:
+            self._deltas[key] = delta
+            while len(self._deltas) > DELTA_CACHE_SIZE:
+                self._deltas.popitem(last=False)
+        return delta
@@ -0,0 +1,182 @@
+"""Canal de eventos por tick (Server-Sent Events).
+
+Cada vez que el hilo de simulación publica una instantánea se calcula un
+delta compacto respecto a la anterior (las secciones y edges que cambiaron,
+con el mismo formato que ``/api/changes``, más KPIs e intervalo) y se guarda
+en un buffer circular acotado. Los clientes mantienen una sola conexión
+abierta y pueden reanudar desde su último ``update_counter`` con la
+cabecera ``Last-Event-ID``; si quedaron demasiado atrás reciben un evento
+``sync`` con el estado completo.
+
+Cada conexión ocupa un hilo del servidor WSGI, así que hay un cupo de
+conexiones simultáneas por proceso (``STREAM_MAX_CLIENTS``; las demás
+reciben 503) y cada una se cierra tras ``STREAM_MAX_SECONDS``: EventSource
+reconecta solo y reanuda con ``Last-Event-ID`` sin perder ticks.
+"""
+import json
+import os
+import threading
+import time
+from collections import deque
+
+from metrics import STREAM_CLIENTS, STREAM_REJECTED
+from state_delta import snapshot_diff
+
+HEARTBEAT_SECONDS = 15
+HEARTBEAT = b": heartbeat\n\n"
+STREAM_MAX_CLIENTS = int(os.environ.get('STREAM_MAX_CLIENTS', 8))
+STREAM_MAX_SECONDS = float(os.environ.get('STREAM_MAX_SECONDS', 300))
+# Espera sugerida a EventSource antes de reconectar tras el cierre
+STREAM_RETRY_MILLISECONDS = 3000
+EVENT_LOG_SIZE = 64
+
+
+def build_tick_event(previous, snapshot):
+    """Delta entre dos instantáneas; con ``previous=None`` describe el estado completo."""
+    return {
+        'update_counter': snapshot.version,
+        'timestamp': snapshot.timestamp,
+        'current_interval': snapshot.current_interval,
+        'simulation_step': snapshot.simulation_step,
+        'geometry_version': snapshot.road_state['geometry_version'],
+        **snapshot_diff(previous, snapshot),
+        'kpis': snapshot.kpis,
+    }
+
+
+def format_sse(event_name, data, event_id=None):
+    """Codifica un evento en el formato de texto de Server-Sent Events."""
+    lines = []
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    lines.append(f"event: {event_name}")
+    lines.append("data: " + json.dumps(data, ensure_ascii=False, separators=(',', ':')))
+    return ("\n".join(lines) + "\n\n").encode('utf-8')
+
+
+class TickEventLog:
+    """Buffer circular con los últimos deltas publicados, ya codificados."""
+
+    def __init__(self, maxlen=EVENT_LOG_SIZE):
+        self._events = deque(maxlen=maxlen)
+        self._lock = threading.Lock()
+
+    def append(self, version, event):
+        encoded = format_sse('tick', event, event_id=version)
+        with self._lock:
+            self._events.append((version, encoded))
+
+    def events_since(self, version):
+        """Pares ``(versión, evento)`` posteriores a ``version``, o ``None`` si el
+        buffer ya no cubre ese punto y hace falta una resincronización completa."""
+        with self._lock:
+            events = list(self._events)
+        if not events or events[0][0] > version + 1:
+            return None
+        return [(v, encoded) for v, encoded in events if v > version]
+
+
+class StreamSlots:
+    """Cupo de conexiones SSE simultáneas de este proceso."""
+
+    def __init__(self, limit=STREAM_MAX_CLIENTS):
+        self.limit = limit
+        self.active = 0
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Reserva un lugar; ``False`` si el cupo está lleno (responder 503)."""
+        with self._lock:
+            if self.active >= self.limit:
+                STREAM_REJECTED.inc()
+                return False
+            self.active += 1
+            STREAM_CLIENTS.set(self.active)
+            return True
+
+    def release(self):
+        with self._lock:
+            self.active = max(self.active - 1, 0)
+            STREAM_CLIENTS.set(self.active)
+
+
+stream_slots = StreamSlots()
+
+
+class StreamCursor:
+    """Posición de un cliente SSE en el canal: lo que le falta por recibir.
+
+    Concentra la lógica de reanudación y heartbeats; ``event_stream`` y
+    ``async_event_stream`` solo difieren en cómo esperan la siguiente versión.
+    """
+
+    def __init__(self, publisher, event_log, last_version=None, max_seconds=None):
+        self.publisher = publisher
+        self.event_log = event_log
+        self.last_version = last_version
+        self._deadline = None if max_seconds is None else time.monotonic() + max_seconds
+        self._chunks = [f"retry: {STREAM_RETRY_MILLISECONDS}\n\n".encode('ascii')]
+        self._pending = None  # None = hace falta un evento 'sync' con el estado completo
+        if last_version is not None and last_version <= publisher.latest().version:
+            self._pending = event_log.events_since(last_version)
+
+    def drain(self):
+        """Fragmentos a enviar ahora: el estado completo o los deltas pendientes."""
+        chunks, self._chunks = self._chunks, []
+        if self._pending is None:
+            snapshot = self.publisher.latest()
+            self.last_version = snapshot.version
+            chunks.append(format_sse('sync', build_tick_event(None, snapshot), event_id=snapshot.version))
+        else:
+            chunks.extend(encoded for _, encoded in self._pending)
+            if self._pending:
+                self.last_version = self._pending[-1][0]
+        self._pending = []
+        return chunks
+
+    def wait_timeout(self, heartbeat_seconds):
+        """Espera máxima hasta el próximo heartbeat, o ``None`` si la conexión ya
+        cumplió ``max_seconds`` y hay que cerrarla."""
+        if self._deadline is None:
+            return heartbeat_seconds
+        remaining = self._deadline - time.monotonic()
+        return min(heartbeat_seconds, remaining) if remaining > 0 else None
+
+    def advance(self, snapshot):
+        """Registra el resultado de la espera: heartbeat si no hubo tick nuevo,
+        o los deltas desde la última versión enviada."""
+        if snapshot.version <= self.last_version:
+            self._pending = [(self.last_version, HEARTBEAT)]
+        else:
+            self._pending = self.event_log.events_since(self.last_version)
+
+
+def event_stream(publisher, event_log, last_version=None, heartbeat_seconds=HEARTBEAT_SECONDS,
+                 max_seconds=STREAM_MAX_SECONDS):
+    """Generador SSE: reanuda desde ``last_version`` (o sincroniza el estado
+    completo) y luego emite un delta por tick, con heartbeats entre ticks,
+    hasta ``max_seconds`` (``None`` = sin límite)."""
+    cursor = StreamCursor(publisher, event_log, last_version, max_seconds)
+    while True:
+        yield from cursor.drain()
+        timeout = cursor.wait_timeout(heartbeat_seconds)
+        if timeout is None:
+            return
+        cursor.advance(publisher.wait_for_newer(cursor.last_version, timeout=timeout))
+
+
+async def async_event_stream(publisher, event_log, wait_for_newer, last_version=None,
+                             heartbeat_seconds=HEARTBEAT_SECONDS, max_seconds=STREAM_MAX_SECONDS):
+    """Versión asyncio de ``event_stream`` para el servidor ASGI.
+
+    ``wait_for_newer(version, timeout)`` es una corrutina que espera una
+    instantánea posterior a ``version`` sin bloquear el bucle de eventos.
+    """
+    cursor = StreamCursor(publisher, event_log, last_version, max_seconds)
+    while True:
+        for chunk in cursor.drain():
+            yield chunk
+        timeout = cursor.wait_timeout(heartbeat_seconds)
+        if timeout is None:
+            return
+        cursor.advance(await wait_for_newer(cursor.last_version, timeout))
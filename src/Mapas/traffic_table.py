@@ -0,0 +1,162 @@
+"""Tabla columnar de los conteos de tráfico (ingesta de ``data_transito.xlsx``).
+
+El Excel se convierte una sola vez a un ``.npz`` con columnas tipadas:
+
+- ``interval_id``: índice del intervalo en ``time_intervals`` (ordenados).
+- ``point`` / ``direction``: ``NroPunto`` y ``Sentido`` como enteros.
+- ``vehicle_type_id``: índice del tipo de vehículo (ya sin espacios) en
+  ``vehicle_types``.
+- ``quantity``: ``Cantidad``.
+
+Las categorías (``time_intervals``, ``vehicle_types``) se guardan junto a las
+columnas. El archivo lleva el SHA-1 del Excel de origen: si el Excel cambia,
+el caché se descarta y se vuelve a convertir. Leerlo no necesita pandas ni
+openpyxl. Como script convierte en tiempo de build el Excel de cada
+corredor configurado (ver corridors.py), o uno en particular:
+
+    python traffic_table.py [--corridors corridors.json] [--source data_transito.xlsx --output cache/traffic_table.npz]
+"""
+import argparse
+import hashlib
+import logging
+import os
+
+import numpy as np
+
+TRAFFIC_TABLE_VERSION = 1
+SOURCE_FILE = 'data_transito.xlsx'
+TABLE_FILE = os.path.join('cache', 'traffic_table.npz')
+_COLUMNS = ('interval_id', 'point', 'direction', 'vehicle_type_id', 'quantity')
+
+
+def file_sha1(path):
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class TrafficTable:
+    """Registros de conteo en columnas NumPy con categorías enteras."""
+
+    def __init__(self, time_intervals, vehicle_types, interval_id, point, direction,
+                 vehicle_type_id, quantity):
+        self.time_intervals = list(time_intervals)
+        self.vehicle_types = list(vehicle_types)
+        self.interval_id = np.asarray(interval_id, dtype=np.int16)
+        self.point = np.asarray(point, dtype=np.int16)
+        self.direction = np.asarray(direction, dtype=np.int8)
+        self.vehicle_type_id = np.asarray(vehicle_type_id, dtype=np.int16)
+        self.quantity = np.asarray(quantity, dtype=np.int32)
+
+    @classmethod
+    def empty_table(cls):
+        return cls([], [], [], [], [], [], [])
+
+    @classmethod
+    def from_dataframe(cls, df):
+        """Convierte el DataFrame leído del Excel (columnas ya sin espacios)."""
+        df = df.dropna(subset=['HoraControl', 'TipoVehiculo', 'NroPunto', 'Sentido', 'Cantidad'])
+        intervals = df['HoraControl'].astype('category')
+        vehicle_types = df['TipoVehiculo'].astype(str).str.strip().astype('category')
+        # Las categorías de pandas ya vienen ordenadas, igual que sorted(unique())
+        return cls(
+            intervals.cat.categories.tolist(),
+            vehicle_types.cat.categories.tolist(),
+            intervals.cat.codes.to_numpy(),
+            df['NroPunto'].to_numpy(dtype=np.int64),
+            df['Sentido'].to_numpy(dtype=np.int64),
+            vehicle_types.cat.codes.to_numpy(),
+            df['Cantidad'].to_numpy(dtype=np.int64),
+        )
+
+    @property
+    def empty(self):
+        return len(self) == 0
+
+    def __len__(self):
+        return len(self.quantity)
+
+
+def read_excel_table(source_path):
+    """Lee el Excel con pandas/openpyxl (solo durante la conversión)."""
+    import pandas as pd
+    df = pd.read_excel(source_path)
+    df.columns = df.columns.str.strip()
+    return TrafficTable.from_dataframe(df)
+
+
+def save_traffic_table(path, source_hash, table):
+    """Guarda la tabla de forma atómica (archivo temporal + rename)."""
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp_path = path + '.tmp.npz'
+    np.savez(tmp_path,
+             version=np.array(TRAFFIC_TABLE_VERSION),
+             source_sha1=np.array(source_hash),
+             time_intervals=np.array(table.time_intervals, dtype=str),
+             vehicle_types=np.array(table.vehicle_types, dtype=str),
+             **{name: getattr(table, name) for name in _COLUMNS})
+    os.replace(tmp_path, path)
+
+
+def load_traffic_table(path, source_hash):
+    """Tabla guardada en ``path`` o ``None`` si no existe, es de otra versión o
+    se generó a partir de otro Excel."""
+    if not os.path.exists(path):
+        return None
+    with np.load(path, allow_pickle=False) as data:
+        if int(data['version']) != TRAFFIC_TABLE_VERSION:
+            logging.info("⚠️ Tabla de tráfico de otra versión, se ignora")
+            return None
+        if str(data['source_sha1']) != source_hash:
+            logging.info("⚠️ El Excel de tráfico cambió, se vuelve a convertir")
+            return None
+        return TrafficTable(data['time_intervals'].tolist(), data['vehicle_types'].tolist(),
+                            *(data[name] for name in _COLUMNS))
+
+
+def load_or_convert(source_path=SOURCE_FILE, table_path=TABLE_FILE):
+    """Tabla de tráfico desde el caché columnar, convirtiendo el Excel si hace falta."""
+    source_hash = file_sha1(source_path)
+    try:
+        table = load_traffic_table(table_path, source_hash)
+    except Exception as e:
+        logging.warning(f"⚠️ No se pudo leer la tabla de tráfico en caché: {e}")
+        table = None
+    if table is not None:
+        logging.info(f"✅ Tabla de tráfico cargada desde caché ({len(table)} registros)")
+        return table
+
+    logging.info(f"📂 Convirtiendo '{source_path}' a tabla columnar...")
+    table = read_excel_table(source_path)
+    try:
+        save_traffic_table(table_path, source_hash, table)
+    except Exception as e:
+        logging.error(f"❌ Error al guardar la tabla de tráfico: {e}")
+    return table
+
+
+def main(argv=None):
+    from corridors import CORRIDORS_FILE, load_corridor_configs
+
+    parser = argparse.ArgumentParser(description="Convierte los Excel de conteos a tablas columnares.")
+    parser.add_argument('--corridors', default=CORRIDORS_FILE)
+    parser.add_argument('--source', default=None)
+    parser.add_argument('--output', default=TABLE_FILE)
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    if args.source is not None:
+        jobs = [(args.source, args.output)]
+    else:
+        jobs = [(c.traffic_file, c.traffic_table_file) for c in load_corridor_configs(args.corridors)]
+    for output, source in {output: source for source, output in jobs}.items():
+        table = load_or_convert(source, output)
+        logging.info(f"✅ Tabla de tráfico lista ({output}): {len(table)} registros, "
+                     f"{len(table.time_intervals)} intervalos, {len(table.vehicle_types)} tipos de vehículo")
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -88,7 +88,7 @@ export default function MetricsChart() {
         
         return {
           interval: interval || '',
-          totalUCP: isCurrentInterval && ucpData ? (ucpData.total_ucp ?? 0) : 0,
+          totalUCP: ucpData ? (ucpData.total_ucp ?? 0) : 0,
           isCurrentInterval: isCurrentInterval || false
         };
       });
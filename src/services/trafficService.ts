@@ -13,6 +13,8 @@ export interface TrafficSegment {
   vehicle_counts: Record<string, number>;
   ucp_density: number;
   occupancy_percentage: number;
+  average_speed_kmh: number;
+  travel_time_seconds: number;
   total_vehicles: number;
 }
 
@@ -145,9 +147,8 @@ class TrafficService {
   async getKPIs(): Promise<TrafficKPIs | null> {
     try {
       console.log('📊 Obteniendo KPIs del backend...');
-      // Agregar timestamp para evitar caché
-      const timestamp = new Date().getTime();
-      const response = await fetchWithTimeout(`${PYTHON_MAP_BASE_URL}/api/kpis?_t=${timestamp}`);
+      // El backend revalida con ETag; no hace falta romper la caché con un timestamp
+      const response = await fetchWithTimeout(`${PYTHON_MAP_BASE_URL}/api/kpis`);
       
       if (!response.ok) {
         throw new Error(`Failed to fetch KPIs: ${response.status} ${response.statusText}`);
@@ -156,15 +157,13 @@ class TrafficService {
       const data = await response.json();
       console.log('✅ KPIs obtenidos:', data);
       
-      // Calcular tiempo promedio de viaje basado en la congestión
-      const averageTravelTime = this.calculateAverageTravelTime(data.congestion_percentage);
-
       return {
         overallOccupancyPercentage: data.overall_occupancy_percentage || 0,
         congestionPercentage: data.congestion_percentage || 0,
         redSegmentsCount: data.red_segments_count || 0,
         totalSegmentsCount: data.total_segments_count || 0,
-        averageTravelTime
+        // Calculado en el backend con el diagrama fundamental (densidad → velocidad → tiempo)
+        averageTravelTime: data.average_travel_time_minutes || 0
       };
     } catch (error) {
       console.error('❌ Error al obtener KPIs del servidor Python:', error);
@@ -214,9 +213,8 @@ class TrafficService {
   async getCurrentInterval(): Promise<CurrentInterval> {
     try {
       console.log('⏰ Obteniendo intervalo actual...');
-      // Agregar timestamp para evitar caché
-      const timestamp = new Date().getTime();
-      const response = await fetchWithTimeout(`${PYTHON_MAP_BASE_URL}/api/current_interval?_t=${timestamp}`);
+      // El backend revalida con ETag; no hace falta romper la caché con un timestamp
+      const response = await fetchWithTimeout(`${PYTHON_MAP_BASE_URL}/api/current_interval`);
       
       if (!response.ok) {
         throw new Error(`Failed to fetch current interval: ${response.status}`);
@@ -432,14 +430,6 @@ class TrafficService {
     return multipliers[hourNum] || 1.0;
   }
 
-  private calculateAverageTravelTime(congestionPercentage: number): number {
-    // Tiempo base: 25 minutos
-    // Incremento por congestión: hasta 15 minutos adicionales
-    const baseTime = 25;
-    const congestionDelay = (congestionPercentage / 100) * 15;
-    return Math.round(baseTime + congestionDelay);
-  }
-
   isServerAvailable(): boolean {
     return this.isServerRunning;
   }
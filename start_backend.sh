@@ -1,3 +1,3 @@
 #!/bin/bash
 cd src/Mapas
-gunicorn --bind 0.0.0.0:$PORT --workers 1 --timeout 600 --graceful-timeout 600 app:app
+gunicorn --bind 0.0.0.0:$PORT --workers ${WEB_CONCURRENCY:-2} --worker-class gthread --threads ${GUNICORN_THREADS:-16} --timeout 600 --graceful-timeout 600 app:app